@@ -0,0 +1,157 @@
+"""
+Fake stdio MCP server used by the benchmark harness.
+
+Speaks both dialects that `load_all_tools` talks to:
+
+* Python servers (pyats, netbox, servicenow, chatgpt): `tools/discover` and
+  `tools/call`, replies without `jsonrpc`/`id`, schemas under `parameters`,
+  discovery result is a bare list.
+* Node servers: `tools/list` / `tools/call` (or GitHub's `list_tools` /
+  `call_tool`), JSON-RPC replies that echo the request id, schemas under
+  `inputSchema`, discovery result is `{"tools": [...]}`.
+
+Usage:
+    python fake_mcp_server.py --service pyats-mcp --dialect python [--latency-ms 20] [--payload-bytes 2048]
+"""
+import sys
+import json
+import time
+import hashlib
+import argparse
+
+# A few representative tools per container; names follow the real servers where they matter
+# (e.g. the pyATS names referenced by the system prompt and TOOL_QUERY_PATTERNS).
+SERVICE_TOOLS = {
+    "pyats-mcp": [
+        ("pyATS_show_running_config", "Show the running configuration of a network device", {"device_name": "string"}),
+        ("pyATS_run_show_command", "Run a show command on a network device and return parsed output",
+         {"device_name": "string", "command": "string"}),
+        ("pyATS_ping_from_network_device", "Ping a destination from a network device",
+         {"device_name": "string", "command": "string"}),
+        ("pyATS_configure_device", "Apply configuration commands to a network device",
+         {"device_name": "string", "config_commands": "string"}),
+    ],
+    "github-mcp": [
+        ("create_or_update_file", "Create or update a file in a GitHub repository",
+         {"owner": "string", "repo": "string", "path": "string", "content": "string", "message": "string"}),
+        ("search_repositories", "Search GitHub repositories", {"query": "string"}),
+        ("create_issue", "Create a new issue in a GitHub repository",
+         {"owner": "string", "repo": "string", "title": "string"}),
+    ],
+    "google-maps-mcp": [
+        ("maps_geocode", "Convert an address into geographic coordinates", {"address": "string"}),
+        ("maps_directions", "Get directions between two points", {"origin": "string", "destination": "string"}),
+    ],
+    "sequentialthinking-mcp": [
+        ("sequentialthinking", "Step by step reflective problem solving",
+         {"thought": "string", "thoughtNumber": "integer", "totalThoughts": "integer", "nextThoughtNeeded": "boolean"}),
+    ],
+    "slack-mcp": [
+        ("slack_post_message", "Post a message to a Slack channel", {"channel_id": "string", "text": "string"}),
+        ("slack_list_channels", "List public Slack channels", {}),
+    ],
+    "excalidraw-mcp": [
+        ("create_drawing", "Create a new Excalidraw network diagram", {"name": "string"}),
+        ("export_to_json", "Export an Excalidraw drawing to JSON", {"id": "string"}),
+    ],
+    "filesystem-mcp": [
+        ("read_file", "Read the contents of a file", {"path": "string"}),
+        ("write_file", "Write content to a file", {"path": "string", "content": "string"}),
+        ("list_directory", "List files in a directory", {"path": "string"}),
+    ],
+    "netbox-mcp": [
+        ("get_devices", "Get devices from the NetBox inventory", {"site": "string"}),
+        ("get_ip_addresses", "Get IP addresses from NetBox IPAM", {"prefix": "string"}),
+    ],
+    "google-search-mcp": [
+        ("google_search", "Search the web with Google", {"query": "string"}),
+    ],
+    "servicenow-mcp": [
+        ("create_servicenow_problem", "Create a new ServiceNow problem ticket",
+         {"short_description": "string", "description": "string"}),
+        ("get_servicenow_problem_sys_id", "Get the sys_id of a ServiceNow problem", {"problem_number": "string"}),
+    ],
+    "email-mcp": [
+        ("send_email", "Send an email message", {"to": "string", "subject": "string", "body": "string"}),
+    ],
+    "chatgpt-mcp": [
+        ("ask_chatgpt", "Ask ChatGPT to analyze text or configuration", {"content": "string"}),
+    ],
+    "quickchart-mcp": [
+        ("generate_chart", "Generate a chart image from data", {"type": "string", "labels": "array"}),
+    ],
+}
+
+
+def tool_definitions(service, extra_tools, dialect):
+    tools = list(SERVICE_TOOLS.get(service, []))
+    prefix = service.replace("-mcp", "").replace("-", "_")
+    for i in range(extra_tools):
+        tools.append((f"{prefix}_extra_{i}", f"Synthetic {prefix} operation number {i}", {"target": "string"}))
+
+    schema_key = "parameters" if dialect == "python" else "inputSchema"
+    definitions = []
+    for name, description, properties in tools:
+        definitions.append({
+            "name": name,
+            "description": description,
+            schema_key: {
+                "type": "object",
+                "properties": {
+                    field: ({"type": "array", "items": {"type": "string"}} if kind == "array" else {"type": kind})
+                    for field, kind in properties.items()
+                },
+                "required": list(properties),
+            },
+        })
+    return definitions
+
+
+def call_result(name, arguments, payload_bytes, dialect):
+    # Deterministic filler so responses of a given size are reproducible run to run.
+    seed = hashlib.sha256(json.dumps([name, arguments], sort_keys=True).encode()).hexdigest()
+    filler = (seed * (payload_bytes // len(seed) + 1))[:payload_bytes]
+    if dialect == "python":
+        return {"tool": name, "arguments": arguments, "output": filler}
+    return {"content": [{"type": "text", "text": json.dumps({"tool": name, "output": filler})}]}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--service", required=True)
+    parser.add_argument("--dialect", choices=("python", "node"), default="node")
+    parser.add_argument("--latency-ms", type=float, default=0.0)
+    parser.add_argument("--payload-bytes", type=int, default=1024)
+    parser.add_argument("--extra-tools", type=int, default=0)
+    args, _ = parser.parse_known_args()
+
+    definitions = tool_definitions(args.service, args.extra_tools, args.dialect)
+    for line in sys.stdin:
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            request = json.loads(line)
+        except json.JSONDecodeError:
+            continue
+
+        method = request.get("method")
+        params = request.get("params") or {}
+        if method in ("tools/discover", "tools/list", "list_tools"):
+            result = definitions if args.dialect == "python" else {"tools": definitions}
+            reply = {"result": result}
+        elif method in ("tools/call", "call_tool"):
+            time.sleep(args.latency_ms / 1000)
+            reply = {"result": call_result(params.get("name"), params.get("arguments"), args.payload_bytes,
+                                           args.dialect)}
+        else:
+            reply = {"error": {"code": -32601, "message": f"Method not found: {method}"}}
+
+        if args.dialect == "node":
+            reply = {"jsonrpc": "2.0", "id": request.get("id"), **reply}
+        sys.stdout.write(json.dumps(reply) + "\n")
+        sys.stdout.flush()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+"""Deterministic stand-ins for the chat model and embedding model used by the agent runtime."""
+import re
+import asyncio
+import hashlib
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, BaseMessage, HumanMessage, ToolMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+from langchain_core.utils.function_calling import convert_to_openai_tool
+
+_WORD = re.compile(r"[a-z0-9]+")
+
+_PLACEHOLDERS = {
+    "string": "R1",
+    "integer": 1,
+    "number": 1.0,
+    "boolean": True,
+    "array": [],
+    "object": {},
+}
+
+
+class HashingEmbeddings(Embeddings):
+    """
+    Bag-of-words embeddings via feature hashing.
+
+    Deterministic and free, and texts sharing words get similar vectors, so
+    tool retrieval behaves plausibly against the fake tool catalogs.
+    """
+
+    def __init__(self, dimensions: int = 256, latency_ms: float = 0.0):
+        self.dimensions = dimensions
+        self.latency_ms = latency_ms
+        self.calls = 0
+
+    def _embed(self, text: str) -> List[float]:
+        vector = np.zeros(self.dimensions, dtype=np.float32)
+        for word in _WORD.findall(text.lower().replace("_", " ")):
+            digest = hashlib.md5(word.encode()).digest()
+            vector[int.from_bytes(digest[:4], "little") % self.dimensions] += 1.0
+        return vector.tolist()
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        self.calls += 1
+        return [self._embed(text) for text in texts]
+
+    def embed_query(self, text: str) -> List[float]:
+        self.calls += 1
+        return self._embed(text)
+
+    async def aembed_documents(self, texts: List[str]) -> List[List[float]]:
+        await asyncio.sleep(self.latency_ms / 1000)
+        return self.embed_documents(texts)
+
+    async def aembed_query(self, text: str) -> List[float]:
+        await asyncio.sleep(self.latency_ms / 1000)
+        return self.embed_query(text)
+
+
+class FakeToolCallingChatModel(BaseChatModel):
+    """
+    Scripted chat model covering every way the graph calls its LLM.
+
+    * With tools bound and a user turn pending: calls the first bound tool,
+      filling required arguments with placeholders.
+    * After a tool result: answers in text, ending the turn.
+    * Without tools (tool-selection prompt): picks the first listed tool.
+    * Anything else (e.g. history summarization): a short fixed text.
+    """
+
+    latency_ms: float = 0.0
+    calls: int = 0
+
+    @property
+    def _llm_type(self) -> str:
+        return "fake-tool-calling"
+
+    def bind_tools(self, tools, **kwargs):
+        return self.bind(tools=[convert_to_openai_tool(tool) for tool in tools], **kwargs)
+
+    def _respond(self, messages: List[BaseMessage], tools: Optional[List[Dict[str, Any]]]) -> AIMessage:
+        self.calls += 1
+        last = messages[-1] if messages else None
+        if isinstance(last, ToolMessage):
+            return AIMessage(content=f"Done. {str(last.content)[:80]}")
+        if tools:
+            function = tools[0]["function"]
+            properties = function.get("parameters", {}).get("properties", {})
+            required = function.get("parameters", {}).get("required", [])
+            arguments = {name: _PLACEHOLDERS.get(properties[name].get("type"), "R1")
+                         for name in required if name in properties}
+            return AIMessage(content="", tool_calls=[
+                {"name": function["name"], "args": arguments, "id": f"call_{self.calls}", "type": "tool_call"}
+            ])
+
+        if isinstance(last, HumanMessage) and "Available tools:" in str(last.content):
+            listed = re.findall(r"^- ([^:\s]+):", str(last.content), flags=re.M)
+            return AIMessage(content=listed[0] if listed else "None")
+        return AIMessage(content="Summary: earlier turns ran network checks.")
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs) -> ChatResult:
+        message = self._respond(messages, kwargs.get("tools"))
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    async def _agenerate(self, messages, stop=None, run_manager=None, **kwargs) -> ChatResult:
+        await asyncio.sleep(self.latency_ms / 1000)
+        return self._generate(messages, stop=stop, run_manager=run_manager, **kwargs)
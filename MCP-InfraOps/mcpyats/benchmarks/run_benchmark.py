@@ -0,0 +1,258 @@
+"""
+End-to-end benchmarks for `compiled_graph` without Docker, OpenAI or Google.
+
+A `docker` shim placed first on PATH turns `docker exec -i <container> ...`
+into a local `fake_mcp_server.py` speaking that container's dialect, and the
+runtime's chat and embedding models are replaced by the deterministic fakes
+in `fakes.py`. Everything else (session pool, discovery, catalog, tool index,
+selection, tool node, history compaction) runs unmodified.
+
+Workloads:
+    latency     sequential turns in one session; per-node latency percentiles
+    throughput  concurrent sessions; turns/second and turn latency percentiles
+    memory      many turns in one session; traced memory growth per turn
+
+Usage (from MCP-InfraOps/mcpyats):
+    python benchmarks/run_benchmark.py latency --turns 50
+    python benchmarks/run_benchmark.py throughput --sessions 16 --turns 10 --tool-latency-ms 20
+    python benchmarks/run_benchmark.py all --json results.json
+"""
+import os
+import sys
+import json
+import time
+import asyncio
+import logging
+import argparse
+import tempfile
+import tracemalloc
+import contextlib
+from collections import defaultdict
+
+import numpy as np
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+sys.path.insert(0, BENCH_DIR)
+
+QUERIES = [
+    "show the running config on R1",
+    "ping 10.0.0.1 from R1",
+    "run show ip interface brief on R2",
+    "create an issue in the network-automation github repo",
+    "post a message to the ops slack channel",
+    "get devices for site dc1 from netbox",
+    "create a servicenow problem for the BGP flap",
+    "read the file /projects/inventory.yaml",
+    "geocode the address of the London data center",
+    "search the web for CVE-2024-20399",
+]
+
+DOCKER_SHIM = """#!{python}
+import os, sys, hashlib
+args = sys.argv[1:]
+if args[:1] == ["exec"]:
+    rest = [a for a in args[1:] if a != "-i"]
+    container, command = rest[0], rest[1:]
+    dialect = "python" if command and command[0].startswith("python") else "node"
+    os.execv({python!r}, [{python!r}, {server!r}, "--service", container, "--dialect", dialect] + {server_args!r})
+elif args[:1] == ["inspect"]:
+    print("sha256:" + hashlib.sha256(args[-1].encode()).hexdigest())
+elif args[:2] == ["network", "inspect"]:
+    print("[]")
+else:
+    sys.exit(1)
+"""
+
+
+def install_fake_environment(workdir, args):
+    """Puts the docker shim on PATH and points the runtime's on-disk caches at `workdir`."""
+    bin_dir = os.path.join(workdir, "bin")
+    os.makedirs(bin_dir, exist_ok=True)
+    shim_path = os.path.join(bin_dir, "docker")
+    server_args = [
+        "--latency-ms", str(args.tool_latency_ms),
+        "--payload-bytes", str(args.payload_bytes),
+        "--extra-tools", str(args.extra_tools),
+    ]
+    with open(shim_path, "w") as f:
+        f.write(DOCKER_SHIM.format(
+            python=sys.executable, server=os.path.join(BENCH_DIR, "fake_mcp_server.py"), server_args=server_args
+        ))
+    os.chmod(shim_path, 0o755)
+
+    os.environ["PATH"] = bin_dir + os.pathsep + os.environ.get("PATH", "")
+    os.environ["MCP_TOOL_CATALOG_CACHE"] = os.path.join(workdir, "tool_catalog.json")
+    os.environ["MCP_TOOL_INDEX_DIR"] = os.path.join(workdir, "tool_index")
+    os.environ.setdefault("MCPYATS_WARMUP", "false")
+
+
+def percentiles(samples):
+    if not samples:
+        return {}
+    values = np.asarray(samples, dtype=np.float64) * 1000
+    return {
+        "count": len(samples),
+        "p50_ms": round(float(np.percentile(values, 50)), 2),
+        "p95_ms": round(float(np.percentile(values, 95)), 2),
+        "p99_ms": round(float(np.percentile(values, 99)), 2),
+        "mean_ms": round(float(values.mean()), 2),
+    }
+
+
+async def run_turn(graph, state, query, node_latency=None):
+    """Runs one user turn and returns the resulting state; records per-node wall time."""
+    from langchain_core.messages import HumanMessage
+
+    turn_input = {"messages": state["messages"] + [HumanMessage(content=query)], "context": state["context"]}
+    final = state
+    last = time.perf_counter()
+    async for mode, chunk in graph.astream(turn_input, stream_mode=["updates", "values"]):
+        now = time.perf_counter()
+        if mode == "updates" and node_latency is not None:
+            for node in chunk:
+                node_latency[node].append(now - last)
+            last = now
+        elif mode == "values":
+            final = chunk
+    return {"messages": list(final.get("messages", [])), "context": dict(final.get("context", {}))}
+
+
+def new_session():
+    return {"messages": [], "context": {"used_tools": []}}
+
+
+async def bench_latency(graph, args):
+    node_latency = defaultdict(list)
+    turn_latency = []
+    state = new_session()
+    for i in range(args.turns):
+        started = time.perf_counter()
+        state = await run_turn(graph, state, QUERIES[i % len(QUERIES)], node_latency)
+        turn_latency.append(time.perf_counter() - started)
+    return {
+        "turn": percentiles(turn_latency),
+        "nodes": {node: percentiles(samples) for node, samples in node_latency.items()},
+    }
+
+
+async def bench_throughput(graph, args):
+    turn_latency = []
+
+    async def session(index):
+        state = new_session()
+        for i in range(args.turns):
+            started = time.perf_counter()
+            state = await run_turn(graph, state, QUERIES[(index + i) % len(QUERIES)])
+            turn_latency.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    await asyncio.gather(*[session(i) for i in range(args.sessions)])
+    elapsed = time.perf_counter() - started
+    total = args.sessions * args.turns
+    return {
+        "sessions": args.sessions,
+        "turns": total,
+        "elapsed_s": round(elapsed, 3),
+        "turns_per_s": round(total / elapsed, 2) if elapsed else None,
+        "turn": percentiles(turn_latency),
+    }
+
+
+async def bench_memory(graph, args):
+    import gc
+
+    state = new_session()
+    samples = []
+    tracemalloc.start()
+    try:
+        for i in range(args.memory_turns):
+            state = await run_turn(graph, state, QUERIES[i % len(QUERIES)])
+            if (i + 1) % args.sample_every == 0:
+                gc.collect()
+                current, peak = tracemalloc.get_traced_memory()
+                samples.append({"turn": i + 1, "current_kb": current // 1024, "peak_kb": peak // 1024,
+                                "messages": len(state["messages"])})
+    finally:
+        tracemalloc.stop()
+
+    # Growth over the second half, after caches and pools have warmed up.
+    steady = samples[len(samples) // 2:]
+    growth = None
+    if len(steady) >= 2:
+        turns = steady[-1]["turn"] - steady[0]["turn"]
+        growth = round((steady[-1]["current_kb"] - steady[0]["current_kb"]) / turns, 2) if turns else None
+    return {"samples": samples, "steady_growth_kb_per_turn": growth}
+
+
+def print_report(results):
+    for workload, result in results.items():
+        print(f"\n=== {workload} ===")
+        if workload == "latency":
+            print(f"{'node':<22}{'count':>7}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}")
+            rows = list(result["nodes"].items()) + [("(turn)", result["turn"])]
+            for node, stats in rows:
+                print(f"{node:<22}{stats['count']:>7}{stats['p50_ms']:>10}{stats['p95_ms']:>10}{stats['p99_ms']:>10}")
+        elif workload == "throughput":
+            turn = result["turn"]
+            print(f"{result['sessions']} sessions, {result['turns']} turns in {result['elapsed_s']}s "
+                  f"-> {result['turns_per_s']} turns/s (p50 {turn['p50_ms']} ms, p99 {turn['p99_ms']} ms)")
+        elif workload == "memory":
+            for sample in result["samples"]:
+                print(f"turn {sample['turn']:>5}: {sample['current_kb']:>8} KiB traced, "
+                      f"{sample['messages']:>4} messages in state")
+            print(f"steady-state growth: {result['steady_growth_kb_per_turn']} KiB/turn")
+
+
+async def main(args):
+    workdir = tempfile.mkdtemp(prefix="mcpyats-bench-")
+    install_fake_environment(workdir, args)
+
+    from fakes import FakeToolCallingChatModel, HashingEmbeddings
+    # Discovery and selection print progress; keep the report readable.
+    with contextlib.redirect_stdout(open(os.devnull, "w")) if not args.verbose else contextlib.nullcontext():
+        import mcpyats
+        logging.getLogger().setLevel(logging.INFO if args.verbose else logging.WARNING)
+
+        mcpyats.runtime.llm_factory = lambda: FakeToolCallingChatModel(latency_ms=args.llm_latency_ms)
+        mcpyats.runtime.embedding_factory = lambda: HashingEmbeddings(latency_ms=args.embed_latency_ms)
+
+        started = time.perf_counter()
+        await mcpyats.runtime.ensure_ready()
+        warm_up = time.perf_counter() - started
+
+        results = {"warm_up": {"seconds": round(warm_up, 3), "tools": len(mcpyats.runtime.valid_tools)}}
+        workloads = ["latency", "throughput", "memory"] if args.workload == "all" else [args.workload]
+        for workload in workloads:
+            bench = {"latency": bench_latency, "throughput": bench_throughput, "memory": bench_memory}[workload]
+            results[workload] = await bench(mcpyats.compiled_graph, args)
+
+        await mcpyats.session_pool.close()
+
+    print(f"warm-up: {results['warm_up']['seconds']}s, {results['warm_up']['tools']} tools")
+    print_report({k: v for k, v in results.items() if k != "warm_up"})
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"\n📄 Results written to {args.json}")
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("workload", choices=("latency", "throughput", "memory", "all"))
+    parser.add_argument("--turns", type=int, default=20, help="turns per session")
+    parser.add_argument("--sessions", type=int, default=8, help="concurrent sessions (throughput)")
+    parser.add_argument("--memory-turns", type=int, default=200)
+    parser.add_argument("--sample-every", type=int, default=20)
+    parser.add_argument("--tool-latency-ms", type=float, default=5.0)
+    parser.add_argument("--llm-latency-ms", type=float, default=0.0)
+    parser.add_argument("--embed-latency-ms", type=float, default=0.0)
+    parser.add_argument("--payload-bytes", type=int, default=2048)
+    parser.add_argument("--extra-tools", type=int, default=0, help="synthetic tools added to every fake server")
+    parser.add_argument("--json", help="also write results to this file")
+    parser.add_argument("--verbose", action="store_true")
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    asyncio.run(main(parse_args()))
@@ -0,0 +1,200 @@
+import os
+import time
+import logging
+from typing import Dict, Any, List, Optional
+
+logger = logging.getLogger(__name__)
+
+FAILURE_THRESHOLD = int(os.getenv("MCP_BREAKER_FAILURES", "5"))
+RESET_TIMEOUT = float(os.getenv("MCP_BREAKER_RESET_SECONDS", "30"))
+MIN_CALL_TIMEOUT = float(os.getenv("MCP_MIN_CALL_TIMEOUT", "5"))
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class LatencyHistogram:
+    """
+    Log-bucketed latency histogram with exponential decay.
+
+    Counts are halved every `decay_every` samples so percentiles follow the
+    service's recent behaviour rather than its whole history.
+    """
+
+    def __init__(self, min_seconds: float = 0.01, max_seconds: float = 600.0, growth: float = 1.25,
+                 decay_every: int = 500):
+        self.bounds: List[float] = []
+        bound = min_seconds
+        while bound < max_seconds:
+            self.bounds.append(bound)
+            bound *= growth
+        self.bounds.append(max_seconds)
+        self.counts = [0.0] * len(self.bounds)
+        self.total = 0.0
+        self.decay_every = decay_every
+        self._since_decay = 0
+
+    def record(self, seconds: float):
+        index = next((i for i, bound in enumerate(self.bounds) if seconds <= bound), len(self.bounds) - 1)
+        self.counts[index] += 1
+        self.total += 1
+        self._since_decay += 1
+        if self._since_decay >= self.decay_every:
+            self.counts = [count / 2 for count in self.counts]
+            self.total /= 2
+            self._since_decay = 0
+
+    def percentile(self, p: float) -> Optional[float]:
+        """Upper bound of the bucket holding the `p`-th percentile (0-100), or None when empty."""
+        if not self.total:
+            return None
+        target = self.total * p / 100
+        cumulative = 0.0
+        for bound, count in zip(self.bounds, self.counts):
+            cumulative += count
+            if cumulative >= target:
+                return bound
+        return self.bounds[-1]
+
+
+class CircuitBreaker:
+    """
+    Per-service circuit breaker.
+
+    After `failure_threshold` consecutive failures the circuit opens and calls
+    fail fast. Once `reset_timeout` has passed a single probe call is let
+    through (half-open); its outcome closes or re-opens the circuit.
+
+    Latency is tracked per tool, so a service's fast calls do not set the
+    timeout of its slow ones (`show tech` next to `show version`).
+    """
+
+    def __init__(self, name: str, failure_threshold: int = FAILURE_THRESHOLD, reset_timeout: float = RESET_TIMEOUT,
+                 min_timeout: float = MIN_CALL_TIMEOUT, timeout_multiplier: float = 2.0, min_samples: int = 20):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.min_timeout = min_timeout
+        self.timeout_multiplier = timeout_multiplier
+        self.min_samples = min_samples
+        self.latency: Dict[str, LatencyHistogram] = {}
+        self.state = CLOSED
+        self.consecutive_failures = 0
+        self.opened_at: Optional[float] = None
+        self._probe_in_flight = False
+
+    @property
+    def healthy(self) -> bool:
+        """False while the circuit is open and not yet due for a probe."""
+        return self.state != OPEN or self.retry_in() == 0
+
+    def retry_in(self) -> float:
+        if self.state != OPEN:
+            return 0.0
+        return max(0.0, self.opened_at + self.reset_timeout - time.monotonic())
+
+    def allow(self) -> bool:
+        """Whether a call may go through now; moves an expired open circuit to half-open."""
+        if self.state == CLOSED:
+            return True
+        if self.state == OPEN:
+            if self.retry_in() > 0:
+                return False
+            self.state = HALF_OPEN
+            logger.info(f"🔌 Circuit for {self.name} half-open, probing")
+        if self._probe_in_flight:
+            return False
+        self._probe_in_flight = True
+        return True
+
+    def release(self):
+        """Gives up a half-open probe slot without an outcome (e.g. the call was cancelled)."""
+        self._probe_in_flight = False
+
+    def histogram(self, tool: str) -> LatencyHistogram:
+        if tool not in self.latency:
+            self.latency[tool] = LatencyHistogram()
+        return self.latency[tool]
+
+    def timeout(self, cap: float, tool: str = "") -> float:
+        """Adaptive call timeout: the tool's p99 latency times `timeout_multiplier`, within [min_timeout, cap]."""
+        latency = self.latency.get(tool)
+        p99 = latency.percentile(99) if latency is not None else None
+        if p99 is None or latency.total < self.min_samples:
+            return cap
+        return min(cap, max(self.min_timeout, p99 * self.timeout_multiplier))
+
+    def record_success(self, seconds: Optional[float] = None, tool: str = ""):
+        if seconds is not None:
+            self.histogram(tool).record(seconds)
+        self.consecutive_failures = 0
+        self._probe_in_flight = False
+        if self.state != CLOSED:
+            logger.info(f"✅ Circuit for {self.name} closed")
+            self.state = CLOSED
+            self.opened_at = None
+
+    def record_slow(self, seconds: float, tool: str = ""):
+        """
+        A call cut off by its adaptive timeout. The service was slow rather than
+        down, so this is a latency sample at the timeout (letting the timeout
+        grow back) and not a failure.
+        """
+        self.histogram(tool).record(seconds)
+        self._probe_in_flight = False
+
+    def record_failure(self):
+        self.consecutive_failures += 1
+        self._probe_in_flight = False
+        if self.state == HALF_OPEN or (self.state == CLOSED and self.consecutive_failures >= self.failure_threshold):
+            logger.warning(
+                f"🚫 Circuit for {self.name} opened after {self.consecutive_failures} failures; "
+                f"retrying in {self.reset_timeout:.0f}s"
+            )
+            self.state = OPEN
+            self.opened_at = time.monotonic()
+
+    def status(self) -> Dict[str, Any]:
+        return {
+            "state": self.state,
+            "healthy": self.healthy,
+            "consecutive_failures": self.consecutive_failures,
+            "retry_in_seconds": round(self.retry_in(), 1),
+            "tools": {
+                tool or "(discovery)": {
+                    "samples": round(latency.total),
+                    "p50_seconds": latency.percentile(50),
+                    "p99_seconds": latency.percentile(99),
+                    "timeout_seconds": self.timeout(float("inf"), tool) if latency.total >= self.min_samples else None,
+                }
+                for tool, latency in self.latency.items()
+            },
+        }
+
+
+class CircuitBreakerRegistry:
+    """Circuit breakers keyed by MCP container name, created on first use."""
+
+    def __init__(self, **breaker_kwargs):
+        self.breaker_kwargs = breaker_kwargs
+        self._breakers: Dict[str, CircuitBreaker] = {}
+
+    def get(self, name: str) -> CircuitBreaker:
+        breaker = self._breakers.get(name)
+        if breaker is None:
+            breaker = self._breakers[name] = CircuitBreaker(name, **self.breaker_kwargs)
+        return breaker
+
+    def is_healthy(self, name: str) -> bool:
+        breaker = self._breakers.get(name)
+        return breaker is None or breaker.healthy
+
+    def unhealthy(self) -> List[str]:
+        return [name for name, breaker in self._breakers.items() if not breaker.healthy]
+
+    def status(self) -> Dict[str, Dict[str, Any]]:
+        return {name: breaker.status() for name, breaker in self._breakers.items()}
+
+
+circuit_breakers = CircuitBreakerRegistry()
@@ -0,0 +1,174 @@
+import uuid
+import logging
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from langchain_core.messages import (
+    BaseMessage, HumanMessage, AIMessage, SystemMessage, ToolMessage, RemoveMessage,
+)
+
+logger = logging.getLogger(__name__)
+
+# Context keys owned by the graph itself; never evicted by compaction.
+RESERVED_CONTEXT_KEYS = ("used_tools", "selected_tools", "run_mode", "catalog_version", "selection_source")
+
+SUMMARY_PREFIX = "Summary of the earlier conversation:\n"
+
+
+def estimate_tokens(message: BaseMessage) -> int:
+    """Rough token count (~4 characters per token) for budget decisions."""
+    content = message.content if isinstance(message.content, str) else str(message.content)
+    tool_calls = getattr(message, "tool_calls", None) or []
+    return (len(content) + sum(len(str(call.get("args", ""))) for call in tool_calls)) // 4 + 4
+
+
+class ToolOutputStore:
+    """
+    Bounded, in-process store for large tool outputs moved out of the message history.
+
+    Old ToolMessages keep a short preview plus a `ref:<id>` handle that can be
+    resolved here while the entry is still retained.
+    """
+
+    def __init__(self, max_entries: int = 256):
+        self.max_entries = max_entries
+        self._outputs: "OrderedDict[str, str]" = OrderedDict()
+
+    def put(self, content: str) -> str:
+        ref = uuid.uuid4().hex[:12]
+        self._outputs[ref] = content
+        while len(self._outputs) > self.max_entries:
+            self._outputs.popitem(last=False)
+        return ref
+
+    def get(self, ref: str) -> Optional[str]:
+        return self._outputs.get(ref.removeprefix("ref:"))
+
+
+def offload_content(content: str, store: ToolOutputStore, inline_chars: int) -> str:
+    """Replaces oversized content with a preview and a reference into `store`."""
+    if len(content) <= inline_chars:
+        return content
+    ref = store.put(content)
+    preview = content[: inline_chars // 2]
+    return f"{preview}\n... [{len(content)} chars stored out of band as ref:{ref}]"
+
+
+def compact_context(context: Dict[str, Any], store: ToolOutputStore, max_keys: int = 32,
+                    inline_chars: int = 2000) -> Dict[str, Any]:
+    """
+    Bounds the context dict that tool outputs are merged into.
+
+    Large string values are offloaded to `store`, and only the `max_keys` most
+    recently inserted non-reserved keys are kept.
+    """
+    compacted = {key: context[key] for key in RESERVED_CONTEXT_KEYS if key in context}
+    other_keys = [key for key in context if key not in RESERVED_CONTEXT_KEYS][-max_keys:]
+    for key in other_keys:
+        value = context[key]
+        text = value if isinstance(value, str) else str(value)
+        if len(text) > inline_chars:
+            value = offload_content(text, store, inline_chars)
+        compacted[key] = value
+    return compacted
+
+
+def _turn_starts(messages: List[BaseMessage]) -> List[int]:
+    return [i for i, message in enumerate(messages) if isinstance(message, HumanMessage)]
+
+
+def _transcript(messages: List[BaseMessage], max_chars_per_message: int = 1000) -> str:
+    lines = []
+    for message in messages:
+        content = message.content if isinstance(message.content, str) else str(message.content)
+        lines.append(f"{message.type}: {content[:max_chars_per_message]}")
+    return "\n".join(lines)
+
+
+async def compact_messages(
+    messages: List[BaseMessage],
+    store: ToolOutputStore,
+    summarize: Optional[Callable[[str], Awaitable[str]]] = None,
+    token_budget: int = 12000,
+    keep_recent_turns: int = 4,
+    inline_chars: int = 4000,
+) -> List[BaseMessage]:
+    """
+    Returns message updates (for the `add_messages` reducer) that bound the history.
+
+    1. ToolMessages from earlier turns larger than `inline_chars` are replaced,
+       by id, with a preview and an out-of-band reference. The current turn is
+       left intact so the assistant still sees full results it is acting on.
+    2. If the history still exceeds `token_budget`, every turn before the last
+       `keep_recent_turns` is replaced by a single summary message at the head
+       of the history. Cuts are made on user-turn boundaries so tool calls stay
+       paired.
+    """
+    turn_starts = _turn_starts(messages)
+    if not turn_starts:
+        return []
+    current_turn = turn_starts[-1]
+
+    updates: List[BaseMessage] = []
+    compacted: Dict[str, BaseMessage] = {}
+    for message in messages[:current_turn]:
+        if isinstance(message, ToolMessage) and isinstance(message.content, str) \
+                and len(message.content) > inline_chars and message.id:
+            replacement = message.model_copy(update={"content": offload_content(message.content, store, inline_chars)})
+            compacted[message.id] = replacement
+            updates.append(replacement)
+
+    effective = [compacted.get(m.id, m) if m.id else m for m in messages]
+    total_tokens = sum(estimate_tokens(m) for m in effective)
+    if total_tokens <= token_budget or len(turn_starts) <= keep_recent_turns:
+        return updates
+
+    cut = turn_starts[-keep_recent_turns]
+    old = effective[:cut]
+    previous_summary = next(
+        (m.content for m in old if isinstance(m, SystemMessage) and str(m.content).startswith(SUMMARY_PREFIX)),
+        None,
+    )
+    transcript = _transcript([m for m in old if not (isinstance(m, SystemMessage) and m.content == previous_summary)])
+    if previous_summary:
+        transcript = f"{previous_summary}\n{transcript}"
+
+    summary = None
+    if summarize is not None:
+        try:
+            summary = await summarize(transcript)
+        except Exception as e:
+            logger.warning(f"⚠️ History summarization failed, keeping request list only: {e}")
+    if not summary:
+        summary = "\n".join(
+            f"- user asked: {str(m.content)[:200]}" for m in old if isinstance(m, HumanMessage)
+        )
+
+    logger.info(f"🗜️ Compacted {len(old)} messages (~{total_tokens} tokens) into a summary")
+    # The reducer replaces a message in place when the id matches, so the summary
+    # takes the slot of the oldest message and the rest are removed.
+    with_ids = [m for m in old if m.id]
+    if not with_ids:
+        return updates
+    first, *rest = with_ids
+    removed = {m.id for m in with_ids}
+    return (
+        [SystemMessage(content=SUMMARY_PREFIX + summary, id=first.id)]
+        + [RemoveMessage(id=m.id) for m in rest]
+        + [m for m in updates if m.id not in removed]
+    )
+
+
+def summarizer_for(llm) -> Callable[[str], Awaitable[str]]:
+    """Builds a `summarize` callable for `compact_messages` backed by a chat model."""
+    async def summarize(transcript: str) -> str:
+        response = await llm.ainvoke([
+            SystemMessage(content=(
+                "Summarize this network-operations conversation for your own future reference. "
+                "Keep device names, IPs, commands run, tool results that matter, decisions and open "
+                "requests. Be concise."
+            )),
+            HumanMessage(content=transcript),
+        ])
+        return response.content if isinstance(response, AIMessage) else str(response)
+    return summarize
@@ -0,0 +1,141 @@
+import os
+import asyncio
+from contextlib import asynccontextmanager
+from typing import Optional
+
+from fastapi import FastAPI
+from fastapi.responses import JSONResponse
+from pydantic import BaseModel
+
+from mcpyats import runtime
+from network_snapshot import network_topology
+from structured_logging import debug_capture
+from circuit_breaker import circuit_breakers
+from session_runner import MultiSessionRunner, RunnerBusy, last_reply
+
+WARMUP_ON_START = os.getenv("MCPYATS_WARMUP", "true").lower() in ("1", "true", "yes")
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Discovery and indexing run in the background; the server accepts requests immediately.
+    if WARMUP_ON_START:
+        runtime.warm_up()
+    yield
+
+
+_session_runner: Optional[MultiSessionRunner] = None
+
+
+def session_runner() -> MultiSessionRunner:
+    global _session_runner
+    if _session_runner is None:
+        _session_runner = MultiSessionRunner()
+    return _session_runner
+
+
+# Custom routes mounted next to the LangGraph API (see `http.app` in langgraph.json).
+app = FastAPI(lifespan=lifespan)
+
+
+@app.get("/healthz")
+async def healthz():
+    """Liveness: the process is up and serving requests."""
+    return {"status": "ok"}
+
+
+@app.get("/readyz")
+async def readyz():
+    """Readiness: tools are discovered and indexed, so graph runs will not block on warm-up."""
+    status = runtime.status()
+    return JSONResponse(status, status_code=200 if status["ready"] else 503)
+
+
+@app.get("/debug/tool-output/{ref}")
+async def debug_tool_output(ref: str):
+    """Returns a tool output that history compaction moved out of the conversation."""
+    content = runtime.tool_outputs.get(ref)
+    if content is None:
+        return JSONResponse({"error": f"{ref} is not retained"}, status_code=404)
+    return {"ref": ref, "content": content}
+
+
+@app.get("/debug/network")
+async def debug_network(refresh: bool = False):
+    """Returns the cached docker network topology, optionally refreshing it first."""
+    network_topology.ensure_started()
+    if refresh:
+        return await network_topology.refresh()
+    return network_topology.snapshot()
+
+
+@app.get("/debug/captures")
+async def debug_captures(limit: int = 20):
+    """Returns full payloads captured for recent failed tool calls and LLM invocations."""
+    return {"captures": debug_capture.recent(limit)}
+
+
+@app.get("/debug/services")
+async def debug_services():
+    """Circuit breaker state and latency percentiles per MCP service."""
+    return circuit_breakers.status()
+
+
+@app.get("/debug/tool-selection")
+async def debug_tool_selection():
+    """How selections were made (cache, fast path, LLM refinement) and how often the assistant strayed from them."""
+    return {"cache": runtime.selection_cache.hits, **runtime.selection_metrics.summary()}
+
+
+@app.get("/debug/catalog")
+async def debug_catalog():
+    """Current tool catalog version and the tools each service contributes."""
+    catalog = runtime.catalog
+    return {
+        "version": catalog.version,
+        "services": {service: [t.name for t in catalog.tools_for_service(service)] for service in catalog.services()},
+    }
+
+
+@app.post("/admin/catalog/{service}/reload")
+async def reload_service(service: str):
+    """
+    Rediscovers one configured MCP service and swaps in the updated catalog.
+
+    Only services already in `MCP_SERVICES` can be reloaded; registering a new
+    command is left to code, since it would run in a container via `docker exec`.
+    """
+    try:
+        return await runtime.reload_service(service)
+    except ValueError as e:
+        return JSONResponse({"error": str(e)}, status_code=404)
+
+
+class SessionMessage(BaseModel):
+    message: str
+    timeout: Optional[float] = None
+
+
+@app.post("/sessions/{session_id}/messages")
+async def session_message(session_id: str, body: SessionMessage):
+    """Runs one turn of a checkpointed operator session; 429 when the runner is saturated."""
+    try:
+        state = await session_runner().submit(session_id, body.message, timeout=body.timeout)
+    except RunnerBusy as e:
+        return JSONResponse({"error": str(e)}, status_code=429, headers={"Retry-After": "1"})
+    except asyncio.TimeoutError:
+        return JSONResponse({"error": f"Turn did not finish within {body.timeout}s"}, status_code=504)
+    return {"session_id": session_id, "reply": last_reply(state), "messages": len(state.get("messages", []))}
+
+
+@app.delete("/sessions/{session_id}")
+async def reset_session(session_id: str):
+    """Forgets a session's checkpointed conversation."""
+    await session_runner().reset(session_id)
+    return {"session_id": session_id, "reset": True}
+
+
+@app.get("/debug/sessions")
+async def debug_sessions():
+    """Runs in progress and queued across sessions."""
+    return session_runner().status()
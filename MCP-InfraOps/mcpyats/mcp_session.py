@@ -0,0 +1,472 @@
+import os
+import json
+import asyncio
+import logging
+import itertools
+import time
+from collections import deque
+from typing import Dict, Any, List, Optional, Tuple, Callable
+
+logger = logging.getLogger(__name__)
+
+# Large `show running-config` or file reads come back as a single JSON line.
+DEFAULT_MAX_LINE_BYTES = int(os.getenv("MCP_MAX_RESPONSE_BYTES", str(32 * 1024 * 1024)))
+READ_CHUNK_BYTES = 64 * 1024
+# Requests outstanding at once across every pooled container session.
+DEFAULT_MAX_IN_FLIGHT = int(os.getenv("MCP_MAX_IN_FLIGHT", "32"))
+# Time a closed session's server gets to exit on stdin EOF before the exec client is killed.
+CLOSE_GRACE_SECONDS = float(os.getenv("MCP_CLOSE_GRACE_SECONDS", "2"))
+
+ProgressCallback = Callable[[Dict[str, Any]], None]
+
+
+class MCPSessionError(Exception):
+    """Raised when a stdio session dies before answering a request."""
+
+
+class MCPSessionUnavailable(MCPSessionError):
+    """Raised when a request could not be written to the session at all."""
+
+
+class MCPResponseTooLarge(MCPSessionError):
+    """Raised when a response line exceeds the session's size cap."""
+
+
+class LineFramer:
+    """
+    Incrementally splits a byte stream into newline-terminated frames.
+
+    Only the current partial line is buffered. A line that grows past
+    `max_line_bytes` is dropped up to its terminating newline and reported as
+    an overflow instead of being buffered in full.
+    """
+
+    def __init__(self, max_line_bytes: int = DEFAULT_MAX_LINE_BYTES):
+        self.max_line_bytes = max_line_bytes
+        self._buffer = bytearray()
+        self._discarding = False
+
+    @property
+    def partial_size(self) -> int:
+        return len(self._buffer)
+
+    def feed(self, chunk: bytes) -> Tuple[List[bytes], bool]:
+        """Returns the lines completed by `chunk` and whether a line overflowed the cap."""
+        lines = []
+        overflowed = False
+        *complete, tail = chunk.split(b"\n")
+        for part in complete:
+            if self._discarding:
+                self._discarding = False
+            else:
+                self._buffer += part
+                if len(self._buffer) > self.max_line_bytes:
+                    overflowed = True
+                else:
+                    lines.append(bytes(self._buffer))
+            self._buffer.clear()
+        if not self._discarding:
+            self._buffer += tail
+            if len(self._buffer) > self.max_line_bytes:
+                overflowed = True
+                self._discarding = True
+                self._buffer.clear()
+        return lines, overflowed
+
+
+def persistent_command(command: List[str]) -> List[str]:
+    """
+    Returns the long-running form of a server command.
+
+    The Python MCP servers (`server.py`, `pyats_mcp_server.py`) answer a single
+    request and exit when started with `--oneshot`; without it they serve stdin
+    in a loop, which is what a pooled session needs. They must exit when stdin
+    reaches EOF, which is how `MCPStdioSession.close` stops them inside the container.
+    """
+    return [part for part in command if part != "--oneshot"]
+
+
+class MCPStdioSession:
+    """
+    A long-lived `docker exec -i <container> <command>` process speaking
+    line-framed JSON-RPC over stdin/stdout.
+
+    Requests are multiplexed by JSON-RPC id. Some of the Python servers do not
+    echo the request id back; until a response carrying our id has been seen,
+    the session keeps a single request in flight and matches replies in order.
+    """
+
+    def __init__(self, container_name: str, command: List[str],
+                 max_line_bytes: int = DEFAULT_MAX_LINE_BYTES):
+        self.container_name = container_name
+        self.command = persistent_command(command)
+        self.max_line_bytes = max_line_bytes
+        self.process: Optional[asyncio.subprocess.Process] = None
+        self.loop: Optional[asyncio.AbstractEventLoop] = None
+        self.last_used = time.monotonic()
+        self._ids = itertools.count(1)
+        self._pending: Dict[str, asyncio.Future] = {}
+        self._order: deque = deque()
+        self._echoes_ids: Optional[bool] = None
+        self._serial_lock: Optional[asyncio.Lock] = None
+        self._write_lock: Optional[asyncio.Lock] = None
+        self._reader_task: Optional[asyncio.Task] = None
+        self._stderr_task: Optional[asyncio.Task] = None
+        self._stderr_tail: deque = deque(maxlen=20)
+        self._progress: Dict[str, ProgressCallback] = {}
+
+    @property
+    def in_flight(self) -> int:
+        return len(self._pending)
+
+    @property
+    def idle_for(self) -> float:
+        return 0.0 if self._pending else time.monotonic() - self.last_used
+
+    def is_alive(self) -> bool:
+        """Health check: the exec'd process is running and its reader is attached."""
+        if self.process is None or self.process.returncode is not None:
+            return False
+        if self._reader_task is None or self._reader_task.done():
+            return False
+        try:
+            return self.loop is asyncio.get_running_loop()
+        except RuntimeError:
+            return False
+
+    async def start(self):
+        """Spawns the container process and attaches the stdout/stderr readers."""
+        command = ["docker", "exec", "-i", self.container_name] + self.command
+        logger.info(f"🔌 Opening MCP session: {' '.join(command)}")
+        self.loop = asyncio.get_running_loop()
+        self._serial_lock = asyncio.Lock()
+        self._write_lock = asyncio.Lock()
+        self.process = await asyncio.create_subprocess_exec(
+            *command,
+            stdin=asyncio.subprocess.PIPE,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.PIPE,
+        )
+        self._reader_task = asyncio.create_task(self._read_stdout())
+        self._stderr_task = asyncio.create_task(self._read_stderr())
+        self.last_used = time.monotonic()
+
+    async def request(self, method: str, params: Dict[str, Any], timeout: float = 60,
+                      on_progress: Optional[ProgressCallback] = None) -> Dict[str, Any]:
+        """
+        Sends one JSON-RPC request and waits for its response.
+
+        `on_progress` receives MCP `notifications/progress` for the request and,
+        while it is the only request in flight, the byte count of the response
+        received so far.
+
+        Returns:
+            The decoded JSON-RPC response object.
+
+        Raises:
+            MCPSessionUnavailable: If the request could not be written.
+            MCPResponseTooLarge: If the response exceeds `max_line_bytes`.
+            MCPSessionError: If the process exits before responding.
+            asyncio.TimeoutError: If no response arrives within `timeout`.
+        """
+        if self._echoes_ids:
+            return await self._request(method, params, timeout, on_progress)
+        async with self._serial_lock:
+            return await self._request(method, params, timeout, on_progress)
+
+    async def _request(self, method: str, params: Dict[str, Any], timeout: float,
+                       on_progress: Optional[ProgressCallback]) -> Dict[str, Any]:
+        if not self.is_alive():
+            raise MCPSessionUnavailable(f"Session to {self.container_name} is not running")
+
+        request_id = str(next(self._ids))
+        future = self.loop.create_future()
+        self._pending[request_id] = future
+        self._order.append(request_id)
+        if on_progress is not None:
+            self._progress[request_id] = on_progress
+            params = {**params, "_meta": {**params.get("_meta", {}), "progressToken": request_id}}
+        payload = {"jsonrpc": "2.0", "method": method, "params": params, "id": request_id}
+
+        try:
+            async with self._write_lock:
+                self.process.stdin.write(json.dumps(payload).encode() + b"\n")
+                await self.process.stdin.drain()
+            return await asyncio.wait_for(future, timeout=timeout)
+        except (BrokenPipeError, ConnectionResetError) as e:
+            raise MCPSessionUnavailable(f"Pipe to {self.container_name} closed: {e}") from e
+        except asyncio.TimeoutError:
+            if not self._echoes_ids:
+                # A late reply would be matched to the next request; start over.
+                logger.warning(f"⏱️ Discarding session to {self.container_name} after timeout")
+                await self.close()
+            raise
+        finally:
+            self._pending.pop(request_id, None)
+            self._progress.pop(request_id, None)
+            try:
+                self._order.remove(request_id)
+            except ValueError:
+                pass
+            self.last_used = time.monotonic()
+
+    async def _read_stdout(self):
+        framer = LineFramer(self.max_line_bytes)
+        try:
+            while True:
+                chunk = await self.process.stdout.read(READ_CHUNK_BYTES)
+                if not chunk:
+                    break
+                lines, overflowed = framer.feed(chunk)
+                for line in lines:
+                    line = line.strip()
+                    if not line.startswith(b"{"):
+                        continue
+                    try:
+                        response = json.loads(line)
+                    except json.JSONDecodeError:
+                        continue
+                    if isinstance(response, dict):
+                        self._dispatch(response)
+                if overflowed:
+                    self._fail_oversized()
+                if framer.partial_size and len(self._order) == 1:
+                    self._report_progress(self._order[0], {"type": "bytes", "received": framer.partial_size})
+        finally:
+            self._fail_pending(MCPSessionError(
+                f"Session to {self.container_name} closed: {' | '.join(self._stderr_tail)}"
+            ))
+
+    def _report_progress(self, request_id: str, event: Dict[str, Any]):
+        callback = self._progress.get(request_id)
+        if callback is None:
+            return
+        try:
+            callback(event)
+        except Exception as e:
+            logger.debug(f"Progress callback failed: {e}")
+
+    def _fail_oversized(self):
+        logger.error(f"❌ Response from {self.container_name} exceeded {self.max_line_bytes} bytes")
+        # The oversized reply belongs to the oldest request when replies are ordered,
+        # or to the only request in flight.
+        if not self._order or (self._echoes_ids and len(self._order) > 1):
+            return
+        request_id = self._order.popleft()
+        future = self._pending.pop(request_id, None)
+        if future and not future.done():
+            future.set_exception(MCPResponseTooLarge(
+                f"Response from {self.container_name} exceeded {self.max_line_bytes} bytes"
+            ))
+
+    def _dispatch(self, response: Dict[str, Any]):
+        if "method" in response:
+            # Server-initiated notification, not a reply.
+            if response["method"] == "notifications/progress":
+                params = response.get("params") or {}
+                self._report_progress(str(params.get("progressToken")), {"type": "progress", **params})
+            return
+        response_id = response.get("id")
+        key = str(response_id) if response_id is not None else None
+        if key in self._pending:
+            self._echoes_ids = True
+        elif self._order and not self._echoes_ids and ("result" in response or "error" in response):
+            # Server does not echo ids; replies arrive in request order. Other JSON
+            # lines (e.g. structured log output) are not replies.
+            if self._echoes_ids is None:
+                self._echoes_ids = False
+            key = self._order[0]
+        else:
+            logger.debug(f"Dropping unsolicited message from {self.container_name}: {response}")
+            return
+
+        future = self._pending.pop(key, None)
+        try:
+            self._order.remove(key)
+        except ValueError:
+            pass
+        if future and not future.done():
+            future.set_result(response)
+
+    async def _read_stderr(self):
+        while True:
+            line = await self.process.stderr.readline()
+            if not line:
+                break
+            text = line.decode(errors="replace").rstrip()
+            if text:
+                self._stderr_tail.append(text)
+                logger.debug(f"[{self.container_name} stderr] {text}")
+
+    def _fail_pending(self, error: Exception):
+        for future in self._pending.values():
+            if not future.done():
+                future.set_exception(error)
+        self._pending.clear()
+        self._order.clear()
+
+    async def close(self):
+        """
+        Closes the server's stdin, then terminates the process and cancels the reader tasks.
+
+        Killing only the local `docker exec` client would leave the server running
+        inside the container; EOF on stdin is what makes it exit.
+        """
+        if self.process and self.process.returncode is None:
+            try:
+                self.process.stdin.close()
+                await asyncio.wait_for(self.process.wait(), timeout=CLOSE_GRACE_SECONDS)
+            except (asyncio.TimeoutError, ProcessLookupError, RuntimeError):
+                pass
+            try:
+                if self.process.returncode is None:
+                    self.process.kill()
+            except (ProcessLookupError, RuntimeError):
+                pass
+        for task in (self._reader_task, self._stderr_task):
+            if task and not task.done():
+                task.cancel()
+        self._fail_pending(MCPSessionError(f"Session to {self.container_name} closed"))
+
+
+class MCPSessionPool:
+    """
+    Per-container pool of long-lived MCP stdio sessions.
+
+    Sessions are opened on demand, reused across tool calls, respawned when
+    their process dies and reaped after `idle_timeout` seconds without use.
+    At most `max_in_flight` requests are outstanding across all containers;
+    further requests wait for a slot.
+
+    Sessions belong to the event loop that spawned them. Requests made from
+    another loop while that loop is running are forwarded to it; the pool
+    only rebinds (and drops its sessions) once the owning loop has stopped.
+    """
+
+    def __init__(self, max_sessions_per_container: int = 2, idle_timeout: float = 300,
+                 health_interval: float = 30, max_in_flight: int = DEFAULT_MAX_IN_FLIGHT):
+        self.max_sessions_per_container = max_sessions_per_container
+        self.max_in_flight = max_in_flight
+        self._in_flight: Optional[asyncio.Semaphore] = None
+        self.idle_timeout = idle_timeout
+        self.health_interval = health_interval
+        self._sessions: Dict[Tuple[str, Tuple[str, ...]], List[MCPStdioSession]] = {}
+        self._spawn_locks: Dict[Tuple[str, Tuple[str, ...]], asyncio.Lock] = {}
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._reaper_task: Optional[asyncio.Task] = None
+
+    @property
+    def loop(self) -> Optional[asyncio.AbstractEventLoop]:
+        """The event loop the pooled sessions belong to."""
+        return self._loop
+
+    def _owning_loop_elsewhere(self) -> Optional[asyncio.AbstractEventLoop]:
+        """The loop owning the sessions if it is another, still running loop."""
+        owner = self._loop
+        if owner is None or owner is asyncio.get_running_loop():
+            return None
+        if owner.is_closed() or not owner.is_running():
+            return None
+        return owner
+
+    def _bind_loop(self):
+        # Subprocess transports belong to the loop that created them; only a
+        # stopped loop's sessions are abandoned.
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            for sessions in list(self._sessions.values()):
+                for session in sessions:
+                    if session.process and session.process.returncode is None:
+                        try:
+                            session.process.kill()
+                        except (ProcessLookupError, RuntimeError):
+                            pass
+            self._sessions.clear()
+            self._spawn_locks.clear()
+            self._in_flight = asyncio.Semaphore(self.max_in_flight)
+            self._loop = loop
+            self._reaper_task = loop.create_task(self._reap_forever())
+
+    async def acquire(self, container_name: str, command: List[str]) -> MCPStdioSession:
+        """Returns the least-loaded healthy session, spawning one if needed."""
+        self._bind_loop()
+        key = (container_name, tuple(command))
+        sessions = self._sessions.setdefault(key, [])
+        sessions[:] = [s for s in sessions if s.is_alive()]
+
+        idle = [s for s in sessions if s.in_flight == 0]
+        if idle or len(sessions) >= self.max_sessions_per_container:
+            return min(idle or sessions, key=lambda s: s.in_flight)
+
+        lock = self._spawn_locks.setdefault(key, asyncio.Lock())
+        async with lock:
+            alive = [s for s in sessions if s.is_alive()]
+            idle = [s for s in alive if s.in_flight == 0]
+            if idle or len(alive) >= self.max_sessions_per_container:
+                return min(idle or alive, key=lambda s: s.in_flight)
+            session = MCPStdioSession(container_name, command)
+            await session.start()
+            sessions.append(session)
+            return session
+
+    async def request(self, container_name: str, command: List[str], method: str,
+                      params: Dict[str, Any], timeout: float = 60,
+                      on_progress: Optional[ProgressCallback] = None) -> Dict[str, Any]:
+        """
+        Sends a JSON-RPC request over a pooled session.
+
+        A request that could not be written because the session had already died
+        is retried once on a fresh session. A session dying after the request
+        was written is surfaced, since the tool may already have run.
+        """
+        owner = self._owning_loop_elsewhere()
+        if owner is not None:
+            # Run on the loop that owns the warm sessions instead of respawning them here.
+            caller = asyncio.get_running_loop()
+            forward_progress = None
+            if on_progress is not None:
+                def forward_progress(event: Dict[str, Any]):
+                    caller.call_soon_threadsafe(on_progress, event)
+            return await asyncio.wrap_future(asyncio.run_coroutine_threadsafe(
+                self.request(container_name, command, method, params, timeout, forward_progress), owner
+            ))
+
+        self._bind_loop()
+        async with self._in_flight:
+            session = await self.acquire(container_name, command)
+            try:
+                return await session.request(method, params, timeout=timeout, on_progress=on_progress)
+            except MCPSessionUnavailable:
+                logger.warning(f"♻️ Respawning MCP session for {container_name}")
+                await session.close()
+                session = await self.acquire(container_name, command)
+                return await session.request(method, params, timeout=timeout, on_progress=on_progress)
+
+    async def reap(self):
+        """Closes dead sessions and sessions idle for longer than `idle_timeout`."""
+        # Snapshot: acquire() may add containers while a close is awaited.
+        for sessions in list(self._sessions.values()):
+            for session in list(sessions):
+                if session in sessions and (not session.is_alive() or session.idle_for > self.idle_timeout):
+                    sessions.remove(session)
+                    await session.close()
+
+    async def _reap_forever(self):
+        while True:
+            await asyncio.sleep(self.health_interval)
+            try:
+                await self.reap()
+            except Exception as e:
+                logger.error(f"❌ Session reaper error: {e}")
+
+    async def close(self):
+        """Closes every pooled session."""
+        for sessions in list(self._sessions.values()):
+            for session in list(sessions):
+                await session.close()
+        self._sessions.clear()
+        if self._reaper_task and not self._reaper_task.done():
+            self._reaper_task.cancel()
+
+
+session_pool = MCPSessionPool()
@@ -1,23 +1,23 @@
 import os
 import re
-import json
+import time
+import random
 import asyncio
 import inspect
 import logging
 import importlib
-import subprocess
+import contextvars
 from functools import wraps
+from collections import OrderedDict
 from dotenv import load_dotenv
 from langsmith import traceable
-from pydantic import BaseModel, Field
 from typing_extensions import TypedDict
-from langchain_core.documents import Document
 from langchain_core.messages import ToolMessage, BaseMessage
 from langchain.tools import Tool, StructuredTool
 from langgraph.graph.message import add_messages
-from langchain_core.vectorstores import InMemoryVectorStore
-from typing import Dict, Any, List, Optional, Union, Annotated
+from typing import Dict, Any, List, Optional, Tuple, Union, Annotated
 from langgraph.graph import StateGraph, START, END
+from langgraph.config import get_stream_writer
 from langgraph.prebuilt.tool_node import tools_condition, ToolNode
 from langchain_core.messages import HumanMessage, AIMessage, SystemMessage, ToolMessage
 from langchain_google_genai import ChatGoogleGenerativeAI, GoogleGenerativeAIEmbeddings
@@ -26,10 +26,61 @@ from langchain_core.runnables import RunnableConfig
 
 from langchain_openai import ChatOpenAI
 
+from mcp_session import MCPSessionPool, MCPSessionError, MCPResponseTooLarge, ProgressCallback, session_pool
+from network_snapshot import network_topology
+from tool_catalog_cache import tool_catalog_cache, container_image_digest
+from tool_index import ToolEmbeddingIndex, tool_document_text, adaptive_cutoff, diversify
+from selection_cache import SelectionCache, SelectionMetrics, TTLCache
+from schema_models import schema_to_pydantic_model, validate_tool_arguments
+from history import ToolOutputStore, compact_messages, compact_context, summarizer_for
+from structured_logging import EventLogger, debug_capture, truncate
+from circuit_breaker import circuit_breakers
+from tool_catalog import ToolCatalog, definition_hash, diff_service_tools
+from tools.batch import parse_targets, target_options, run_batch
+from tools.http_client import run_sync
+
 load_dotenv()
 
 logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(name)s - %(levelname)s - %(message)s")
 logger = logging.getLogger(__name__)
+call_tool_log = EventLogger(logger, "call_tool")
+assistant_log = EventLogger(logger, "assistant")
+
+DISCOVERY_TIMEOUT = float(os.getenv("MCP_DISCOVERY_TIMEOUT", "30"))
+EMBEDDING_MODEL = "models/embedding-001"
+# Tools matching this are treated as side-effecting unless their MCP annotations say otherwise.
+SIDE_EFFECT_TOOL_PATTERN = re.compile(
+    r"(^|_)(create|update|delete|remove|write|edit|move|push|merge|fork|send|post|reply|add|configure|set)(_|$)",
+    re.IGNORECASE,
+)
+# History compaction (see history.py)
+HISTORY_TOKEN_BUDGET = int(os.getenv("HISTORY_TOKEN_BUDGET", "12000"))
+HISTORY_KEEP_RECENT_TURNS = int(os.getenv("HISTORY_KEEP_RECENT_TURNS", "4"))
+TOOL_OUTPUT_INLINE_CHARS = int(os.getenv("TOOL_OUTPUT_INLINE_CHARS", "4000"))
+CONTEXT_MAX_KEYS = int(os.getenv("CONTEXT_MAX_KEYS", "32"))
+TOOL_CALL_MODE = os.getenv("TOOL_CALL_MODE", "parallel")  # "parallel" or "sequential"
+TOOL_CALL_CONCURRENCY_PER_SERVICE = int(os.getenv("TOOL_CALL_CONCURRENCY_PER_SERVICE", "4"))
+SELECTION_CACHE_TTL = float(os.getenv("SELECTION_CACHE_TTL", "900"))
+# Cosine similarity above which a new request reuses a cached selection; empty disables it.
+SELECTION_CACHE_SIMILARITY = float(os.getenv("SELECTION_CACHE_SIMILARITY", "0.97") or 0) or None
+# Tool retrieval: candidate pool, adaptive candidate count and per-service cap
+TOOL_RETRIEVAL_POOL = 35
+TOOL_RETRIEVAL_MIN = int(os.getenv("TOOL_RETRIEVAL_MIN", "3"))
+TOOL_RETRIEVAL_MAX = int(os.getenv("TOOL_RETRIEVAL_MAX", "8"))
+TOOL_RETRIEVAL_MARGIN = float(os.getenv("TOOL_RETRIEVAL_MARGIN", "0.12"))
+TOOL_RETRIEVAL_MAX_PER_SERVICE = int(os.getenv("TOOL_RETRIEVAL_MAX_PER_SERVICE", "4"))
+# Skip the refinement LLM call when the top tool scores at least this and leads the runner-up by the gap
+FAST_PATH_MIN_SCORE = float(os.getenv("TOOL_FAST_PATH_MIN_SCORE", "0.70"))
+FAST_PATH_MIN_GAP = float(os.getenv("TOOL_FAST_PATH_MIN_GAP", "0.10"))
+# Share of fast-path selections also refined in the background to measure what the fast path misses
+FAST_PATH_AUDIT_RATE = float(os.getenv("TOOL_FAST_PATH_AUDIT_RATE", "0.05"))
+# Requests that point at one tool: (pattern, tool name)
+TOOL_QUERY_PATTERNS = [
+    (re.compile(r"\bshow\s+run(ning)?(-config)?\b", re.I), "pyATS_show_running_config"),
+    (re.compile(r"\bping\b.*\bfrom\b", re.I), "pyATS_ping_from_network_device"),
+]
+# Catalog versions kept for graph runs that started before a reload
+CATALOG_VERSIONS_RETAINED = 8
 
 class GraphState(TypedDict):
     """Improved state tracking for LangGraph."""
@@ -61,172 +112,141 @@ def load_local_tools_from_folder(folder_path: str) -> List[Tool]:
     return local_tools
 
 def wrap_dict_input_tool(tool_obj: Tool) -> Tool:
-    """Wraps a tool function to handle string or dict input."""
+    """
+    Wraps a local tool to take one target or many (string, list or dict input).
+
+    A single target calls the tool as before. Several targets (a list, a
+    comma-separated string or a CIDR prefix) fan out through `tools.batch`
+    with bounded concurrency and come back as one table.
+    """
     original_func = tool_obj.func
+    original_coroutine = tool_obj.coroutine
 
-    @wraps(original_func)
-    def wrapper(input_value):
+    def single_input(input_value, targets):
+        if targets:
+            return {**target_options(input_value), "ip": targets[0]}
         if isinstance(input_value, str):
-            input_value = {"ip": input_value}
-        elif isinstance(input_value, dict) and "ip" not in input_value:
+            return {"ip": input_value}
+        if isinstance(input_value, dict) and "ip" not in input_value:
             logger.warning(f"⚠️ Missing 'ip' key in dict: {input_value}")
-        return original_func(input_value)
+        return input_value
+
+    async def call_one(input_value):
+        if original_coroutine is not None:
+            return await original_coroutine(input_value)
+        return await asyncio.to_thread(original_func, input_value)
+
+    @wraps(original_func)
+    async def async_wrapper(input_value):
+        targets = parse_targets(input_value)
+        if len(targets) <= 1:
+            return await call_one(single_input(input_value, targets))
+        return await run_batch(tool_obj.name, call_one, targets, target_options(input_value))
+
+    @wraps(original_func)
+    def wrapper(input_value):
+        targets = parse_targets(input_value)
+        if len(targets) <= 1:
+            return original_func(single_input(input_value, targets))
+        return run_sync(async_wrapper(input_value))
 
     return Tool(
         name=tool_obj.name,
-        description=tool_obj.description,
+        description=f"{tool_obj.description} Accepts one IP or a comma-separated list / CIDR prefix of IPs.",
         func=wrapper,
+        coroutine=async_wrapper,
     )
 
-def schema_to_pydantic_model(name: str, schema: dict):
-    """Dynamically creates a Pydantic model class from a JSON Schema."""
-    from typing import Any, List, Dict, Optional
-    namespace = {"__annotations__": {}}
-
-    if schema.get("type") != "object":
-        raise ValueError("Only object schemas are supported.")
-
-    properties = schema.get("properties", {})
-    required_fields = set(schema.get("required", []))
-
-    for field_name, field_schema in properties.items():
-        json_type = field_schema.get("type", "string")
-        is_optional = field_name not in required_fields
-
-        if json_type == "string":
-            field_type = str
-        elif json_type == "integer":
-            field_type = int
-        elif json_type == "number":
-            field_type = float
-        elif json_type == "boolean":
-            field_type = bool
-        elif json_type == "array":
-            items_schema = field_schema.get("items")
-            if not items_schema:
-                logger.warning(f"⚠️ Skipping field '{field_name}' (array missing 'items')")
-                continue  # Skip malformed array field
-            item_type = items_schema.get("type", "string")
-            if item_type == "string":
-                field_type = List[str]
-            elif item_type == "integer":
-                field_type = List[int]
-            elif item_type == "number":
-                field_type = List[float]
-            elif item_type == "boolean":
-                field_type = List[bool]
-            elif item_type == "object":
-                item_model = schema_to_pydantic_model(name + "_" + field_name + "_Item", items_schema)
-                field_type = List[item_model]
-            else:
-                field_type = List[Any]
-        elif json_type == "object":
-            field_type = Dict[str, Any]
-        else:
-            field_type = Any
-
-        if is_optional:
-            field_type = Optional[field_type]
-
-        namespace["__annotations__"][field_name] = field_type
-        if field_name in required_fields:
-            namespace[field_name] = Field(...)
-        else:
-            namespace[field_name] = Field(default=None)
-
-    return type(name, (BaseModel,), namespace)
-
-
 class MCPToolDiscovery:
-    """Discovers and calls tools in MCP containers."""
+    """Discovers and calls tools in MCP containers over pooled stdio sessions."""
     def __init__(self, container_name: str, command: List[str], discovery_method: str = "tools/discover",
-                 call_method: str = "tools/call"):
+                 call_method: str = "tools/call", pool: Optional[MCPSessionPool] = None):
         self.container_name = container_name
         self.command = command
         self.discovery_method = discovery_method
         self.call_method = call_method
+        self.pool = pool or session_pool
         self.discovered_tools = []
 
     @traceable
-    async def discover_tools(self) -> List[Dict[str, Any]]:
+    async def discover_tools(self, timeout=60) -> List[Dict[str, Any]]:
         """Discovers tools from the MCP container."""
         print(f"🔍 Discovering tools from container: {self.container_name}")
         print(f"🕵️ Discovery Method: {self.discovery_method}")
 
+        breaker = circuit_breakers.get(self.container_name)
         try:
-            discovery_payload = {
-                "jsonrpc": "2.0",
-                "method": self.discovery_method,
-                "params": {},
-                "id": "1"
-            }
-            print(f"Sending discovery payload: {discovery_payload}")
-            command = ["docker", "exec", "-i", self.container_name] + self.command
-            process = subprocess.run(
-                command,
-                input=json.dumps(discovery_payload) + "\n",
-                capture_output=True,
-                text=True,
+            response = await self.pool.request(
+                self.container_name, self.command, self.discovery_method, {}, timeout=timeout
             )
-            stdout_lines = process.stdout.strip().split("\n")
-            print("📥 Raw discovery response:", stdout_lines)
-            if stdout_lines:
-                last_line = None
-                for line in reversed(stdout_lines):
-                    if line.startswith("{") or line.startswith("["):
-                        last_line = line
-                        break
-                if last_line:
-                    try:
-                        response = json.loads(last_line)
-                        if "result" in response:
-                            if isinstance(response["result"], list):
-                                tools = response["result"]
-                            elif isinstance(response["result"], dict) and "tools" in response["result"]:
-                                tools = response["result"]["tools"]
-                            else:
-                                print("❌ Unexpected 'result' structure.")
-                                return []
-                        else:
-                            tools = []
-                        if tools:
-                            print("✅ Discovered tools:", [tool["name"] for tool in tools])
-                            return tools
-                        else:
-                            print("❌ No tools found in response.")
-                            return []
-                    except json.JSONDecodeError as e:
-                        print(f"❌ JSON Decode Error: {e}")
-                        return []
+            breaker.record_success()
+            print("📥 Raw discovery response:", response)
+            if "result" in response:
+                if isinstance(response["result"], list):
+                    tools = response["result"]
+                elif isinstance(response["result"], dict) and "tools" in response["result"]:
+                    tools = response["result"]["tools"]
                 else:
-                    print("❌ No valid JSON response found.")
+                    print("❌ Unexpected 'result' structure.")
                     return []
             else:
-                print("❌ No response lines received.")
+                tools = []
+            if tools:
+                print("✅ Discovered tools:", [tool["name"] for tool in tools])
+                self.discovered_tools = tools
+                return tools
+            else:
+                print("❌ No tools found in response.")
                 return []
+        except asyncio.TimeoutError:
+            breaker.record_failure()
+            print(f"❌ Tool discovery timed out after {timeout} seconds")
+            return []
         except Exception as e:
+            breaker.record_failure()
             print(f"❌ Error discovering tools: {e}")
             return []
         
-    @traceable
-    async def call_tool(self, tool_name: str, arguments: Dict[str, Any], timeout=60):
-        """Calls a tool in the MCP container with logging and error handling."""
-        logger.info(f"🔍 Attempting to call tool: {tool_name}")
-        logger.info(f"📦 Arguments: {arguments}")
-
-        try:
-            # Async network inspection
-            process = await asyncio.create_subprocess_exec(
-                "docker", "network", "inspect", "bridge",
-                stdout=asyncio.subprocess.PIPE,
-                stderr=asyncio.subprocess.PIPE
-            )
-            stdout, stderr = await process.communicate()
-            logger.info(f"🌐 Network Details: {stdout.decode()}")
-        except Exception as e:
-            logger.error(f"❌ Network inspection failed: {e}")
+    def is_side_effecting(self, tool_name: str) -> bool:
+        """Whether the discovered tool changes state (see `is_side_effecting`)."""
+        tool = next((tool for tool in self.discovered_tools if tool.get("name") == tool_name), None)
+        return is_side_effecting(tool) if tool is not None else False
 
-        command = ["docker", "exec", "-i", self.container_name] + self.command
+    @traceable
+    async def call_tool(self, tool_name: str, arguments: Dict[str, Any], timeout=60,
+                        on_progress: Optional[ProgressCallback] = None):
+        """
+        Calls a tool in the MCP container with logging and error handling.
+
+        `timeout` is an upper bound: once the service's circuit breaker has
+        enough samples of this tool, the call times out at twice the tool's p99
+        latency instead. Side-effecting tools always get the full `timeout`,
+        since cutting off a config push does not stop it. While the circuit is open the call fails fast without touching the
+        container. `on_progress` receives progress events while the response
+        is still arriving (see `MCPStdioSession.request`).
+        """
+        call_id = call_tool_log.new_call_id()
+        sampled = call_tool_log.sampled()
+        started = time.monotonic()
+        call_tool_log.event(f"🔍 Attempting to call tool: {tool_name}", sampled=sampled,
+                            call_id=call_id, service=self.container_name, arguments=arguments)
+
+        # Network details are refreshed in the background; see /debug/network.
+        network_topology.ensure_started()
+
+        breaker = circuit_breakers.get(self.container_name)
+        if not breaker.allow():
+            message = f"{self.container_name} is unavailable (circuit open, retry in {breaker.retry_in():.0f}s)"
+            call_tool_log.event(f"🚫 {message}", level=logging.WARNING, call_id=call_id, tool=tool_name)
+            return f"Tool Error: {message}"
+        side_effects = self.is_side_effecting(tool_name)
+        call_timeout = timeout if side_effects else breaker.timeout(timeout, tool_name)
+
+        def failed(level, message, error, result):
+            call_tool_log.event(message, level=level, call_id=call_id, service=self.container_name,
+                                tool=tool_name, elapsed_ms=round((time.monotonic() - started) * 1000))
+            debug_capture.capture(call_id, "call_tool", error)
+            return result
 
         try:
             normalized_args = arguments
@@ -234,79 +254,203 @@ class MCPToolDiscovery:
             if tool_name == "create_or_update_file" and isinstance(normalized_args, dict) and "sha" in normalized_args and normalized_args["sha"] is None:
                 del normalized_args["sha"]
 
-            payload = {
-                "jsonrpc": "2.0",
-                "method": self.call_method,
-                "params": {"name": tool_name, "arguments": normalized_args},
-                "id": "2",
-            }
-
-            logger.info(f"🚀 Full Payload: {json.dumps(payload)}")
-
-            # Create async subprocess
-            process = await asyncio.create_subprocess_exec(
-                *command,
-                stdin=asyncio.subprocess.PIPE,
-                stdout=asyncio.subprocess.PIPE,
-                stderr=asyncio.subprocess.PIPE,
-                env={**os.environ, "PYTHONUNBUFFERED": "1"}
-            )
+            params = {"name": tool_name, "arguments": normalized_args}
+            debug_capture.stash(call_id, service=self.container_name, params=params)
 
             try:
-                # Use asyncio.wait_for to add a timeout
-                stdout, stderr = await asyncio.wait_for(
-                    process.communicate(input=json.dumps(payload).encode() + b"\n"),
-                    timeout=timeout
+                response = await self.pool.request(
+                    self.container_name, self.command, self.call_method, params,
+                    timeout=call_timeout, on_progress=on_progress,
                 )
-
-                logger.info(f"🔬 Subprocess Exit Code: {process.returncode}")
-                logger.info(f"🔬 Full subprocess stdout: {stdout.decode()}")
-                logger.info(f"🔬 Full subprocess stderr: {stderr.decode()}")
-
-                if process.returncode != 0:
-                    logger.error(f"❌ Subprocess returned non-zero exit code: {process.returncode}")
-                    logger.error(f"🚨 Error Details: {stderr.decode()}")
-                    return f"Subprocess Error: {stderr.decode()}"
-
-                output_lines = stdout.decode().strip().split("\n")
-                for line in reversed(output_lines):
-                    try:
-                        response = json.loads(line)
-                        logger.info(f"✅ Parsed JSON response: {response}")
-
-                        if "result" in response:
-                            return response["result"]
-                        elif "error" in response:
-                            error_message = response["error"]
-                            if "tool not found" in str(error_message).lower():
-                                logger.error(f"🚨 Tool '{tool_name}' not found by service.")
-                                return f"Tool Error: Tool '{error_message}"
-                        else:
-                            logger.warning("⚠️ Unexpected response structure")
-                            return response
-                    except json.JSONDecodeError:
-                        continue
-
-                logger.error("❌ No valid JSON response found")
-                return "Error: No valid JSON response"
-
             except asyncio.TimeoutError:
-                # Handle timeout gracefully
-                logger.error(f"⏱️ Tool call to {tool_name} timed out after {timeout} seconds")
-                try:
-                    process.kill()  # Kill the subprocess
-                except:
-                    pass
-                return f"Error: Tool call to {tool_name} timed out after {timeout} seconds"
-
-        except Exception:
-            logger.critical(f"🔥 Critical tool call error", exc_info=True) 
+                if call_timeout < timeout:
+                    # Cut off by the adaptive timeout: slow, not down.
+                    breaker.record_slow(call_timeout, tool_name)
+                else:
+                    breaker.record_failure()
+                message = f"Tool call to {tool_name} timed out after {call_timeout:.0f} seconds"
+                if side_effects:
+                    message += "; it may still be running, so check its effect before retrying"
+                return failed(logging.ERROR, f"⏱️ {message}", message, f"Error: {message}")
+            except MCPResponseTooLarge as e:
+                # The service answered; the response was just too big to accept.
+                breaker.record_success(time.monotonic() - started, tool_name)
+                return failed(logging.ERROR, f"📏 {e}", e,
+                              f"Tool Error: {e}. Narrow the request (e.g. a specific section or path).")
+            except MCPSessionError as e:
+                breaker.record_failure()
+                return failed(logging.ERROR, f"❌ MCP session error: {e}", e, f"Subprocess Error: {e}")
+            except asyncio.CancelledError:
+                breaker.release()
+                raise
+
+            # Tool-level errors still prove the service is up and responsive.
+            breaker.record_success(time.monotonic() - started, tool_name)
+
+            if "result" in response:
+                debug_capture.discard(call_id)
+                call_tool_log.event(f"✅ Tool {tool_name} returned", sampled=sampled, call_id=call_id,
+                                    elapsed_ms=round((time.monotonic() - started) * 1000),
+                                    result=response["result"])
+                return response["result"]
+            elif "error" in response:
+                error_message = response["error"]
+                debug_capture.stash(call_id, response=response)
+                if "tool not found" in str(error_message).lower():
+                    return failed(logging.ERROR, f"🚨 Tool '{tool_name}' not found by service.",
+                                  error_message, f"Tool Error: {error_message}")
+                return failed(logging.WARNING, f"⚠️ Tool {tool_name} returned an error: {truncate(error_message)}",
+                              error_message, f"Tool Error: {error_message}")
+            else:
+                debug_capture.stash(call_id, response=response)
+                return failed(logging.WARNING, "⚠️ Unexpected response structure", "unexpected response", response)
+
+        except Exception as e:
+            breaker.record_failure()
+            logger.critical(f"🔥 Critical tool call error", exc_info=True)
+            debug_capture.capture(call_id, "call_tool", e)
             return "Critical Error: tool call failure"
     
+def is_side_effecting(tool: Dict[str, Any]) -> bool:
+    """
+    Whether a discovered tool changes state and must not run concurrently with other calls.
+
+    MCP tool annotations (`readOnlyHint`, `destructiveHint`) or an explicit
+    `sideEffects` flag win; otherwise the tool name is matched against
+    `SIDE_EFFECT_TOOL_PATTERN`.
+    """
+    annotations = tool.get("annotations") or {}
+    if "sideEffects" in tool:
+        return bool(tool["sideEffects"])
+    if annotations.get("readOnlyHint") is True:
+        return False
+    if annotations.get("destructiveHint") is True or annotations.get("readOnlyHint") is False:
+        return True
+    return bool(SIDE_EFFECT_TOOL_PATTERN.search(tool["name"]))
+
+def tool_progress_writer(service_name: str, tool_name: str) -> Optional[ProgressCallback]:
+    """
+    Forwards tool progress to the graph's custom stream, if the call runs inside a graph.
+
+    Callers see the events with `graph.astream(..., stream_mode="custom")`.
+    """
+    try:
+        writer = get_stream_writer()
+    except Exception:
+        return None
+    # Progress is reported from the session's reader task; run the writer in the
+    # tool call's context, where the graph's run config is visible.
+    context = contextvars.copy_context()
+
+    def on_progress(event: Dict[str, Any]):
+        context.run(writer, {"tool_progress": {"service": service_name, "tool": tool_name, **event}})
+    return on_progress
+
+def structured_tool_coroutine(service_discoveries, service_name, tool_name, input_model):
+    """Async implementation of a structured MCP tool; runs on the graph's event loop."""
+    async def call(**kwargs):
+        arguments = validate_tool_arguments(input_model, kwargs)
+        return await service_discoveries[service_name].call_tool(
+            tool_name, arguments, on_progress=tool_progress_writer(service_name, tool_name)
+        )
+    return call
+
+def fallback_tool_coroutine(service_discoveries, service_name, tool_name):
+    """Async implementation of a single-input MCP tool without an object schema."""
+    async def call(x):
+        return await service_discoveries[service_name].call_tool(
+            tool_name, {"__arg1": x}, on_progress=tool_progress_writer(service_name, tool_name)
+        )
+    return call
+
+def sync_bridge(coroutine):
+    """
+    Sync entry point for callers that cannot await (e.g. `tool.invoke` from a worker thread).
+
+    The call is scheduled on the loop that owns the pooled MCP sessions when
+    that loop is running, so warm sessions are reused; with no such loop a
+    private loop is used. Calling it from inside a running loop would block
+    that loop, so it is refused in favour of `ainvoke`.
+    """
+    @wraps(coroutine)
+    def call(*args, **kwargs):
+        try:
+            asyncio.get_running_loop()
+        except RuntimeError:
+            pass
+        else:
+            raise RuntimeError("MCP tools must be awaited (ainvoke) from inside an event loop")
+
+        loop = session_pool.loop
+        if loop is not None and loop.is_running():
+            return asyncio.run_coroutine_threadsafe(coroutine(*args, **kwargs), loop).result()
+        return asyncio.run(coroutine(*args, **kwargs))
+    return call
+
+def build_service_tools(service_name, discovered_tools, service_discoveries):
+    """Wraps a service's discovered tool definitions as LangChain tools."""
+    tools = []
+    for tool in discovered_tools:
+        tool_name = tool["name"]
+        tool_description = tool.get("description", "")
+        tool_schema = tool.get("inputSchema") or tool.get("parameters", {})
+        tool_metadata = {
+            "service": service_name,
+            "side_effects": is_side_effecting(tool),
+            "definition_hash": definition_hash(tool),
+        }
+
+        if tool_schema and tool_schema.get("type") == "object":
+            try:
+                input_model = schema_to_pydantic_model(tool_name + "_Input", tool_schema)
+
+                coroutine = structured_tool_coroutine(service_discoveries, service_name, tool_name, input_model)
+                structured_tool = StructuredTool.from_function(
+                    name=tool_name,
+                    description=tool_description,
+                    args_schema=input_model,
+                    metadata=tool_metadata,
+                    func=sync_bridge(coroutine),
+                    coroutine=coroutine,
+                )
+
+                tools.append(structured_tool)
+            except Exception as e:
+                logger.warning(f"⚠️ Failed to build structured tool {tool_name}: {e}")
+        else:
+            coroutine = fallback_tool_coroutine(service_discoveries, service_name, tool_name)
+            fallback_tool = Tool(
+                name=tool_name,
+                description=tool_description,
+                metadata=tool_metadata,
+                func=sync_bridge(coroutine),
+                coroutine=coroutine,
+            )
+            tools.append(fallback_tool)
+    return tools
+
+# Keeps background revalidation tasks referenced until they finish.
+_background_tasks = set()
+
+async def revalidate_service_tools(discovery: MCPToolDiscovery, image_digest: Optional[str], timeout: float):
+    """Re-runs discovery for a service served from cache and refreshes the cache entry."""
+    discovered_tools = await discovery.discover_tools(timeout=timeout)
+    if tool_catalog_cache.put(discovery.container_name, image_digest, discovered_tools):
+        logger.info(f"🔄 Tool catalog for {discovery.container_name} changed since it was cached")
+
 @traceable
-async def get_tools_for_service(service_name, command, discovery_method, call_method, service_discoveries):
-    """Enhanced tool discovery for each service."""
+async def get_tools_for_service(service_name, command, discovery_method, call_method, service_discoveries,
+                                timeout=DISCOVERY_TIMEOUT, use_cache=True):
+    """
+    Enhanced tool discovery for each service, served from the catalog cache when the image is unchanged.
+
+    With `use_cache=False` the service is always asked for its tools, and the
+    cache entry is refreshed from the answer.
+    """
     print(f"🕵️ Discovering tools for: {service_name}")
+    if not circuit_breakers.is_healthy(service_name):
+        print(f"🚫 Skipping {service_name}: circuit open")
+        return []
     discovery = MCPToolDiscovery(
         container_name=service_name,
         command=command,
@@ -317,83 +461,65 @@ async def get_tools_for_service(service_name, command, discovery_method, call_me
 
     tools = []
     try:
-        discovered_tools = await discovery.discover_tools()
+        image_digest = await container_image_digest(service_name)
+        discovered_tools = tool_catalog_cache.get(service_name, image_digest) if use_cache else None
+        if discovered_tools is not None:
+            print(f"⚡ Loaded cached tools for {service_name} (image {image_digest[:19]})")
+            task = asyncio.create_task(revalidate_service_tools(discovery, image_digest, timeout))
+            _background_tasks.add(task)
+            task.add_done_callback(_background_tasks.discard)
+        else:
+            discovered_tools = await discovery.discover_tools(timeout=timeout)
+            tool_catalog_cache.put(service_name, image_digest, discovered_tools)
         print(f"🛠️ Tools for {service_name}: {[t['name'] for t in discovered_tools]}")
 
-        for tool in discovered_tools:
-            tool_name = tool["name"]
-            tool_description = tool.get("description", "")
-            tool_schema = tool.get("inputSchema") or tool.get("parameters", {})
-
-            if tool_schema and tool_schema.get("type") == "object":
-                try:
-                    input_model = schema_to_pydantic_model(tool_name + "_Input", tool_schema)
-
-                    async def tool_call_wrapper(**kwargs):
-                        validated_args = input_model(**kwargs).dict()
-                        return await service_discoveries[service_name].call_tool(tool_name, validated_args, timeout=120)
-
-                    structured_tool = StructuredTool.from_function(
-                        name=tool_name,
-                        description=tool_description,
-                        args_schema=input_model,
-                        func=(lambda tool_name=tool_name, input_model=input_model:
-                            lambda **kwargs: asyncio.run(
-                                service_discoveries[service_name].call_tool(tool_name, input_model(**kwargs).dict())
-                            ))()
-                    )
-
-                    tools.append(structured_tool)
-                except Exception as e:
-                    logger.warning(f"⚠️ Failed to build structured tool {tool_name}: {e}")
-            else:
-                async def fallback_tool_call_wrapper(x):
-                    return await service_discoveries[service_name].call_tool(tool_name, {"__arg1": x})
-
-                fallback_tool = Tool(
-                    name=tool_name,
-                    description=tool_description,
-                    func=lambda x: asyncio.run(fallback_tool_call_wrapper(x))
-                )
-                tools.append(fallback_tool)
+        tools = build_service_tools(service_name, discovered_tools, service_discoveries)
 
     except Exception as e:
         logger.error(f"❌ Tool discovery error in {service_name}: {e}", exc_info=True)
 
     return tools
 
+async def get_tools_for_service_with_timeout(service_name, *args, timeout=DISCOVERY_TIMEOUT, **kwargs):
+    """Bounds discovery of one service so a hung container cannot stall startup."""
+    try:
+        return await asyncio.wait_for(
+            get_tools_for_service(service_name, *args, timeout=timeout, **kwargs), timeout=timeout
+        )
+    except asyncio.TimeoutError:
+        logger.error(f"⏱️ Tool discovery for {service_name} timed out after {timeout} seconds")
+        return []
+
+# MCP containers: name -> (command, discovery method, call method)
+MCP_SERVICES = {
+    "pyats-mcp": (["python3", "pyats_mcp_server.py", "--oneshot"], "tools/discover", "tools/call"),
+    "github-mcp": (["node", "dist/index.js"], "list_tools", "call_tool"),
+    "google-maps-mcp": (["node", "dist/index.js"], "tools/list", "tools/call"),
+    "sequentialthinking-mcp": (["node", "dist/index.js"], "tools/list", "tools/call"),
+    "slack-mcp": (["node", "dist/index.js"], "tools/list", "tools/call"),
+    "excalidraw-mcp": (["node", "dist/index.js"], "tools/list", "tools/call"),
+    "filesystem-mcp": (["node", "/app/dist/index.js", "/projects"], "tools/list", "tools/call"),
+    "netbox-mcp": (["python3", "server.py", "--oneshot"], "tools/discover", "tools/call"),
+    "google-search-mcp": (["node", "/app/build/index.js"], "tools/list", "tools/call"),
+    "servicenow-mcp": (["python3", "server.py", "--oneshot"], "tools/discover", "tools/call"),
+    "email-mcp": (["node", "build/index.js"], "tools/list", "tools/call"),
+    "chatgpt-mcp": (["python3", "server.py", "--oneshot"], "tools/discover", "tools/call"),
+    "quickchart-mcp": (["node", "build/index.js"], "tools/list", "tools/call"),
+}
+
 @traceable
-async def load_all_tools():
+async def load_all_tools(service_discoveries: Optional[Dict[str, MCPToolDiscovery]] = None):
     """Async function to load tools from different MCP services and local files."""
     print("🚨 COMPREHENSIVE TOOL DISCOVERY STARTING 🚨")
 
-    tool_services = [
-        ("pyats-mcp", ["python3", "pyats_mcp_server.py", "--oneshot"], "tools/discover", "tools/call"),
-        ("github-mcp", ["node", "dist/index.js"], "list_tools", "call_tool"),
-        ("google-maps-mcp", ["node", "dist/index.js"], "tools/list", "tools/call"),
-        ("sequentialthinking-mcp", ["node", "dist/index.js"], "tools/list", "tools/call"),
-        ("slack-mcp", ["node", "dist/index.js"], "tools/list", "tools/call"),
-        ("excalidraw-mcp", ["node", "dist/index.js"], "tools/list", "tools/call"),
-        ("filesystem-mcp", ["node", "/app/dist/index.js", "/projects"], "tools/list", "tools/call"),
-        ("netbox-mcp", ["python3", "server.py", "--oneshot"], "tools/discover", "tools/call"),
-        ("google-search-mcp", ["node", "/app/build/index.js"], "tools/list", "tools/call"),
-        ("servicenow-mcp", ["python3", "server.py", "--oneshot"], "tools/discover", "tools/call"),
-        ("email-mcp", ["node", "build/index.js"], "tools/list", "tools/call"),
-        ("chatgpt-mcp", ["python3", "server.py", "--oneshot"], "tools/discover", "tools/call"),
-        ("quickchart-mcp", ["node", "build/index.js"], "tools/list", "tools/call"),
-    ]
-
     try:
-        # Run docker ps to verify containers
-        docker_ps_result = subprocess.run(["docker", "ps"], capture_output=True, text=True)
-        print(docker_ps_result.stdout)
-
-        service_discoveries = {}
+        if service_discoveries is None:
+            service_discoveries = {}
 
-        # Gather tools from all services
+        # Gather tools from all services concurrently, each bounded by its own timeout
         all_service_tools = await asyncio.gather(
-            *[get_tools_for_service(service, command, discovery_method, call_method, service_discoveries)
-              for service, command, discovery_method, call_method in tool_services]
+            *[get_tools_for_service_with_timeout(service, command, discovery_method, call_method, service_discoveries)
+              for service, (command, discovery_method, call_method) in MCP_SERVICES.items()]
         )
 
         # Add local tools
@@ -427,50 +553,257 @@ async def load_all_tools():
         traceback.print_exc()
         return []
 
-# Load tools
-valid_tools = asyncio.run(load_all_tools())
-
 def format_tool_descriptions(tools: List[Tool]) -> str:
     return "\n".join(
         f"- `{tool.name}`: {tool.description or 'No description provided.'}"
         for tool in tools
     )
 
-embedding = GoogleGenerativeAIEmbeddings(model="models/embedding-001")
+class AgentRuntime:
+    """
+    Tools, tool index and chat model used by the graph nodes, built on first use.
 
-vector_store = InMemoryVectorStore(embedding=embedding)
+    Importing this module only compiles the graph; MCP discovery, embedding of
+    tool descriptions and LLM client construction happen in `ensure_ready`,
+    either on the first graph run or from a background warm-up task.
 
-tool_documents = [
-    Document(
-        page_content=f"Tool name: {tool.name}. Tool purpose: {tool.description}",
-        metadata={"tool_name": tool.name}
-    )
-    for tool in valid_tools if hasattr(tool, "description")
-]
+    `llm_factory` and `embedding_factory` build the models at initialization;
+    the benchmark harness swaps them for local fakes.
+    """
+
+    def __init__(self):
+        self.llm_factory = lambda: ChatOpenAI(model_name="gpt-4o", temperature="0.1")
+        self.embedding_factory = lambda: GoogleGenerativeAIEmbeddings(model=EMBEDDING_MODEL)
+        self.catalog = ToolCatalog(version=0, tools=[])
+        # Recent catalog versions, so runs that started before a reload finish on the tools they selected.
+        self._catalogs: "OrderedDict[int, ToolCatalog]" = OrderedDict()
+        self.services = dict(MCP_SERVICES)
+        self.service_discoveries: Dict[str, MCPToolDiscovery] = {}
+        self._reload_lock: Optional[asyncio.Lock] = None
+        self.selection_cache = SelectionCache(
+            ttl=SELECTION_CACHE_TTL, similarity_threshold=SELECTION_CACHE_SIMILARITY
+        )
+        self.selection_metrics = SelectionMetrics()
+        self._bound_llms = TTLCache(max_entries=128, ttl=float("inf"))
+        self.tool_outputs = ToolOutputStore()
+        self.llm: Optional[ChatOpenAI] = None
+        self.ready = False
+        self.error: Optional[str] = None
+        self.started_at = time.time()
+        self.ready_at: Optional[float] = None
+        self._init_task: Optional[asyncio.Task] = None
+
+    async def ensure_ready(self) -> "AgentRuntime":
+        """Initializes the runtime once; concurrent callers share the same initialization."""
+        if self.ready:
+            return self
+        await asyncio.shield(self._start_init())
+        return self
+
+    def warm_up(self):
+        """Starts initialization in the background on the running loop."""
+        if not self.ready:
+            self._start_init()
+
+    def _start_init(self) -> asyncio.Task:
+        loop = asyncio.get_running_loop()
+        task = self._init_task
+        if task is None or task.get_loop() is not loop or (task.done() and not self.ready):
+            self._init_task = loop.create_task(self._initialize())
+            # Failures are recorded in `self.error`; mark them retrieved for warm-up runs.
+            self._init_task.add_done_callback(lambda t: t.cancelled() or t.exception())
+        return self._init_task
+
+    async def _initialize(self):
+        try:
+            valid_tools = await load_all_tools(self.service_discoveries)
+
+            embedding = self.embedding_factory()
+            tool_index = await ToolEmbeddingIndex(embedding, EMBEDDING_MODEL).build(
+                [tool for tool in valid_tools if hasattr(tool, "description")]
+            )
+
+            print("🔧 All bound tools:", [t.name for t in valid_tools])
+
+            #llm = ChatGoogleGenerativeAI(model="gemini-2.5-pro-exp-03-25", temperature=0.0)
+            llm = self.llm_factory()
 
+            self._publish(ToolCatalog(self.catalog.version + 1, valid_tools, tool_index))
+            self.llm = llm
+            self.error = None
+            self.ready = True
+            self.ready_at = time.time()
+            logger.info(f"✅ Agent runtime ready in {self.ready_at - self.started_at:.1f}s")
+        except Exception as e:
+            self.error = str(e)
+            logger.error(f"❌ Agent runtime initialization failed: {e}", exc_info=True)
+            raise
+
+    def _publish(self, catalog: ToolCatalog):
+        """Swaps in a new catalog; the swap is a single assignment, so readers never see a mix."""
+        self.catalog = catalog
+        self._catalogs[catalog.version] = catalog
+        while len(self._catalogs) > CATALOG_VERSIONS_RETAINED:
+            self._catalogs.popitem(last=False)
+        self.selection_cache.clear()
+
+    def catalog_for(self, context: Dict[str, Any]) -> ToolCatalog:
+        """The catalog a run pinned in `select_tools`, or the current one if it has been dropped."""
+        return self._catalogs.get(context.get("catalog_version"), self.catalog)
+
+    @property
+    def valid_tools(self) -> List[Tool]:
+        return self.catalog.valid_tools
+
+    @property
+    def tools_by_name(self) -> Dict[str, Tool]:
+        return self.catalog.tools_by_name
+
+    @property
+    def tool_index(self) -> Optional[ToolEmbeddingIndex]:
+        return self.catalog.tool_index
+
+    async def reload_service(self, service_name: str, command: Optional[List[str]] = None,
+                             discovery_method: str = "tools/list", call_method: str = "tools/call") -> Dict[str, Any]:
+        """
+        Rediscovers one MCP service and swaps in a catalog with its updated tools.
 
-document_ids = vector_store.add_documents(tool_documents)
+        Unchanged tools keep their objects and embeddings; only added or changed
+        tools are rebuilt and embedded. Passing `command` registers a new
+        service. Runs already in progress keep the catalog they started on.
 
-print("🔧 All bound tools:", [t.name for t in valid_tools])
+        Raises:
+            ValueError: If the service is unknown and no `command` is given.
+        """
+        await self.ensure_ready()
+        if command is not None:
+            self.services[service_name] = (command, discovery_method, call_method)
+        if service_name not in self.services:
+            raise ValueError(f"Unknown MCP service: {service_name}")
+        if self._reload_lock is None:
+            self._reload_lock = asyncio.Lock()
+
+        async with self._reload_lock:
+            command, discovery_method, call_method = self.services[service_name]
+            discovered = await get_tools_for_service_with_timeout(
+                service_name, command, discovery_method, call_method, self.service_discoveries, use_cache=False
+            )
+            catalog = self.catalog
+            current = catalog.tools_for_service(service_name)
+            if not discovered:
+                logger.warning(f"⚠️ Rediscovery of {service_name} returned no tools; keeping the current catalog")
+                return {"service": service_name, "version": catalog.version, "error": "no tools discovered"}
+
+            definitions = self.service_discoveries[service_name].discovered_tools
+            diff = diff_service_tools(current, definitions)
+            if diff.is_empty:
+                logger.info(f"♻️ Tools of {service_name} unchanged (catalog v{catalog.version})")
+                return {"service": service_name, "version": catalog.version, **diff.as_dict()}
+
+            # Keep the existing objects for unchanged tools so bound LLMs and embeddings are reused.
+            current_by_name = {tool.name: tool for tool in current}
+            service_tools = [
+                current_by_name[tool.name] if tool.name in diff.unchanged else tool for tool in discovered
+            ]
+            tools = catalog.tools_with_service(service_name, service_tools)
+            tool_index = await catalog.tool_index.updated([tool for tool in tools if hasattr(tool, "description")])
+            new_catalog = ToolCatalog(catalog.version + 1, tools, tool_index)
+            self._publish(new_catalog)
+            logger.info(
+                f"🔁 Catalog v{new_catalog.version}: {service_name} "
+                f"+{len(diff.added)} -{len(diff.removed)} ~{len(diff.changed)}"
+            )
+            return {"service": service_name, "version": new_catalog.version, **diff.as_dict()}
 
-#llm = ChatGoogleGenerativeAI(model="gemini-2.5-pro-exp-03-25", temperature=0.0)
+    def bound_llm(self, tools: List[Tool]):
+        """
+        Returns the LLM bound to `tools` and the system prompt listing them.
 
-llm = ChatOpenAI(model_name="gpt-4o", temperature="0.1")
+        Both are memoized by the set of tool objects, so repeated turns over the
+        same tools skip schema serialization and prompt formatting. Unchanged
+        tools keep their objects across catalog reloads, so only bindings that
+        include a changed tool are rebuilt.
+        """
+        key = frozenset(id(tool) for tool in tools)
+        entry = self._bound_llms.get(key)
+        if entry is None:
+            entry = (
+                self.llm.bind_tools(tools),
+                system_msg.format(tool_descriptions=format_tool_descriptions(tools)),
+                tuple(tools),  # keeps the keyed ids alive for as long as the entry
+            )
+            self._bound_llms.put(key, entry)
+        return entry[:2]
+
+    def status(self) -> Dict[str, Any]:
+        return {
+            "ready": self.ready,
+            "error": self.error,
+            "tools": len(self.valid_tools),
+            "catalog_version": self.catalog.version,
+            "tool_selection": self.selection_metrics.summary(),
+            "unhealthy_services": circuit_breakers.unhealthy(),
+            "uptime_seconds": round(time.time() - self.started_at, 1),
+            "warmup_seconds": round(self.ready_at - self.started_at, 1) if self.ready_at else None,
+        }
 
-llm_with_tools = llm.bind_tools(valid_tools)
+runtime = AgentRuntime()
 
 @traceable
 class ContextAwareToolNode(ToolNode):
     """
     A specialized ToolNode that handles tool execution and updates the graph state
     based on the tool's response.  It assumes that tools return a dictionary.
+
+    In parallel mode, consecutive read-only tool calls run concurrently, bounded
+    per MCP service by `max_concurrency_per_service`. A side-effecting tool
+    (`metadata["side_effects"]`) acts as a barrier: it waits for earlier calls
+    and runs alone. ToolMessages are always emitted in tool-call order.
     """
 
+    def __init__(self, tools, *, parallel: bool = True, max_concurrency_per_service: int = 4, **kwargs):
+        super().__init__(tools, **kwargs)
+        self.parallel = parallel
+        self.max_concurrency_per_service = max_concurrency_per_service
+        self._service_semaphores: Dict[str, asyncio.Semaphore] = {}
+
+    def _semaphore_for(self, tool) -> asyncio.Semaphore:
+        service = (tool.metadata or {}).get("service", "local")
+        if service not in self._service_semaphores:
+            self._service_semaphores[service] = asyncio.Semaphore(self.max_concurrency_per_service)
+        return self._service_semaphores[service]
+
+    async def _run_tool_call(self, tool, tool_call) -> Dict[str, Any]:
+        tool_input = tool_call['args']
+        filtered_tool_input = {k: v for k, v in tool_input.items() if v is not None}
+        logger.debug(f"Calling tool: {tool.name} with args: {filtered_tool_input}")
+
+        async with self._semaphore_for(tool):
+            tool_response = await tool.ainvoke(filtered_tool_input)
+
+        if not isinstance(tool_response, dict):
+            tool_response = {tool.name: tool_response}
+        return tool_response
+
+    def _batches(self, calls):
+        """Groups (tool, tool_call) pairs into runs that may execute concurrently."""
+        batch = []
+        for tool, tool_call in calls:
+            if not self.parallel or (tool.metadata or {}).get("side_effects"):
+                if batch:
+                    yield batch
+                yield [(tool, tool_call)]
+                batch = []
+            else:
+                batch.append((tool, tool_call))
+        if batch:
+            yield batch
+
     async def ainvoke(
         self, state: GraphState, config: Optional[RunnableConfig] = None, **kwargs: Any
     ):
         """
-        Executes the tool call specified in the last AIMessage and updates the state.
+        Executes the tool calls specified in the last AIMessage and updates the state.
 
         Args:
             state: The current graph state.
@@ -490,25 +823,41 @@ class ContextAwareToolNode(ToolNode):
             raise ValueError("Expected an AIMessage with tool_calls")
 
         tool_calls = last_message.tool_calls
-        context = state.get("context", {})
+        context = dict(state.get("context") or {})
+        rt = await runtime.ensure_ready()
+        catalog = rt.catalog_for(context)
 
+        calls = []
         for tool_call in tool_calls:
             tool_name = tool_call['name']
 
-            if not (tool := self.tools_by_name.get(tool_name)):
+            # Tools of services that just became unhealthy still resolve, and fail fast.
+            if not (tool := catalog.by_name.get(tool_name)):
                 logger.warning(
                     f"Tool '{tool_name}' not found in the available tools. Skipping this tool call."
                 )
                 continue
-
-            tool_input = tool_call['args']
-            filtered_tool_input = {k: v for k, v in tool_input.items() if v is not None}
-            logger.debug(f"Calling tool: {tool.name} with args: {filtered_tool_input}")
-
-            tool_response = await tool.ainvoke(filtered_tool_input)
-
-            if not isinstance(tool_response, dict):
-                tool_response = {tool_name: tool_response}
+            calls.append((tool, tool_call))
+
+        results = []
+        tool_messages = []
+        for batch in self._batches(calls):
+            responses = await asyncio.gather(
+                *[self._run_tool_call(tool, tool_call) for tool, tool_call in batch],
+                return_exceptions=True,
+            )
+            results.extend(zip(batch, responses))
+
+        for (tool, tool_call), tool_response in results:
+            if isinstance(tool_response, Exception):
+                logger.error(f"❌ Tool '{tool.name}' failed: {tool_response}")
+                tool_messages.append(ToolMessage(
+                    tool_call_id=tool_call['id'],
+                    content=f"Error: {tool_response!r}",
+                    name=tool_call['name'],
+                    status="error",
+                ))
+                continue
 
             used = set(context.get("used_tools", []))
             used.add(tool.name)
@@ -525,101 +874,216 @@ class ContextAwareToolNode(ToolNode):
                 name=tool_call['name'],
             )
 
-            messages.append(tool_message)
+            tool_messages.append(tool_message)
 
         return {
-            "messages": messages,
+            "messages": tool_messages,
             "context": context,
             "__next__": "handle_tool_results"
         }
     
-@traceable
-async def select_tools(state: GraphState):
-    messages = state.get("messages", [])
-    context = state.get("context", {})
-    last_user_message = next((m for m in reversed(messages) if isinstance(m, HumanMessage)), None)
+TOOL_SELECTION_PROMPT = ChatPromptTemplate.from_messages([
+    ("system", """You are a precise Tool Selector Assistant. Your task is to choose the most relevant tools from the provided list to fulfill the user's request.
 
-    if not last_user_message:
-        logger.warning("select_tools: No user message found.")
-        state["selected_tools"] = []
-        return {"messages": messages, "context": context}
+Consider these guidelines:
+- Match tools to the *exact* user intent.
+- Refer to tool descriptions to understand their purpose.
+- Prefer specific tools over general ones if applicable.
+- If multiple tools seem relevant for sequential steps *explicitly requested*, list them.
+- If no tool is a good fit, output "None".
+- Output *only* a comma-separated list of the chosen tool names (e.g., tool_a,tool_b) or the word "None"."""),
 
-    query = last_user_message.content
-    selected_tool_names = []
+    ("human", "User request:\n---\n{query}\n---\n\nAvailable tools:\n---\n{tools}\n---\n\nBased *only* on the tools listed above, which are the best fit for the request? Output only the comma-separated tool names or 'None'.")
+])
 
-    try:
-        # Step 1: Vector search
-        scored_docs = vector_store.similarity_search_with_score(query, k=35)
+def retrieve_tool_candidates(catalog: ToolCatalog, query_vector) -> List[Tuple[str, float]]:
+    """
+    Vector retrieval of the few tools worth showing the refinement LLM.
 
-        # Step 2: Apply threshold with fallback
-        threshold = 0.50
-        relevant_docs = [doc for doc, score in scored_docs if score >= threshold]
+    One matrix-vector product scores every tool, argpartition picks the
+    candidate pool, the score gap decides how many are worth keeping, and
+    per-service diversity stops one large toolset from crowding out the rest.
+    """
+    scored_tools = [
+        (name, score) for name, score in catalog.tool_index.search_vector(query_vector, k=TOOL_RETRIEVAL_POOL)
+        if name in catalog.tools_by_name
+    ]
+    if not scored_tools:
+        return []
 
-        if not relevant_docs:
-            logger.warning(f"⚠️ No tools above threshold {threshold}. Falling back to top 5 by score.")
-            relevant_docs = [doc for doc, _ in scored_docs[:15]]
+    keep = adaptive_cutoff(
+        [score for _, score in scored_tools],
+        min_k=TOOL_RETRIEVAL_MIN, max_k=TOOL_RETRIEVAL_MAX, margin=TOOL_RETRIEVAL_MARGIN,
+    )
+    service_of = {name: (catalog.tools_by_name[name].metadata or {}).get("service", "local") for name, _ in scored_tools}
+    return diversify(scored_tools, service_of, limit=keep, max_per_service=TOOL_RETRIEVAL_MAX_PER_SERVICE,
+                     margin=TOOL_RETRIEVAL_MARGIN)
+
+def match_known_tools(catalog: ToolCatalog, query: str) -> List[str]:
+    """Tools the request names explicitly, or that a `TOOL_QUERY_PATTERNS` entry maps it to."""
+    lowered = query.lower()
+    # Only identifier-like names, so tools named after common words do not match prose.
+    named = [
+        name for name in catalog.tools_by_name
+        if ("_" in name or "-" in name) and re.search(rf"(?<![\w-]){re.escape(name.lower())}(?![\w-])", lowered)
+    ]
+    if named:
+        return named
+    for pattern, tool_name in TOOL_QUERY_PATTERNS:
+        if tool_name in catalog.tools_by_name and pattern.search(query):
+            return [tool_name]
+    return []
+
+def decisive_candidates(candidates: List[Tuple[str, float]]) -> List[str]:
+    """The top candidate alone, when it scores well and clearly ahead of the runner-up; otherwise empty."""
+    if not candidates:
+        return []
+    top_name, top_score = candidates[0]
+    runner_up = candidates[1][1] if len(candidates) > 1 else 0.0
+    if top_score >= FAST_PATH_MIN_SCORE and top_score - runner_up >= FAST_PATH_MIN_GAP:
+        return [top_name]
+    return []
 
-        logger.info(f"✅ Selected {len(relevant_docs)} tools after filtering/fallback.")
+def fast_path_selection(known: List[str], candidates: List[Tuple[str, float]]) -> Tuple[List[str], Optional[str]]:
+    """
+    Selection that needs no refinement call, and why; `([], None)` when refinement should decide.
 
-        # Step 3: Build tool info for LLM
-        tool_infos = {
-            doc.metadata["tool_name"]: doc.page_content
-            for doc in relevant_docs if "tool_name" in doc.metadata
-        }
+    A tool the request names or a pattern points at is taken alone only when
+    no other retrieved candidate scores within `FAST_PATH_MIN_GAP` of the
+    best; otherwise it is added to the retrieved candidates, so a multi-step
+    request keeps the other tools it needs.
+    """
+    if known:
+        best = candidates[0][1] if candidates else 0.0
+        rival = next((score for name, score in candidates if name not in known), None)
+        if rival is None or best - rival >= FAST_PATH_MIN_GAP:
+            return known, "known_tool"
+        return known + [name for name, _ in candidates if name not in known], "known_tool_with_candidates"
+    decisive = decisive_candidates(candidates)
+    return (decisive, "score_gap") if decisive else ([], None)
+
+async def audit_fast_path(rt: AgentRuntime, catalog: ToolCatalog, query: str,
+                          candidates: List[Tuple[str, float]], selected: List[str], reason: str):
+    """Refines a fast-path request anyway and records which refined tools the fast path left out."""
+    pool = candidates + [(name, 0.0) for name in selected if name not in dict(candidates)]
+    try:
+        refined = await refine_tool_candidates(rt, catalog, query, pool)
+    except Exception as e:
+        logger.warning(f"⚠️ Fast-path audit failed: {e}")
+        return
+    missed = sorted(set(refined) - set(selected))
+    if missed:
+        logger.info(f"🔍 Fast path ({reason}) left out tools refinement picked: {missed}")
+    rt.selection_metrics.record_audit(reason, missed)
+
+async def refine_tool_candidates(rt: AgentRuntime, catalog: ToolCatalog, query: str,
+                                 candidates: List[Tuple[str, float]]) -> List[str]:
+    """LLM refinement of the retrieved candidates."""
+    if not candidates:
+        logger.warning("select_tools: No indexed tools matched.")
+        return []
 
-        if not tool_infos:
-            logger.warning("select_tools: No valid tool_name metadata found.")
-            state["selected_tools"] = []
-            return {"messages": messages, "context": context}
+    logger.info(
+        f"✅ Retrieved {len(candidates)} candidate tools: "
+        + ", ".join(f"{name} ({score:.3f})" for name, score in candidates)
+    )
 
-        # Log top tools and scores for debugging
-        logger.info("Top tools with scores:")
-        for doc, score in scored_docs[:10]:
-            if "tool_name" in doc.metadata:
-                logger.info(f"- {doc.metadata['tool_name']}: {score}")
+    # Build tool info for LLM
+    tool_infos = {
+        name: tool_document_text(name, catalog.tools_by_name[name].description)
+        for name, _ in candidates
+    }
 
-        tool_descriptions_for_prompt = "\n".join(
-            f"- {name}: {desc}" for name, desc in tool_infos.items()
-        )
+    tool_descriptions_for_prompt = "\n".join(
+        f"- {name}: {desc}" for name, desc in tool_infos.items()
+    )
 
-        # Step 4: LLM refinement
-        tool_prompt = ChatPromptTemplate.from_messages([
-            ("system", """You are a precise Tool Selector Assistant. Your task is to choose the most relevant tools from the provided list to fulfill the user's request.
+    # LLM refinement
+    selection_prompt_messages = TOOL_SELECTION_PROMPT.format_messages(
+        query=query,
+        tools=tool_descriptions_for_prompt
+    )
 
-Consider these guidelines:
-- Match tools to the *exact* user intent.
-- Refer to tool descriptions to understand their purpose.
-- Prefer specific tools over general ones if applicable.
-- If multiple tools seem relevant for sequential steps *explicitly requested*, list them.
-- If no tool is a good fit, output "None".
-- Output *only* a comma-separated list of the chosen tool names (e.g., tool_a,tool_b) or the word "None"."""),
+    logger.info("🤖 Invoking LLM for tool selection...")
+    tool_selection_response = await rt.llm.ainvoke(selection_prompt_messages)
+    raw_selection = tool_selection_response.content.strip()
 
-            ("human", "User request:\n---\n{query}\n---\n\nAvailable tools:\n---\n{tools}\n---\n\nBased *only* on the tools listed above, which are the best fit for the request? Output only the comma-separated tool names or 'None'.")
-        ])
+    logger.info(f"📝 LLM raw tool selection: '{raw_selection}'")
 
-        selection_prompt_messages = tool_prompt.format_messages(
-            query=query,
-            tools=tool_descriptions_for_prompt
-        )
+    if raw_selection.lower() == "none" or not raw_selection:
+        return []
 
-        logger.info("🤖 Invoking LLM for tool selection...")
-        tool_selection_response = await llm.ainvoke(selection_prompt_messages)
-        raw_selection = tool_selection_response.content.strip()
+    potential_names = [name.strip() for name in raw_selection.split(',')]
+    selected_tool_names = [name for name in potential_names if name in tool_infos]
+    if len(selected_tool_names) != len(potential_names):
+        logger.warning(f"⚠️ LLM selected invalid tools: {set(potential_names) - set(selected_tool_names)}")
+    return selected_tool_names
 
-        logger.info(f"📝 LLM raw tool selection: '{raw_selection}'")
+@traceable
+async def select_tools(state: GraphState):
+    messages = state.get("messages", [])
+    context = dict(state.get("context") or {})
+    last_user_message = next((m for m in reversed(messages) if isinstance(m, HumanMessage)), None)
 
-        if raw_selection.lower() == "none" or not raw_selection:
-            selected_tool_names = []
+    if not last_user_message:
+        logger.warning("select_tools: No user message found.")
+        state["selected_tools"] = []
+        return {"messages": messages, "context": context}
+
+    query = last_user_message.content
+    selected_tool_names = []
+    rt = await runtime.ensure_ready()
+    cache = rt.selection_cache
+    # Pin the catalog for the rest of this turn; a reload mid-run does not change its tools.
+    catalog = rt.catalog
+    context["catalog_version"] = catalog.version
+
+    source, reason = "error", None
+    try:
+        # Repeat requests reuse the previous selection without any remote call
+        cached_selection = cache.lookup(query)
+        if cached_selection is not None:
+            source = "cache"
         else:
-            potential_names = [name.strip() for name in raw_selection.split(',')]
-            selected_tool_names = [name for name in potential_names if name in tool_infos]
-            if len(selected_tool_names) != len(potential_names):
-                logger.warning(f"⚠️ LLM selected invalid tools: {set(potential_names) - set(selected_tool_names)}")
+            query_vector = cache.get_embedding(query)
+            if query_vector is None:
+                query_vector = await catalog.tool_index.embed_query(query)
+                cache.put_embedding(query, query_vector)
+
+            # Near-repeat requests reuse a selection and skip the refinement call
+            cached_selection = cache.lookup_similar(query_vector)
+            if cached_selection is not None:
+                source = "cache"
+            else:
+                candidates = retrieve_tool_candidates(catalog, query_vector)
+                # Requests naming a tool, matching a known pattern, or with one clear
+                # candidate skip refinement
+                selected_tool_names, reason = fast_path_selection(match_known_tools(catalog, query), candidates)
+                if selected_tool_names:
+                    source = "fast_path"
+                    logger.info(f"⚡ Skipping refinement ({reason}): {selected_tool_names}")
+                    # Only a selection that dropped candidates can have missed something
+                    dropped = any(name not in selected_tool_names for name, _ in candidates)
+                    if dropped and random.random() < FAST_PATH_AUDIT_RATE:
+                        task = asyncio.create_task(
+                            audit_fast_path(rt, catalog, query, candidates, selected_tool_names, reason))
+                        _background_tasks.add(task)
+                        task.add_done_callback(_background_tasks.discard)
+                else:
+                    source = "refined"
+                    selected_tool_names = await refine_tool_candidates(rt, catalog, query, candidates)
+                cache.store(query, query_vector, selected_tool_names)
+
+        if cached_selection is not None:
+            selected_tool_names = [name for name in cached_selection if name in catalog.tools_by_name]
+            logger.info(f"♻️ Using cached tool selection: {selected_tool_names}")
 
     except Exception as e:
         logger.error(f"🔥 Error during tool selection: {e}", exc_info=True)
         selected_tool_names = []
 
+    rt.selection_metrics.record_selection(source, reason)
+
     # Final: Update context
     context["selected_tools"] = list(set(context.get("selected_tools", [])) | set(selected_tool_names))
     logger.info(f"✅ Final selected tools: {context['selected_tools']}")
@@ -628,7 +1092,6 @@ Consider these guidelines:
         "context": context
     }
 
-
 system_msg = """You are a computer networking expert at the CCIE level. You are a precise and helpful assistant with access to a wide range of tools for networking, GitHub automation, Slack notifications, file system operations, and ServiceNow ticketing. You must follow strict guidelines before choosing and using tools.
 
 AVAILABLE TOOL CATEGORIES:
@@ -713,21 +1176,23 @@ GENERAL RULES:
 async def assistant(state: GraphState):
     """Handles assistant logic and LLM interaction, with support for sequential tool calls."""
     messages = state.get("messages", [])
-    context = state.get("context", {})
+    context = dict(state.get("context") or {})
     selected_tool_names = context.get("selected_tools", [])
     run_mode = context.get("run_mode", "start")
+    rt = await runtime.ensure_ready()
+    catalog = rt.catalog_for(context)
 
     used = set(context.get("used_tools", []))
     # If selected_tool_names is empty, fall back to ALL tools not already used
     if selected_tool_names:
         tools_to_use = [
-            tool for tool in valid_tools 
+            tool for tool in catalog.valid_tools 
             if tool.name in selected_tool_names and tool.name not in used
         ]
     else:
         # Broaden scope — allow Gemini to pick missed tools (Slack, GitHub, etc.)
         tools_to_use = [
-            tool for tool in valid_tools 
+            tool for tool in catalog.valid_tools 
             if tool.name not in used
         ]
     # If we're in continuous mode, don't re-select tools
@@ -743,7 +1208,7 @@ async def assistant(state: GraphState):
             # Add the tool message to ensure proper conversation context
             new_messages = [SystemMessage(content=system_msg)] + messages
 
-            llm_with_tools = llm.bind_tools(tools_to_use)
+            llm_with_tools, _ = rt.bound_llm(tools_to_use)
             response = await llm_with_tools.ainvoke(new_messages, config={"tool_choice": "auto"})
 
             if hasattr(response, "tool_calls") and response.tool_calls:
@@ -754,21 +1219,31 @@ async def assistant(state: GraphState):
                 return {"messages": [response], "context": context, "__next__": "__end__"}
 
     # Initial processing or starting a new sequence
-    llm_with_tools = llm.bind_tools(tools_to_use)
-    formatted_tool_descriptions = format_tool_descriptions(tools_to_use)
-    formatted_system_msg = system_msg.format(tool_descriptions=formatted_tool_descriptions)
+    llm_with_tools, formatted_system_msg = rt.bound_llm(tools_to_use)
     new_messages = [SystemMessage(content=formatted_system_msg)] + messages
 
+    call_id = assistant_log.new_call_id()
+    sampled = assistant_log.sampled()
+    started = time.monotonic()
     try:
-        logger.info(f"assistant: Invoking LLM with new_messages: {new_messages}")
+        # The system prompt is the same for every call with this tool set; log only what varies.
+        assistant_log.event("assistant: Invoking LLM", sampled=sampled, call_id=call_id,
+                            messages=len(new_messages), tools=len(tools_to_use),
+                            last_message=messages[-1].content if messages else None)
+        debug_capture.stash(call_id, messages=new_messages, tools=[tool.name for tool in tools_to_use])
         # Always use auto tool choice to allow model to decide which tools to use
         response = await llm_with_tools.ainvoke(new_messages, config={"tool_choice": "auto"})
-        logger.info(f"Raw LLM Response: {response}")
+        debug_capture.discard(call_id)
+        assistant_log.event("assistant: LLM responded", sampled=sampled, call_id=call_id,
+                            elapsed_ms=round((time.monotonic() - started) * 1000),
+                            tool_calls=[call["name"] for call in getattr(response, "tool_calls", None) or []],
+                            content=getattr(response, "content", response))
 
         if not isinstance(response, AIMessage):
             response = AIMessage(content=str(response))
     except Exception as e:
         logger.error(f"Error invoking LLM: {e}", exc_info=True)
+        debug_capture.capture(call_id, "assistant", e)
         response = AIMessage(content=f"LLM Error: {e}")
 
     if hasattr(response, "tool_calls") and response.tool_calls:
@@ -778,10 +1253,30 @@ async def assistant(state: GraphState):
         context["run_mode"] = "start"
         return {"messages": [response], "context": context, "__next__": "__end__"}
 
+@traceable
+async def compact_history(state: GraphState):
+    """Keeps the history and context within budget before the turn is processed."""
+    messages = state.get("messages", [])
+    context = dict(state.get("context") or {})
+    rt = await runtime.ensure_ready()
+
+    message_updates = await compact_messages(
+        messages,
+        rt.tool_outputs,
+        summarize=summarizer_for(rt.llm),
+        token_budget=HISTORY_TOKEN_BUDGET,
+        keep_recent_turns=HISTORY_KEEP_RECENT_TURNS,
+        inline_chars=TOOL_OUTPUT_INLINE_CHARS,
+    )
+    return {
+        "messages": message_updates,
+        "context": compact_context(context, rt.tool_outputs, max_keys=CONTEXT_MAX_KEYS),
+    }
+
 @traceable
 async def handle_tool_results(state: GraphState):
     messages = state.get("messages", [])
-    context = state.get("context", {})
+    context = dict(state.get("context") or {})
     run_mode = context.get("run_mode", "start")
 
     # Always reset run_mode to prevent infinite loops unless LLM explicitly continues
@@ -794,40 +1289,55 @@ async def handle_tool_results(state: GraphState):
         "__next__": "assistant"
     }
 
-# Graph setup
-graph_builder = StateGraph(GraphState)
-
-# Define core nodes
-graph_builder.add_node("select_tools", select_tools)
-graph_builder.add_node("assistant", assistant)
-graph_builder.add_node("tools", ContextAwareToolNode(tools=valid_tools))
-graph_builder.add_node("handle_tool_results", handle_tool_results)
-
-# Define clean and minimal edges
-# Start flow
-graph_builder.add_edge(START, "select_tools")
-
-# After tool selection, go to assistant
-graph_builder.add_edge("select_tools", "assistant")
-
-# Assistant decides: use tool or end
-graph_builder.add_conditional_edges(
-    "assistant",
-    lambda state: state.get("__next__", "__end__"),
-    {
-        "tools": "tools",
-        "__end__": END,
-    }
-)
+def build_graph(checkpointer=None):
+    """
+    Builds and compiles the agent graph.
+
+    Compiling is cheap: the nodes resolve tools and models through `runtime`,
+    which initializes itself on the first run. Pass a `checkpointer` to keep
+    per-thread state between runs (see `session_runner.MultiSessionRunner`).
+    """
+    graph_builder = StateGraph(GraphState)
+
+    # Define core nodes
+    graph_builder.add_node("compact_history", compact_history)
+    graph_builder.add_node("select_tools", select_tools)
+    graph_builder.add_node("assistant", assistant)
+    graph_builder.add_node("tools", ContextAwareToolNode(
+        tools=[],
+        parallel=TOOL_CALL_MODE == "parallel",
+        max_concurrency_per_service=TOOL_CALL_CONCURRENCY_PER_SERVICE,
+    ))
+    graph_builder.add_node("handle_tool_results", handle_tool_results)
+
+    # Define clean and minimal edges
+    # Start flow: bound the history, then select tools
+    graph_builder.add_edge(START, "compact_history")
+    graph_builder.add_edge("compact_history", "select_tools")
+
+    # After tool selection, go to assistant
+    graph_builder.add_edge("select_tools", "assistant")
+
+    # Assistant decides: use tool or end
+    graph_builder.add_conditional_edges(
+        "assistant",
+        lambda state: state.get("__next__", "__end__"),
+        {
+            "tools": "tools",
+            "__end__": END,
+        }
+    )
+
+    # Tools always go to handler
+    graph_builder.add_edge("tools", "handle_tool_results")
 
-# Tools always go to handler
-graph_builder.add_edge("tools", "handle_tool_results")
+    # Tool results always return to assistant
+    graph_builder.add_edge("handle_tool_results", "assistant")
 
-# Tool results always return to assistant
-graph_builder.add_edge("handle_tool_results", "assistant")
+    return graph_builder.compile(checkpointer=checkpointer)
 
 # Compile graph
-compiled_graph = graph_builder.compile()
+compiled_graph = build_graph()
 
 async def run_cli_interaction():
     """Runs the CLI interaction loop."""
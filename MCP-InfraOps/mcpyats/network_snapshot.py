@@ -0,0 +1,88 @@
+import json
+import time
+import asyncio
+import logging
+from typing import Dict, Any, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class NetworkTopologySnapshot:
+    """
+    Cached view of `docker network inspect <network>`.
+
+    The snapshot is refreshed by a background task on the running loop; readers
+    always get the last cached copy and never wait on docker.
+    """
+
+    def __init__(self, network: str = "bridge", refresh_interval: float = 60, timeout: float = 10):
+        self.network = network
+        self.refresh_interval = refresh_interval
+        self.timeout = timeout
+        self._snapshot: Dict[str, Any] = {}
+        self._refreshed_at: Optional[float] = None
+        self._last_error: Optional[str] = None
+        self._task: Optional[asyncio.Task] = None
+
+    def ensure_started(self):
+        """Schedules the background refresher on the running loop if it is not already running."""
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            return
+        if self._task is None or self._task.done() or self._task.get_loop() is not loop:
+            self._task = loop.create_task(self._refresh_forever())
+
+    async def refresh(self) -> Dict[str, Any]:
+        """Runs `docker network inspect` once and replaces the cached snapshot."""
+        try:
+            process = await asyncio.create_subprocess_exec(
+                "docker", "network", "inspect", self.network,
+                stdout=asyncio.subprocess.PIPE,
+                stderr=asyncio.subprocess.PIPE
+            )
+            stdout, stderr = await asyncio.wait_for(process.communicate(), timeout=self.timeout)
+            if process.returncode != 0:
+                raise RuntimeError(stderr.decode().strip())
+            networks = json.loads(stdout.decode() or "[]")
+            self._snapshot = summarize_network(networks[0] if networks else {})
+            self._refreshed_at = time.time()
+            self._last_error = None
+            logger.debug(f"🌐 Refreshed network snapshot: {len(self._snapshot.get('containers', {}))} containers")
+        except Exception as e:
+            self._last_error = str(e)
+            logger.error(f"❌ Network inspection failed: {e}")
+        return self.snapshot()
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Returns the cached snapshot with its age; never blocks."""
+        age = None if self._refreshed_at is None else round(time.time() - self._refreshed_at, 1)
+        return {
+            "network": self.network,
+            "refreshed_at": self._refreshed_at,
+            "age_seconds": age,
+            "last_error": self._last_error,
+            **self._snapshot,
+        }
+
+    async def _refresh_forever(self):
+        while True:
+            await self.refresh()
+            await asyncio.sleep(self.refresh_interval)
+
+
+def summarize_network(network: Dict[str, Any]) -> Dict[str, Any]:
+    """Reduces a `docker network inspect` entry to the fields useful for debugging."""
+    ipam = network.get("IPAM", {}).get("Config") or [{}]
+    return {
+        "driver": network.get("Driver"),
+        "subnet": ipam[0].get("Subnet"),
+        "gateway": ipam[0].get("Gateway"),
+        "containers": {
+            container.get("Name", container_id[:12]): container.get("IPv4Address")
+            for container_id, container in (network.get("Containers") or {}).items()
+        },
+    }
+
+
+network_topology = NetworkTopologySnapshot()
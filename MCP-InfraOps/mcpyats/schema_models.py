@@ -0,0 +1,144 @@
+import re
+import json
+import hashlib
+import keyword
+import logging
+from typing import Any, Dict, List, Literal, Optional, Tuple, Type, Union
+
+from pydantic import BaseModel, ConfigDict, Field, create_model
+
+logger = logging.getLogger(__name__)
+
+_JSON_SCALARS = {
+    "string": str,
+    "integer": int,
+    "number": float,
+    "boolean": bool,
+    "null": type(None),
+}
+
+# Compiled models by (model name, canonical schema hash); discovery of an unchanged
+# tool, including cache revalidation and catalog reloads, reuses the same class.
+_model_cache: Dict[Tuple[str, str], Type[BaseModel]] = {}
+
+
+def canonical_schema_hash(schema: Dict[str, Any]) -> str:
+    """Hash of a JSON Schema that ignores key order and whitespace."""
+    return hashlib.sha256(json.dumps(schema, sort_keys=True, separators=(",", ":")).encode()).hexdigest()
+
+
+def schema_to_pydantic_model(name: str, schema: Dict[str, Any]) -> Type[BaseModel]:
+    """
+    Returns a Pydantic model class for an object JSON Schema, compiling it once per schema.
+
+    Supports scalar types, `enum`, `anyOf`/`oneOf`, type lists such as
+    `["string", "null"]`, arrays, nested objects and `default` values.
+    Constructs it cannot express become `Any` with a warning rather than
+    being dropped.
+    """
+    if schema.get("type") != "object":
+        raise ValueError("Only object schemas are supported.")
+
+    key = (name, canonical_schema_hash(schema))
+    model = _model_cache.get(key)
+    if model is None:
+        model = _build_model(name, schema)
+        _model_cache[key] = model
+    return model
+
+
+def validate_tool_arguments(model: Type[BaseModel], arguments: Dict[str, Any]) -> Dict[str, Any]:
+    """Validates call arguments with the model's compiled validator and returns wire-format JSON."""
+    return model.model_validate(arguments).model_dump(mode="json", by_alias=True)
+
+
+def _build_model(name: str, schema: Dict[str, Any]) -> Type[BaseModel]:
+    properties = schema.get("properties") or {}
+    required_fields = set(schema.get("required", []))
+    fields = {}
+    # Attribute names in use: properties that keep their own name claim theirs first.
+    taken = {field_name for field_name in properties if _is_plain_attribute(field_name)}
+
+    for field_name, field_schema in properties.items():
+        if not isinstance(field_schema, dict):
+            logger.warning(f"⚠️ Field '{field_name}' of {name} has no schema; accepting any value")
+            field_schema = {}
+
+        field_type = _json_schema_type(f"{name}_{field_name}", field_name, field_schema)
+        is_required = field_name in required_fields
+        field_kwargs = {}
+        if field_schema.get("description"):
+            field_kwargs["description"] = field_schema["description"]
+
+        attribute = field_name
+        if not _is_plain_attribute(field_name):
+            # LangChain exports the attribute name to the LLM, so keep it readable and
+            # name the real key in the description; the alias restores it on the wire.
+            attribute = _attribute_name(field_name, taken)
+            taken.add(attribute)
+            field_kwargs["alias"] = field_name
+            hint = f"(sent to the tool as '{field_name}')"
+            field_kwargs["description"] = f"{field_kwargs['description']} {hint}" if "description" in field_kwargs else hint
+
+        if is_required:
+            fields[attribute] = (field_type, Field(..., **field_kwargs))
+        else:
+            fields[attribute] = (Optional[field_type], Field(default=field_schema.get("default"), **field_kwargs))
+
+    return create_model(name, __config__=ConfigDict(populate_by_name=True), **fields)
+
+
+def _is_plain_attribute(field_name: str) -> bool:
+    return field_name.isidentifier() and not keyword.iskeyword(field_name) and not field_name.startswith("_")
+
+
+def _attribute_name(field_name: str, taken: set) -> str:
+    """A model attribute for a property that cannot be one, e.g. "from" -> "from_", "dry-run" -> "dry_run"."""
+    attribute = re.sub(r"\W", "_", field_name).strip("_") or "field"
+    if attribute[0].isdigit():
+        attribute = f"field_{attribute}"
+    if keyword.iskeyword(attribute):
+        attribute += "_"
+    candidate, suffix = attribute, 2
+    while candidate in taken:
+        candidate = f"{attribute}_{suffix}"
+        suffix += 1
+    return candidate
+
+
+def _json_schema_type(name: str, field_name: str, field_schema: Dict[str, Any]):
+    if "enum" in field_schema and field_schema["enum"]:
+        return Literal[tuple(field_schema["enum"])]
+
+    variants = field_schema.get("anyOf") or field_schema.get("oneOf")
+    if variants:
+        members = [_json_schema_type(f"{name}_{i}", field_name, v) for i, v in enumerate(variants)]
+        return Union[tuple(members)] if len(members) > 1 else members[0]
+
+    json_type = field_schema.get("type")
+    if isinstance(json_type, list):
+        members = [_json_schema_type(name, field_name, {**field_schema, "type": t}) for t in json_type]
+        return Union[tuple(members)] if len(members) > 1 else members[0]
+
+    if json_type is None:
+        # Untyped properties were historically treated as strings; keep that unless
+        # the schema carries object structure.
+        json_type = "object" if "properties" in field_schema else "string"
+
+    if json_type in _JSON_SCALARS:
+        return _JSON_SCALARS[json_type]
+
+    if json_type == "array":
+        items_schema = field_schema.get("items")
+        if not isinstance(items_schema, dict) or not items_schema:
+            logger.warning(f"⚠️ Array field '{field_name}' has no 'items' schema; accepting any items")
+            return List[Any]
+        return List[_json_schema_type(f"{name}_Item", field_name, items_schema)]
+
+    if json_type == "object":
+        if field_schema.get("properties"):
+            return schema_to_pydantic_model(name, {**field_schema, "type": "object"})
+        return Dict[str, Any]
+
+    logger.warning(f"⚠️ Unsupported JSON Schema type '{json_type}' for '{field_name}'; accepting any value")
+    return Any
@@ -0,0 +1,168 @@
+import re
+import time
+import logging
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+def normalize_query(text: str) -> str:
+    """
+    Cache key for a user request.
+
+    Case, whitespace and trailing punctuation are ignored, and digit runs are
+    masked so "show bgp on R1" and "show bgp on R2" share an entry: device
+    numbers, VLAN ids and addresses do not change which tools fit a request.
+    """
+    text = re.sub(r"\d+", "#", normalize_text(text))
+    return text.rstrip("?.! ")
+
+
+def normalize_text(text: str) -> str:
+    """
+    Cache key for a query embedding: case and whitespace only, so requests that
+    differ in addresses or counts are embedded separately.
+    """
+    return re.sub(r"\s+", " ", text.strip().lower())
+
+
+class TTLCache:
+    """Least-recently-used mapping whose entries also expire after `ttl` seconds."""
+
+    def __init__(self, max_entries: int = 512, ttl: float = 900):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._data: "OrderedDict[str, Tuple[float, Any]]" = OrderedDict()
+
+    def get(self, key: str) -> Optional[Any]:
+        item = self._data.get(key)
+        if item is None:
+            return None
+        stored_at, value = item
+        if time.monotonic() - stored_at > self.ttl:
+            del self._data[key]
+            return None
+        self._data.move_to_end(key)
+        return value
+
+    def put(self, key: str, value: Any):
+        self._data[key] = (time.monotonic(), value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.max_entries:
+            self._data.popitem(last=False)
+
+    def items(self):
+        now = time.monotonic()
+        return [(k, v) for k, (stored_at, v) in self._data.items() if now - stored_at <= self.ttl]
+
+    def clear(self):
+        self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+
+class SelectionCache:
+    """
+    Caches query embeddings and final tool selections for `select_tools`.
+
+    An exact hit on the normalized query skips both the embedding call and the
+    refinement LLM call. With `similarity_threshold` set, a query whose
+    embedding is at least that close to a cached one reuses its selection and
+    skips the refinement call.
+    """
+
+    def __init__(self, max_entries: int = 512, ttl: float = 900,
+                 similarity_threshold: Optional[float] = 0.97):
+        self.similarity_threshold = similarity_threshold
+        self.embeddings = TTLCache(max_entries, ttl)
+        self.selections = TTLCache(max_entries, ttl)
+        self.hits = {"exact": 0, "similar": 0, "miss": 0}
+
+    def get_embedding(self, query: str) -> Optional[np.ndarray]:
+        return self.embeddings.get(normalize_text(query))
+
+    def put_embedding(self, query: str, vector: np.ndarray):
+        self.embeddings.put(normalize_text(query), vector)
+
+    def lookup(self, query: str) -> Optional[List[str]]:
+        """Returns the cached selection for the same normalized query."""
+        entry = self.selections.get(normalize_query(query))
+        if entry is None:
+            return None
+        self.hits["exact"] += 1
+        return entry[1]
+
+    def lookup_similar(self, vector: np.ndarray) -> Optional[List[str]]:
+        """Returns the selection of the most similar cached query above the threshold."""
+        if self.similarity_threshold is None:
+            self.hits["miss"] += 1
+            return None
+        entries = self.selections.items()
+        if entries:
+            matrix = np.vstack([cached_vector for _, (cached_vector, _) in entries])
+            scores = matrix @ vector
+            best = int(np.argmax(scores))
+            if scores[best] >= self.similarity_threshold:
+                key, (_, tools) = entries[best]
+                logger.info(f"♻️ Reusing tool selection of similar query '{key}' ({scores[best]:.3f})")
+                self.hits["similar"] += 1
+                return tools
+        self.hits["miss"] += 1
+        return None
+
+    def store(self, query: str, vector: np.ndarray, tools: List[str]):
+        """Caches a selection; empty ones (e.g. a "None" refinement answer) are not reused."""
+        if not tools:
+            return
+        self.selections.put(normalize_query(query), (vector, list(tools)))
+
+    def clear(self):
+        """Drops everything; called whenever the tool catalog changes."""
+        self.embeddings.clear()
+        self.selections.clear()
+
+
+class SelectionMetrics:
+    """
+    Counters for how `select_tools` reached its selection.
+
+    `sources` counts selections by path (cache, fast path, LLM refinement).
+    A sample of fast-path selections is refined anyway; `audits` counts them
+    per fast-path reason and `audit_misses` those where refinement picked a
+    tool the fast path left out, which shows whether the fast path is too
+    eager.
+    """
+
+    def __init__(self):
+        self.sources: Dict[str, int] = {}
+        self.fast_path_reasons: Dict[str, int] = {}
+        self.audits: Dict[str, int] = {}
+        self.audit_misses: Dict[str, int] = {}
+
+    def record_selection(self, source: str, reason: Optional[str] = None):
+        self.sources[source] = self.sources.get(source, 0) + 1
+        if reason:
+            self.fast_path_reasons[reason] = self.fast_path_reasons.get(reason, 0) + 1
+
+    def record_audit(self, reason: str, missed: List[str]):
+        self.audits[reason] = self.audits.get(reason, 0) + 1
+        if missed:
+            self.audit_misses[reason] = self.audit_misses.get(reason, 0) + 1
+
+    def summary(self) -> Dict[str, Any]:
+        total = sum(self.sources.values())
+        fast = self.sources.get("fast_path", 0)
+        return {
+            "selections": dict(self.sources),
+            "fast_path_rate": round(fast / total, 3) if total else 0.0,
+            "fast_path_reasons": dict(self.fast_path_reasons),
+            "fast_path_audits": dict(self.audits),
+            "fast_path_miss_rate": {
+                reason: round(self.audit_misses.get(reason, 0) / audits, 3)
+                for reason, audits in self.audits.items()
+            },
+        }
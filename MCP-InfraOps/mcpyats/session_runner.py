@@ -0,0 +1,197 @@
+import os
+import time
+import asyncio
+import logging
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import Any, Deque, Dict, Optional, Set, Tuple
+
+from langchain_core.messages import AIMessage, HumanMessage
+from langgraph.checkpoint.memory import MemorySaver
+
+logger = logging.getLogger(__name__)
+
+MAX_CONCURRENT_RUNS = int(os.getenv("MCPYATS_MAX_CONCURRENT_RUNS", "8"))
+MAX_PENDING_PER_SESSION = int(os.getenv("MCPYATS_MAX_PENDING_PER_SESSION", "4"))
+MAX_PENDING_TOTAL = int(os.getenv("MCPYATS_MAX_PENDING_TOTAL", "256"))
+
+
+class RunnerBusy(Exception):
+    """Raised when a message is rejected for backpressure; the caller should retry later."""
+
+
+class MultiSessionRunner:
+    """
+    Serves many operator sessions from one compiled graph.
+
+    * Each session is a checkpointer thread, so its messages and context are
+      restored from the store on every turn instead of living in the caller.
+    * A session runs at most one turn at a time (its lock); further messages
+      queue behind it, up to `max_pending_per_session`.
+    * At most `max_concurrent_runs` turns run at once across all sessions, and
+      `max_pending_total` bounds everything queued; beyond that `submit` raises
+      `RunnerBusy` instead of growing without limit.
+    * Free run slots go to sessions round-robin, one turn at a time, so a
+      session with a long queue cannot starve the others.
+
+    MCP requests made by the runs share the container sessions of
+    `mcp_session.session_pool`, which caps requests in flight across all of them.
+    """
+
+    def __init__(self, graph=None, checkpointer=None, max_concurrent_runs: int = MAX_CONCURRENT_RUNS,
+                 max_pending_per_session: int = MAX_PENDING_PER_SESSION, max_pending_total: int = MAX_PENDING_TOTAL):
+        if graph is None:
+            from mcpyats import build_graph
+            self.checkpointer = checkpointer or MemorySaver()
+            graph = build_graph(checkpointer=self.checkpointer)
+        else:
+            self.checkpointer = checkpointer or graph.checkpointer
+        self.graph = graph
+        self.max_concurrent_runs = max_concurrent_runs
+        self.max_pending_per_session = max_pending_per_session
+        self.max_pending_total = max_pending_total
+
+        self._queues: Dict[str, Deque[Tuple[str, asyncio.Future]]] = {}
+        # Per-session lock and the number of holders or waiters; dropped when that reaches zero.
+        self._locks: Dict[str, Tuple[asyncio.Lock, int]] = {}
+        # Sessions with queued turns and no turn running, in scheduling order.
+        self._ready: Deque[str] = deque()
+        self._active: Set[str] = set()
+        self._running = 0
+        self._pending = 0
+        self.completed = 0
+        self.rejected = 0
+
+    def _config(self, session_id: str) -> Dict[str, Any]:
+        return {"configurable": {"thread_id": session_id}}
+
+    @asynccontextmanager
+    async def _lock(self, session_id: str):
+        """Holds the session's lock; idle sessions keep no lock around."""
+        lock, users = self._locks.get(session_id, (None, 0))
+        lock = lock or asyncio.Lock()
+        self._locks[session_id] = (lock, users + 1)
+        try:
+            async with lock:
+                yield
+        finally:
+            lock, users = self._locks[session_id]
+            if users == 1:
+                del self._locks[session_id]
+            else:
+                self._locks[session_id] = (lock, users - 1)
+
+    def _forget_if_idle(self, session_id: str):
+        """Drops the queue of a session with nothing queued and no turn running."""
+        if not self._queues.get(session_id) and session_id not in self._active:
+            self._queues.pop(session_id, None)
+            try:
+                self._ready.remove(session_id)
+            except ValueError:
+                pass
+
+    async def submit(self, session_id: str, message: str, timeout: Optional[float] = None) -> Dict[str, Any]:
+        """
+        Queues one user message for a session and waits for the turn to finish.
+
+        Returns:
+            The session's state after the turn.
+
+        Raises:
+            RunnerBusy: If the session's queue or the runner's total queue is full.
+            asyncio.TimeoutError: If `timeout` passes first; a turn that already
+                started still completes and is checkpointed.
+        """
+        queued = len(self._queues.get(session_id, ()))
+        if self._pending >= self.max_pending_total or queued >= self.max_pending_per_session:
+            self.rejected += 1
+            raise RunnerBusy(f"Too many pending messages for session {session_id}; retry later")
+
+        queue = self._queues.setdefault(session_id, deque())
+        future = asyncio.get_running_loop().create_future()
+        queue.append((message, future))
+        self._pending += 1
+        if session_id not in self._active and session_id not in self._ready:
+            self._ready.append(session_id)
+        self._dispatch()
+
+        try:
+            return await asyncio.wait_for(asyncio.shield(future), timeout)
+        except (asyncio.TimeoutError, asyncio.CancelledError):
+            # Withdraw the message if its turn has not started yet.
+            if (message, future) in queue:
+                queue.remove((message, future))
+                self._pending -= 1
+                future.cancel()
+                self._forget_if_idle(session_id)
+            raise
+
+    def _dispatch(self):
+        while self._running < self.max_concurrent_runs and self._ready:
+            session_id = self._ready.popleft()
+            queue = self._queues.get(session_id)
+            if not queue:
+                self._forget_if_idle(session_id)
+                continue
+            message, future = queue.popleft()
+            self._pending -= 1
+            self._running += 1
+            self._active.add(session_id)
+            asyncio.get_running_loop().create_task(self._run_turn(session_id, message, future))
+
+    async def _run_turn(self, session_id: str, message: str, future: asyncio.Future):
+        started = time.monotonic()
+        try:
+            async with self._lock(session_id):
+                state = await self.graph.ainvoke(
+                    {"messages": [HumanMessage(content=message)]}, config=self._config(session_id)
+                )
+            if not future.done():
+                future.set_result(state)
+            self.completed += 1
+            logger.info(f"💬 Session {session_id} turn finished in {time.monotonic() - started:.2f}s")
+        except Exception as e:
+            logger.error(f"❌ Session {session_id} turn failed: {e}", exc_info=True)
+            if not future.done():
+                future.set_exception(e)
+        finally:
+            self._running -= 1
+            self._active.discard(session_id)
+            queue = self._queues.get(session_id)
+            if queue:
+                # Back of the line: other sessions get their turn first.
+                self._ready.append(session_id)
+            else:
+                self._forget_if_idle(session_id)
+            self._dispatch()
+
+    async def history(self, session_id: str):
+        """The session's checkpointed messages, read between turns."""
+        async with self._lock(session_id):
+            snapshot = await self.graph.aget_state(self._config(session_id))
+        return snapshot.values.get("messages", [])
+
+    async def reset(self, session_id: str):
+        """Forgets a session's checkpointed state."""
+        async with self._lock(session_id):
+            await self.checkpointer.adelete_thread(session_id)
+
+    def status(self) -> Dict[str, Any]:
+        return {
+            "running": self._running,
+            "pending": self._pending,
+            "sessions_active": len(self._active),
+            "sessions_waiting": len(self._ready),
+            "sessions_tracked": len(self._queues),
+            "max_concurrent_runs": self.max_concurrent_runs,
+            "completed": self.completed,
+            "rejected": self.rejected,
+        }
+
+
+def last_reply(state: Dict[str, Any]) -> Optional[str]:
+    """Content of the final assistant message in a turn's resulting state."""
+    for message in reversed(state.get("messages", [])):
+        if isinstance(message, AIMessage) and message.content:
+            return message.content
+    return None
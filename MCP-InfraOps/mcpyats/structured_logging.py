@@ -0,0 +1,134 @@
+import os
+import json
+import time
+import uuid
+import random
+import logging
+import reprlib
+from collections import deque
+from typing import Any, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# "text" keeps the emoji log lines; "json" emits one JSON object per event.
+LOG_MODE = os.getenv("MCPYATS_LOG_MODE", "text").lower()
+MAX_FIELD_CHARS = int(os.getenv("MCPYATS_LOG_MAX_FIELD_CHARS", "300"))
+DEBUG_CAPTURE_ENTRIES = int(os.getenv("MCPYATS_DEBUG_CAPTURE_ENTRIES", "50"))
+DEBUG_CAPTURE_MAX_CHARS = int(os.getenv("MCPYATS_DEBUG_CAPTURE_MAX_CHARS", str(256 * 1024)))
+
+
+def parse_sample_rates(spec: str) -> Dict[str, float]:
+    """Parses `path=rate` pairs, e.g. `"call_tool=0.1,assistant=0.05"`."""
+    rates = {}
+    for item in spec.split(","):
+        path, _, rate = item.partition("=")
+        if not path.strip() or not rate.strip():
+            continue
+        try:
+            rates[path.strip()] = min(max(float(rate), 0.0), 1.0)
+        except ValueError:
+            logger.warning(f"⚠️ Ignoring invalid log sample rate '{item}'")
+    return rates
+
+
+SAMPLE_RATES = parse_sample_rates(os.getenv("MCPYATS_LOG_SAMPLE_RATES", ""))
+
+
+# Bounded repr for log fields, so a large tool result is never formatted in full.
+_field_repr = reprlib.Repr()
+_field_repr.maxlevel = 4
+_field_repr.maxdict = _field_repr.maxlist = 20
+_field_repr.maxstring = _field_repr.maxother = MAX_FIELD_CHARS
+
+
+def truncate(value: Any, max_chars: int = MAX_FIELD_CHARS, full_repr: bool = False) -> str:
+    """String form of `value`, cut to `max_chars` with a note of how much was dropped."""
+    if isinstance(value, str):
+        text = value
+    else:
+        text = repr(value) if full_repr else _field_repr.repr(value)
+    if len(text) <= max_chars:
+        return text
+    return f"{text[:max_chars]}...(+{len(text) - max_chars} chars)"
+
+
+class DebugCapture:
+    """
+    Ring buffer of full payloads for calls that failed.
+
+    Payloads are stashed by reference while a call is running and only
+    serialized into the ring buffer if the call fails; successful calls are
+    discarded without formatting anything.
+    """
+
+    def __init__(self, max_entries: int = DEBUG_CAPTURE_ENTRIES, max_chars: int = DEBUG_CAPTURE_MAX_CHARS):
+        self.max_chars = max_chars
+        self.captures: deque = deque(maxlen=max_entries)
+        self._pending: Dict[str, Dict[str, Any]] = {}
+
+    def stash(self, call_id: str, **payload):
+        self._pending.setdefault(call_id, {}).update(payload)
+
+    def discard(self, call_id: str):
+        self._pending.pop(call_id, None)
+
+    def capture(self, call_id: str, path: str, error: Any):
+        """Moves the stashed payloads of a failed call into the ring buffer."""
+        payload = self._pending.pop(call_id, {})
+        self.captures.append({
+            "call_id": call_id,
+            "path": path,
+            "time": time.time(),
+            "error": truncate(error, self.max_chars, full_repr=True),
+            "payload": {key: truncate(value, self.max_chars, full_repr=True) for key, value in payload.items()},
+        })
+
+    def recent(self, limit: Optional[int] = None) -> List[Dict[str, Any]]:
+        captures = list(self.captures)
+        return captures[-limit:] if limit else captures
+
+
+class EventLogger:
+    """
+    Logs named events on a code path with truncated fields and per-path sampling.
+
+    Events below WARNING are kept with the path's sample rate (default 1.0);
+    warnings and errors are always logged. Nothing is formatted for events
+    that are sampled out or below the logger's level.
+    """
+
+    def __init__(self, target: logging.Logger, path: str, sample_rate: Optional[float] = None,
+                 mode: str = LOG_MODE, max_field_chars: int = MAX_FIELD_CHARS):
+        self.target = target
+        self.path = path
+        self.sample_rate = SAMPLE_RATES.get(path, 1.0) if sample_rate is None else sample_rate
+        self.mode = mode
+        self.max_field_chars = max_field_chars
+
+    def new_call_id(self) -> str:
+        return uuid.uuid4().hex[:12]
+
+    def sampled(self) -> bool:
+        return self.sample_rate >= 1.0 or random.random() < self.sample_rate
+
+    def event(self, message: str, level: int = logging.INFO, sampled: Optional[bool] = None, **fields):
+        """Logs one event; pass the call's `sampled()` decision to keep a call's events together."""
+        if not self.target.isEnabledFor(level):
+            return
+        if level < logging.WARNING and not (self.sampled() if sampled is None else sampled):
+            return
+        if self.mode == "json":
+            record = {"path": self.path, "event": message}
+            record.update({key: self._field(value) for key, value in fields.items()})
+            self.target.log(level, json.dumps(record, default=str))
+        else:
+            details = " ".join(f"{key}={self._field(value)}" for key, value in fields.items())
+            self.target.log(level, f"{message} {details}" if details else message)
+
+    def _field(self, value: Any):
+        if isinstance(value, (int, float, bool)) or value is None:
+            return value
+        return truncate(value, self.max_field_chars)
+
+
+debug_capture = DebugCapture()
@@ -0,0 +1,100 @@
+import logging
+from typing import Any, Dict, List, Optional, Tuple
+
+from circuit_breaker import circuit_breakers
+from schema_models import canonical_schema_hash
+
+logger = logging.getLogger(__name__)
+
+
+def definition_hash(tool_definition: Dict[str, Any]) -> str:
+    """Identifies a discovered tool definition (name, description and schema)."""
+    return canonical_schema_hash(tool_definition)
+
+
+def tool_service(tool) -> str:
+    return (tool.metadata or {}).get("service", "local")
+
+
+class CatalogDiff:
+    """Tool names added, removed, changed or unchanged by a service rediscovery."""
+
+    def __init__(self, added: List[str], removed: List[str], changed: List[str], unchanged: List[str]):
+        self.added = added
+        self.removed = removed
+        self.changed = changed
+        self.unchanged = unchanged
+
+    @property
+    def is_empty(self) -> bool:
+        return not (self.added or self.removed or self.changed)
+
+    def as_dict(self) -> Dict[str, List[str]]:
+        return {"added": self.added, "removed": self.removed, "changed": self.changed, "unchanged": self.unchanged}
+
+
+def diff_service_tools(current_tools, definitions: List[Dict[str, Any]]) -> CatalogDiff:
+    """Compares a service's current tools with freshly discovered definitions."""
+    current = {tool.name: (tool.metadata or {}).get("definition_hash") for tool in current_tools}
+    discovered = {definition["name"]: definition_hash(definition) for definition in definitions}
+    return CatalogDiff(
+        added=[name for name in discovered if name not in current],
+        removed=[name for name in current if name not in discovered],
+        changed=[name for name, h in discovered.items() if name in current and current[name] != h],
+        unchanged=[name for name, h in discovered.items() if name in current and current[name] == h],
+    )
+
+
+class ToolCatalog:
+    """
+    Immutable snapshot of the tool set and embedding index that graph runs work against.
+
+    Reloads build a new catalog and swap it in; runs that started on an older
+    version keep resolving tools against it (see `AgentRuntime.catalog_for`).
+    """
+
+    def __init__(self, version: int, tools: List, tool_index=None):
+        self.version = version
+        self.tools = list(tools)
+        self.by_name = {tool.name: tool for tool in self.tools}
+        self.tool_index = tool_index
+        self._healthy: Optional[Tuple[frozenset, List, Dict]] = None
+
+    def tools_for_service(self, service_name: str) -> List:
+        return [tool for tool in self.tools if tool_service(tool) == service_name]
+
+    def services(self) -> List[str]:
+        return sorted({tool_service(tool) for tool in self.tools})
+
+    def tools_with_service(self, service_name: str, service_tools: List) -> List:
+        """This catalog's tools with `service_name`'s replaced, keeping the other services' order."""
+        tools = []
+        inserted = False
+        for tool in self.tools:
+            if tool_service(tool) == service_name:
+                if not inserted:
+                    tools.extend(service_tools)
+                    inserted = True
+            else:
+                tools.append(tool)
+        if not inserted:
+            tools.extend(service_tools)
+        return tools
+
+    def _healthy_view(self):
+        unhealthy = frozenset(circuit_breakers.unhealthy())
+        if self._healthy is None or self._healthy[0] != unhealthy:
+            if unhealthy:
+                logger.warning(f"🚫 Hiding tools of unhealthy services: {sorted(unhealthy)}")
+            tools = [tool for tool in self.tools if tool_service(tool) not in unhealthy]
+            self._healthy = (unhealthy, tools, {tool.name: tool for tool in tools})
+        return self._healthy
+
+    @property
+    def valid_tools(self) -> List:
+        """Tools of this catalog, minus those of services whose circuit breaker is open."""
+        return self._healthy_view()[1]
+
+    @property
+    def tools_by_name(self) -> Dict:
+        return self._healthy_view()[2]
@@ -0,0 +1,93 @@
+import os
+import json
+import time
+import asyncio
+import logging
+from typing import Dict, Any, List, Optional
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CACHE_PATH = os.getenv(
+    "MCP_TOOL_CATALOG_CACHE",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache", "tool_catalog.json"),
+)
+
+
+async def container_image_digest(container_name: str, timeout: float = 10) -> Optional[str]:
+    """Returns the image id the container is running, or None if docker cannot tell."""
+    try:
+        process = await asyncio.create_subprocess_exec(
+            "docker", "inspect", "--format", "{{.Image}}", container_name,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.PIPE
+        )
+        stdout, _ = await asyncio.wait_for(process.communicate(), timeout=timeout)
+    except asyncio.TimeoutError:
+        process.kill()
+        logger.warning(f"⏱️ docker inspect timed out for {container_name}")
+        return None
+    except Exception as e:
+        logger.warning(f"⚠️ docker inspect failed for {container_name}: {e}")
+        return None
+    if process.returncode != 0:
+        return None
+    return stdout.decode().strip() or None
+
+
+class ToolCatalogCache:
+    """
+    On-disk cache of discovered tool definitions, keyed by container and image digest.
+
+    An entry is only served while the container still runs the image it was
+    discovered from, so rebuilding a container invalidates its tools.
+    """
+
+    def __init__(self, path: str = DEFAULT_CACHE_PATH):
+        self.path = path
+        self._entries: Optional[Dict[str, Any]] = None
+
+    def _load(self) -> Dict[str, Any]:
+        if self._entries is None:
+            try:
+                with open(self.path) as f:
+                    self._entries = json.load(f)
+            except FileNotFoundError:
+                self._entries = {}
+            except (OSError, json.JSONDecodeError) as e:
+                logger.warning(f"⚠️ Ignoring unreadable tool catalog cache {self.path}: {e}")
+                self._entries = {}
+        return self._entries
+
+    def get(self, container_name: str, image_digest: Optional[str]) -> Optional[List[Dict[str, Any]]]:
+        """Returns cached tool definitions if they were discovered from `image_digest`."""
+        if not image_digest:
+            return None
+        entry = self._load().get(container_name)
+        if entry and entry.get("image") == image_digest:
+            return entry.get("tools")
+        return None
+
+    def put(self, container_name: str, image_digest: Optional[str], tools: List[Dict[str, Any]]) -> bool:
+        """Stores tool definitions and returns True if they differ from what was cached."""
+        if not image_digest or not tools:
+            return False
+        entries = self._load()
+        previous = entries.get(container_name, {})
+        changed = previous.get("image") != image_digest or previous.get("tools") != tools
+        if changed:
+            entries[container_name] = {"image": image_digest, "tools": tools, "updated_at": time.time()}
+            self._save()
+        return changed
+
+    def _save(self):
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        tmp_path = f"{self.path}.tmp"
+        try:
+            with open(tmp_path, "w") as f:
+                json.dump(self._entries, f)
+            os.replace(tmp_path, self.path)
+        except OSError as e:
+            logger.warning(f"⚠️ Could not write tool catalog cache {self.path}: {e}")
+
+
+tool_catalog_cache = ToolCatalogCache()
@@ -0,0 +1,229 @@
+import os
+import json
+import hashlib
+import logging
+from typing import Dict, List, Tuple, Optional
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_INDEX_DIR = os.getenv(
+    "MCP_TOOL_INDEX_DIR",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache", "tool_index"),
+)
+
+
+def tool_document_text(name: str, description: Optional[str]) -> str:
+    """The text embedded for each tool; also shown to the refinement LLM."""
+    return f"Tool name: {name}. Tool purpose: {description}"
+
+
+def tool_content_hash(name: str, description: Optional[str], model: str) -> str:
+    """Identifies an embedding: it only changes when the tool text or the embedding model does."""
+    return hashlib.sha256(json.dumps([name, description or "", model]).encode()).hexdigest()
+
+
+class ToolEmbeddingIndex:
+    """
+    Normalized tool-description embeddings persisted as a float32 `.npy` matrix.
+
+    Rows are keyed by `tool_content_hash`, so on restart only new or changed
+    tools are sent to the embedding model. When nothing changed, the matrix is
+    used straight from a read-only memory map.
+    """
+
+    def __init__(self, embedding, model: str, index_dir: str = DEFAULT_INDEX_DIR):
+        self.embedding = embedding
+        self.model = model
+        self.index_dir = index_dir
+        self.names: List[str] = []
+        self.hashes: List[str] = []
+        self.matrix: np.ndarray = np.zeros((0, 0), dtype=np.float32)
+
+    @property
+    def _matrix_path(self) -> str:
+        return os.path.join(self.index_dir, "vectors.npy")
+
+    @property
+    def _meta_path(self) -> str:
+        return os.path.join(self.index_dir, "meta.json")
+
+    def _load_stored(self) -> Tuple[List[str], Optional[np.ndarray]]:
+        try:
+            with open(self._meta_path) as f:
+                hashes = json.load(f)["hashes"]
+            matrix = np.load(self._matrix_path, mmap_mode="r")
+            if matrix.dtype != np.float32 or matrix.ndim != 2 or matrix.shape[0] != len(hashes):
+                raise ValueError(f"unexpected matrix shape {matrix.shape}")
+            return hashes, matrix
+        except FileNotFoundError:
+            return [], None
+        except (OSError, ValueError, KeyError, json.JSONDecodeError) as e:
+            logger.warning(f"⚠️ Ignoring unreadable tool index in {self.index_dir}: {e}")
+            return [], None
+
+    async def build(self, tools) -> "ToolEmbeddingIndex":
+        """Loads stored embeddings and embeds only tools whose content hash is new."""
+        names, descriptions, hashes = self._describe(tools)
+
+        stored_hashes, stored = self._load_stored()
+        if stored is not None and stored_hashes == hashes:
+            logger.info(f"⚡ Loaded {len(hashes)} tool embeddings from {self.index_dir}")
+            self.names, self.hashes, self.matrix = names, hashes, stored
+            return self
+
+        known = {h: stored[i] for i, h in enumerate(stored_hashes)}
+        await self._assemble(names, descriptions, hashes, known)
+        return self
+
+    async def updated(self, tools) -> "ToolEmbeddingIndex":
+        """
+        Returns a new index for `tools`, reusing this index's rows for unchanged tools.
+
+        This index is left untouched, so searches in flight against it stay
+        consistent while the new one is built.
+        """
+        names, descriptions, hashes = self._describe(tools)
+        known = {h: self.matrix[i] for i, h in enumerate(self.hashes)}
+        index = ToolEmbeddingIndex(self.embedding, self.model, self.index_dir)
+        await index._assemble(names, descriptions, hashes, known)
+        return index
+
+    def _describe(self, tools) -> Tuple[List[str], List[Optional[str]], List[str]]:
+        names = [tool.name for tool in tools]
+        descriptions = [getattr(tool, "description", None) for tool in tools]
+        hashes = [tool_content_hash(n, d, self.model) for n, d in zip(names, descriptions)]
+        return names, descriptions, hashes
+
+    async def _assemble(self, names: List[str], descriptions: List[Optional[str]], hashes: List[str],
+                        known: Dict[str, np.ndarray]):
+        missing = [i for i, h in enumerate(hashes) if h not in known]
+        logger.info(f"🧮 Embedding {len(missing)} of {len(hashes)} tool descriptions")
+
+        new_vectors = {}
+        if missing:
+            texts = [tool_document_text(names[i], descriptions[i]) for i in missing]
+            vectors = await self.embedding.aembed_documents(texts)
+            new_vectors = dict(zip(missing, vectors))
+
+        rows = [
+            np.asarray(new_vectors[i], dtype=np.float32) if i in new_vectors else known[h]
+            for i, h in enumerate(hashes)
+        ]
+        matrix = normalize_rows(np.vstack(rows)) if rows else np.zeros((0, 0), dtype=np.float32)
+        self._save(hashes, matrix)
+
+        self.names, self.hashes = names, hashes
+        reloaded_hashes, reloaded = self._load_stored()
+        self.matrix = reloaded if reloaded_hashes == hashes and reloaded is not None else matrix
+
+    def _save(self, hashes: List[str], matrix: np.ndarray):
+        try:
+            os.makedirs(self.index_dir, exist_ok=True)
+            tmp_matrix = self._matrix_path + ".tmp.npy"
+            np.save(tmp_matrix, matrix)
+            os.replace(tmp_matrix, self._matrix_path)
+            tmp_meta = self._meta_path + ".tmp"
+            with open(tmp_meta, "w") as f:
+                json.dump({"model": self.model, "hashes": hashes}, f)
+            os.replace(tmp_meta, self._meta_path)
+        except OSError as e:
+            logger.warning(f"⚠️ Could not persist tool index to {self.index_dir}: {e}")
+
+    async def embed_query(self, query: str) -> np.ndarray:
+        vector = np.asarray(await self.embedding.aembed_query(query), dtype=np.float32)
+        return vector / (np.linalg.norm(vector) or 1.0)
+
+    def scores(self, query_vector: np.ndarray) -> np.ndarray:
+        """Cosine similarity of every tool against a normalized query vector."""
+        if not self.names:
+            return np.zeros(0, dtype=np.float32)
+        return self.matrix @ query_vector
+
+    def search_vector(self, query_vector: np.ndarray, k: int = 35) -> List[Tuple[str, float]]:
+        """Returns up to `k` (tool name, cosine score) pairs for a normalized query vector, best first."""
+        scores = self.scores(query_vector)
+        return [(self.names[i], float(scores[i])) for i in top_k_indices(scores, k)]
+
+    async def search(self, query: str, k: int = 35) -> List[Tuple[str, float]]:
+        """Returns up to `k` (tool name, cosine score) pairs, best first."""
+        return self.search_vector(await self.embed_query(query), k)
+
+
+def top_k_indices(scores: np.ndarray, k: int) -> np.ndarray:
+    """Indices of the `k` highest scores, best first; O(n) selection plus a sort of only `k` items."""
+    if k >= len(scores):
+        return np.argsort(-scores)
+    top = np.argpartition(-scores, k - 1)[:k]
+    return top[np.argsort(-scores[top])]
+
+
+def adaptive_cutoff(scores, min_k: int = 3, max_k: int = 8, margin: float = 0.12,
+                    gap_factor: float = 2.0) -> int:
+    """
+    How many of the best-first `scores` are worth keeping.
+
+    Keeps candidates within `margin` of the best score, and cuts earlier at the
+    largest score gap when that gap is at least `gap_factor` times the median
+    gap, i.e. where relevance clearly drops off. Always keeps `min_k`, never
+    more than `max_k`.
+    """
+    n = min(len(scores), max_k)
+    if n <= min_k:
+        return n
+    window = np.asarray(scores[:n], dtype=np.float32)
+    keep = int(np.count_nonzero(window >= window[0] - margin))
+
+    gaps = window[min_k - 1:-1] - window[min_k:]
+    if len(gaps):
+        largest = int(np.argmax(gaps))
+        if gaps[largest] > 0 and gaps[largest] >= gap_factor * float(np.median(gaps)):
+            keep = min(keep, min_k + largest)
+    return max(min_k, keep)
+
+
+def diversify(scored: List[Tuple[str, float]], service_of: Dict[str, str], limit: int,
+              max_per_service: int = 4, margin: float = 0.2) -> List[Tuple[str, float]]:
+    """
+    Picks up to `limit` candidates from best-first `scored`, capping each service at `max_per_service`.
+
+    The best tool of every service within `margin` of the top score gets a
+    slot before a service's second-best, so one large toolset (e.g. GitHub)
+    cannot crowd out a relevant tool from another service.
+    """
+    if not scored:
+        return []
+    best = scored[0][1]
+    picked: List[Tuple[str, float]] = []
+    seen_services = set()
+    # First pass: the best tool of each sufficiently relevant service.
+    for name, score in scored:
+        service = service_of.get(name)
+        if score < best - margin or len(picked) >= limit:
+            break
+        if service not in seen_services:
+            seen_services.add(service)
+            picked.append((name, score))
+
+    # Second pass: fill remaining slots best-first, respecting the per-service cap.
+    per_service: Dict[Optional[str], int] = {}
+    for name, _ in picked:
+        per_service[service_of.get(name)] = per_service.get(service_of.get(name), 0) + 1
+    chosen = {name for name, _ in picked}
+    for name, score in scored:
+        if len(picked) >= limit:
+            break
+        service = service_of.get(name)
+        if name in chosen or per_service.get(service, 0) >= max_per_service:
+            continue
+        per_service[service] = per_service.get(service, 0) + 1
+        chosen.add(name)
+        picked.append((name, score))
+    return sorted(picked, key=lambda item: -item[1])
+
+
+def normalize_rows(matrix: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return (matrix / norms).astype(np.float32)
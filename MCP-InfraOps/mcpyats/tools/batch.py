@@ -0,0 +1,228 @@
+import os
+import re
+import time
+import asyncio
+import logging
+import ipaddress
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+BATCH_MAX_TARGETS = int(os.getenv("TOOLS_BATCH_MAX_TARGETS", "256"))
+BATCH_CONCURRENCY = int(os.getenv("TOOLS_BATCH_CONCURRENCY", "16"))
+BATCH_CELL_CHARS = int(os.getenv("TOOLS_BATCH_CELL_CHARS", "160"))
+
+# Rate-limited APIs and whois servers get fewer parallel lookups than local probes.
+TOOL_CONCURRENCY = {
+    "threat_check_tool": 4,
+    "whois_tool": 4,
+    "get_location_tool": 8,
+    "bgp_lookup_tool": 8,
+    "public_IP_ping_tool": 64,
+    "traceroute_tool": 16,
+}
+
+TARGET_KEYS = ("ip", "ips", "targets")
+
+_SEPARATORS = re.compile(r"[\s,;]+")
+_HOST_LABEL = re.compile(r"(?!-)[a-z0-9-]{1,63}(?<!-)", re.I)
+_MARKUP = re.compile(r"\*\*|`")
+_WHITESPACE = re.compile(r"\s*\n\s*-?\s*|\s{2,}")
+_LEADING_SYMBOLS = re.compile(r"^[^\w(]+")
+
+ToolCall = Callable[[Dict[str, Any]], Awaitable[Dict[str, Any]]]
+
+
+def _is_target(token: str, bare_names: bool) -> bool:
+    """Whether a token is an IP address, CIDR prefix or hostname; single-label names only if `bare_names`."""
+    try:
+        ipaddress.ip_network(token, strict=False)
+        return True
+    except ValueError:
+        pass
+    labels = token.rstrip(".").split(".")
+    if len(labels) == 1 and not bare_names:
+        return False
+    return len(token) <= 253 and all(_HOST_LABEL.fullmatch(label) for label in labels)
+
+
+def _split_targets(text: str) -> List[str]:
+    """
+    The targets of a string: split only when every piece is itself a target,
+    so URLs, commands and free text stay one target. Undotted names count only
+    in comma or semicolon lists, where they are unlikely to be prose.
+    """
+    text = text.strip()
+    tokens = [token.strip("'\"") for token in _SEPARATORS.split(text.strip("[]"))]
+    tokens = [token for token in tokens if token]
+    bare_names = bool(re.search(r"[,;]", text))
+    if tokens and all(_is_target(token, bare_names) for token in tokens):
+        return tokens
+    return [text]
+
+
+def _expand(token: str, limit: int) -> List[str]:
+    """A single target, or the host addresses of a CIDR prefix (at most `limit`)."""
+    if "/" not in token:
+        return [token]
+    try:
+        network = ipaddress.ip_network(token, strict=False)
+    except ValueError:
+        return [token]
+    if network.num_addresses == 1:
+        return [str(network.network_address)]
+    hosts = []
+    for host in network.hosts():
+        if len(hosts) >= limit:
+            break
+        hosts.append(str(host))
+    return hosts
+
+
+def parse_targets(input_value: Any, limit: int = BATCH_MAX_TARGETS) -> List[str]:
+    """
+    Targets named by a tool input, in order and without duplicates.
+
+    Accepts a string ("8.8.8.8", "8.8.8.8, 1.1.1.1", "10.0.0.0/28"), a list,
+    or a dict whose "ip", "ips" or "targets" value is either of those. A string
+    is split only when every piece is an address, prefix or hostname; anything
+    else, such as a URL, is one target. Prefixes expand to their host
+    addresses; at most `limit` targets are kept.
+    """
+    if isinstance(input_value, dict):
+        input_value = next((input_value[key] for key in TARGET_KEYS if input_value.get(key)), None)
+    if input_value is None:
+        return []
+    if isinstance(input_value, str):
+        tokens = _split_targets(input_value)
+    else:
+        tokens = [str(item).strip() for item in input_value]
+
+    targets = []
+    seen = set()
+    for token in tokens:
+        token = token.strip("'\"")
+        if not token:
+            continue
+        for target in _expand(token, limit - len(targets)):
+            if target not in seen:
+                seen.add(target)
+                targets.append(target)
+        if len(targets) >= limit:
+            logger.warning(f"⚠️ [BATCH] Target list truncated to {limit} entries")
+            break
+    return targets
+
+
+def target_options(input_value: Any) -> Dict[str, Any]:
+    """Input fields other than the targets (e.g. ping `count`), applied to every target."""
+    if not isinstance(input_value, dict):
+        return {}
+    return {key: value for key, value in input_value.items() if key not in TARGET_KEYS}
+
+
+def numeric_option(input_data: Any, key: str, cast: Callable[[float], Any], minimum: float, maximum: float) -> Any:
+    """
+    `input_data[key]` converted with `cast` and clamped to [minimum, maximum], or None when it is not set.
+
+    Tool options come from the model, often as strings ("5"); out-of-range
+    values are clamped rather than rejected.
+
+    Raises:
+        ValueError: If the value is not a finite number.
+    """
+    value = input_data.get(key) if isinstance(input_data, dict) else None
+    if value is None or value == "":
+        return None
+    try:
+        number = float(value)
+        if number != number:
+            raise ValueError("NaN")
+        number = max(minimum, min(maximum, number))
+        return cast(number)
+    except (TypeError, ValueError, OverflowError):
+        raise ValueError(f"'{key}' must be a number, got {value!r}") from None
+
+
+class BatchResult:
+    """One target's response within a fan-out."""
+
+    def __init__(self, target: str, response: Dict[str, Any], elapsed: float):
+        self.target = target
+        self.response = response
+        self.elapsed = elapsed
+
+    @property
+    def text(self) -> str:
+        return str(self.response.get("agent_response", self.response))
+
+    @property
+    def ok(self) -> bool:
+        return not self.text.lstrip().startswith(("⚠️", "❌"))
+
+
+async def fan_out(call: ToolCall, targets: List[str], options: Optional[Dict[str, Any]] = None,
+                  concurrency: int = BATCH_CONCURRENCY) -> List[BatchResult]:
+    """
+    Calls `call({"ip": target, **options})` for every target, `concurrency` at a time.
+
+    A failing target becomes an error row instead of failing the batch.
+    Results follow the order of `targets`.
+    """
+    limit = asyncio.Semaphore(max(1, concurrency))
+    options = options or {}
+
+    async def one(target: str) -> BatchResult:
+        async with limit:
+            started = time.perf_counter()
+            try:
+                response = await call({"ip": target, **options})
+            except Exception as e:
+                logger.error(f"❌ [BATCH] {target} failed: {e}")
+                response = {"agent_response": f"⚠️ {type(e).__name__}: {e}"}
+            if not isinstance(response, dict):
+                response = {"agent_response": str(response)}
+            return BatchResult(target, response, time.perf_counter() - started)
+
+    return await asyncio.gather(*(one(target) for target in targets))
+
+
+def condense(text: str, target: str = "", max_chars: int = BATCH_CELL_CHARS) -> str:
+    """A tool's answer flattened onto one table cell, minus the target and status emoji the row already shows."""
+    text = _MARKUP.sub("", text).strip()
+    if target:
+        # Whole-token matches only: target 8.8.8.8 must not touch 18.8.8.8 or 8.8.8.88.
+        token = rf"(?<![\w.:]){re.escape(target)}(?!\w|[.:]\w)"
+        text = re.sub(rf"The IP {token} | for {token}", "", text)
+        text = re.sub(token, "…", text)
+    text = _LEADING_SYMBOLS.sub("", text)
+    text = _WHITESPACE.sub(" · ", text).replace("|", "/")
+    if len(text) > max_chars:
+        text = text[:max_chars - 1].rstrip() + "…"
+    return text
+
+
+def format_table(tool_name: str, results: List[BatchResult], elapsed: float) -> str:
+    """One markdown table summarizing a fan-out, failures included."""
+    failed = sum(1 for result in results if not result.ok)
+    lines = [
+        f"🧾 **{tool_name}**: {len(results)} targets, {len(results) - failed} ok, {failed} failed "
+        f"({elapsed:.1f}s)",
+        "",
+        "| # | target | ok | result |",
+        "|---|---|---|---|",
+    ]
+    for index, result in enumerate(results, 1):
+        status = "✅" if result.ok else "⚠️"
+        lines.append(f"| {index} | {result.target} | {status} | {condense(result.text, result.target)} |")
+    return "\n".join(lines)
+
+
+async def run_batch(tool_name: str, call: ToolCall, targets: List[str],
+                    options: Optional[Dict[str, Any]] = None, concurrency: Optional[int] = None) -> Dict[str, Any]:
+    """Fans a tool out over `targets` and answers with a single table."""
+    concurrency = concurrency or TOOL_CONCURRENCY.get(tool_name, BATCH_CONCURRENCY)
+    logger.info(f"🧾 [BATCH] {tool_name} over {len(targets)} targets ({concurrency} at a time)")
+    started = time.perf_counter()
+    results = await fan_out(call, targets, options, concurrency)
+    return {"agent_response": format_table(tool_name, results, time.perf_counter() - started)}
@@ -1,16 +1,58 @@
 import logging
-import requests
+import ipaddress
+import httpx
 from langsmith import traceable
 from langchain.tools import Tool
+from tools.http_client import http_client, run_sync
+from tools.lookup_cache import lookup_cache
+from tools.prefix_index import prefix_index
 
 # ✅ Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Longest prefixes accepted in the global routing table: no more-specific route can exist inside them.
+MAX_ROUTED_PREFIXLEN = {4: 24, 6: 48}
+
+def leaf_prefixes(record):
+    """
+    Prefixes an answer may be reused for: its prefix if nothing more specific
+    can be routed inside it, else none (the answer is cached for the IP only).
+    """
+    try:
+        network = ipaddress.ip_network(record["prefix"], strict=False)
+    except (ValueError, TypeError):
+        return []
+    return [str(network)] if network.prefixlen >= MAX_ROUTED_PREFIXLEN[network.version] else []
+
+async def fetch_bgp_record(ip):
+    """
+    Queries BGPView for the prefix announcing `ip`.
+
+    Returns:
+    - dict with asn, prefix, name and country, or None when no prefix covers the IP
+    """
+    url = f"https://api.bgpview.io/ip/{ip}"
+    response = await http_client.get(url, timeout=5)
+    response.raise_for_status()
+    data = response.json()
+
+    # ✅ Extract ASN and Prefix from prefixes list
+    prefixes = data.get("data", {}).get("prefixes", [])
+    if not prefixes:
+        return None
+    asn_data = prefixes[0].get("asn", {})
+    return {
+        "asn": asn_data.get("asn", "Unknown"),
+        "prefix": prefixes[0].get("prefix", "Unknown"),
+        "name": asn_data.get("name", "Unknown"),
+        "country": asn_data.get("country_code", "Unknown"),
+    }
+
 @traceable
-def bgp_lookup_tool(input_data):
+async def bgp_lookup_tool_async(input_data):
     """
-    Queries BGPView API for ASN and routing information.
+    Looks up ASN and routing information, from the local prefix index when loaded, else BGPView API.
 
     Parameters:
     - input_data (dict): Must contain {"ip": "x.x.x.x"}
@@ -27,21 +69,17 @@ def bgp_lookup_tool(input_data):
         ip = input_data["ip"]
         logger.info(f"🌍 [BGP LOOKUP] Querying ASN info for IP: {ip}")
 
-        # ✅ API Request
-        url = f"https://api.bgpview.io/ip/{ip}"
-        response = requests.get(url, timeout=5)
-        response.raise_for_status()
-        data = response.json()
-
-        # ✅ Extract ASN and Prefix from prefixes list
-        prefixes = data.get("data", {}).get("prefixes", [])
-        
-        if prefixes:
-            asn_data = prefixes[0].get("asn", {})
-            asn = asn_data.get("asn", "Unknown")
-            prefix = prefixes[0].get("prefix", "Unknown")
-            name = asn_data.get("name", "Unknown")
-            country = asn_data.get("country_code", "Unknown")
+        # ✅ Longest-prefix match in the local routing table; BGPView only answers its misses
+        record = prefix_index.lookup(ip)
+
+        # ✅ Cached per IP; a /24 (or /48) answer is reused for every IP inside it
+        if record is None:
+            record = await lookup_cache.lookup_prefix(
+                "bgp", ip, lambda: fetch_bgp_record(ip), prefixes_of=leaf_prefixes
+            )
+
+        if record:
+            asn, prefix, name, country = record["asn"], record["prefix"], record["name"], record["country"]
         else:
             asn, prefix, name, country = "Unknown", "Unknown", "Unknown", "Unknown"
 
@@ -54,17 +92,22 @@ def bgp_lookup_tool(input_data):
 
         return {"agent_response": response_text}
 
-    except requests.exceptions.Timeout:
+    except httpx.TimeoutException:
         logger.error(f"⏳ [BGP LOOKUP] Request timed out for IP: {ip}")
         return {"agent_response": f"⚠️ BGP lookup request timed out for {ip}."}
 
-    except requests.exceptions.RequestException as e:
+    except httpx.HTTPError as e:
         logger.error(f"❌ [BGP LOOKUP] API request failed: {e}")
         return {"agent_response": f"⚠️ Error retrieving BGP data for {ip}."}
 
+def bgp_lookup_tool(input_data):
+    """Synchronous entry point for `bgp_lookup_tool_async`."""
+    return run_sync(bgp_lookup_tool_async(input_data))
+
 # ✅ Register as a LangChain Tool
 bgp_lookup_tool_obj = Tool(
     name="bgp_lookup_tool",
-    description="Queries BGPView API for ASN and routing information of an IP address.",
-    func=bgp_lookup_tool
+    description="Looks up ASN, prefix and org routing information of an IP address (local BGP table, BGPView API fallback).",
+    func=bgp_lookup_tool,
+    coroutine=bgp_lookup_tool_async
 )
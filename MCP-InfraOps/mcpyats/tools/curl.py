@@ -1,14 +1,15 @@
-import subprocess
 import logging
+import httpx
 from langsmith import traceable
 from langchain.tools import Tool
+from tools.http_client import http_client, run_sync
 
 # ✅ Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 @traceable
-def curl_tool(input_data):
+async def curl_tool_async(input_data):
     """
     Performs an HTTP request to check if an IP is serving a website.
 
@@ -30,31 +31,17 @@ def curl_tool(input_data):
         url = f"http://{ip}"  # Default to HTTP
         logger.info(f"🌍 [cURL] Checking web response for IP: {ip}")
 
-        # ✅ Run cURL Command
-        cmd = f"curl -s -I -L --max-time 5 {url}"
-        result = subprocess.run(cmd, shell=True, capture_output=True, text=True, timeout=5)
-
-        # ✅ Log cURL output for debugging
-        curl_output = result.stdout.strip()
-        logger.info(f"📜 [cURL OUTPUT]\n{curl_output}")
-
-        # ✅ Check for errors
-        if result.returncode != 0 or "could not resolve" in curl_output.lower():
-            logger.warning(f"⚠️ [cURL] No web response from IP: {ip}")
-            return {"agent_response": f"⚠️ No web response from IP: {ip}."}
+        # ✅ HEAD request through the pooled client, following redirects like `curl -I -L`
+        response = await http_client.request("HEAD", url, retries=0, follow_redirects=True, timeout=5)
 
-        # ✅ Parse Headers
-        headers = {}
-        for line in curl_output.split("\n"):
-            parts = line.split(": ", 1)
-            if len(parts) == 2:
-                headers[parts[0].strip().lower()] = parts[1].strip()
+        # ✅ Log response headers for debugging
+        logger.info(f"📜 [cURL OUTPUT] HTTP {response.status_code} {dict(response.headers)}")
 
         # ✅ Extract Relevant Information
-        status_code = headers.get("http", "Unknown").split(" ")[1] if "http" in headers else "Unknown"
-        server = headers.get("server", "Unknown")
-        content_length = headers.get("content-length", "Unknown")
-        redirected_url = headers.get("location", "None")
+        status_code = response.status_code
+        server = response.headers.get("server", "Unknown")
+        content_length = response.headers.get("content-length", "Unknown")
+        redirected_url = str(response.url) if response.history else "None"
 
         # ✅ Construct formatted response
         response_text = (
@@ -67,19 +54,28 @@ def curl_tool(input_data):
 
         return {"agent_response": response_text}
 
-    except subprocess.TimeoutExpired:
+    except httpx.TimeoutException:
         logger.error(f"⏳ [cURL] Request timed out for IP: {ip}")
         return {"agent_response": f"⚠️ cURL request timed out for {ip}."}
 
+    except httpx.HTTPError as e:
+        logger.warning(f"⚠️ [cURL] No web response from IP: {ip} ({e!r})")
+        return {"agent_response": f"⚠️ No web response from IP: {ip}."}
+
     except Exception as e:
         logger.error(f"❌ [cURL] Unexpected error: {e}")
         return {"agent_response": f"⚠️ Unexpected error while performing cURL request for {ip}."}
 
+def curl_tool(input_data):
+    """Synchronous entry point for `curl_tool_async`."""
+    return run_sync(curl_tool_async(input_data))
+
 # ✅ Register LangChain Tool
 curl_lookup_tool_obj = Tool(
     name="curl_lookup_tool",
     description="Performs a cURL request to check if an IP is serving a website and returns a human-readable HTTP response.",
-    func=curl_tool
+    func=curl_tool,
+    coroutine=curl_tool_async
 )
 
 # ✅ Test the tool
@@ -1,14 +1,16 @@
-import subprocess
+import asyncio
 import logging
 from langsmith import traceable
 from langchain.tools import Tool
+from tools.http_client import run_sync
+from tools.process import run_command
 
 # ✅ Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 @traceable
-def dig_tool(input_data):
+async def dig_tool_async(input_data):
     """
     Performs a DNS lookup using 'dig' to fetch DNS records for an IP.
 
@@ -30,15 +32,14 @@ def dig_tool(input_data):
         logger.info(f"🌍 [DIG] Performing DNS lookup for IP: {ip}")
 
         # ✅ Run Dig Command
-        cmd = f"dig +short -x {ip}"
-        result = subprocess.run(cmd, shell=True, capture_output=True, text=True, timeout=5)
+        returncode, output = await run_command(["dig", "+short", "-x", ip], timeout=5)
 
         # ✅ Log full output for debugging
-        dig_output = result.stdout.strip()
+        dig_output = output.strip()
         logger.info(f"📜 [DIG OUTPUT]\n{dig_output}")
 
         # ✅ Check if DIG failed
-        if result.returncode != 0 or not dig_output:
+        if returncode != 0 or not dig_output:
             logger.warning(f"⚠️ [DIG] No DNS records found for {ip}")
             return {"agent_response": f"⚠️ No DNS records found for {ip}."}
 
@@ -56,7 +57,7 @@ def dig_tool(input_data):
 
         return {"agent_response": response_text}
 
-    except subprocess.TimeoutExpired:
+    except asyncio.TimeoutError:
         logger.error(f"⏳ [DIG] Request timed out for IP: {ip}")
         return {"agent_response": f"⚠️ DIG request timed out for {ip}."}
 
@@ -64,11 +65,16 @@ def dig_tool(input_data):
         logger.error(f"❌ [DIG] Unexpected error: {e}")
         return {"agent_response": f"⚠️ Unexpected error while performing DIG request for {ip}."}
 
+def dig_tool(input_data):
+    """Synchronous entry point for `dig_tool_async`."""
+    return run_sync(dig_tool_async(input_data))
+
 # ✅ Register LangChain Tool
 dig_tool_obj = Tool(
     name="dig_tool",
     description="Performs a DNS reverse lookup (PTR record) for a given IP address.",
-    func=dig_tool
+    func=dig_tool,
+    coroutine=dig_tool_async
 )
 
 # ✅ Test the tool
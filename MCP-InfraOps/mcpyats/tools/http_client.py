@@ -0,0 +1,148 @@
+import os
+import random
+import asyncio
+import logging
+import threading
+import weakref
+from typing import Any, Dict, Optional
+from urllib.parse import urlsplit
+
+import httpx
+
+logger = logging.getLogger(__name__)
+
+HTTP_TIMEOUT = float(os.getenv("TOOLS_HTTP_TIMEOUT", "5"))
+HTTP_MAX_CONNECTIONS = int(os.getenv("TOOLS_HTTP_MAX_CONNECTIONS", "64"))
+HTTP_MAX_PER_HOST = int(os.getenv("TOOLS_HTTP_MAX_PER_HOST", "8"))
+HTTP_RETRIES = int(os.getenv("TOOLS_HTTP_RETRIES", "2"))
+HTTP_KEEPALIVE_SECONDS = float(os.getenv("TOOLS_HTTP_KEEPALIVE_SECONDS", "60"))
+
+RETRY_STATUS_CODES = frozenset({429, 500, 502, 503, 504})
+MAX_RETRY_AFTER = 5.0
+
+
+class _LoopClient:
+    """The httpx client and per-host semaphores of one event loop."""
+
+    def __init__(self, client: httpx.AsyncClient):
+        self.client = client
+        self.host_limits: Dict[str, asyncio.Semaphore] = {}
+
+
+class PooledHTTPClient:
+    """
+    Keep-alive HTTP client shared by the local tools.
+
+    * One `httpx.AsyncClient` per event loop, so repeated lookups to the same
+      API reuse pooled TCP/TLS connections instead of handshaking every call.
+    * At most `max_per_host` requests in flight per host; further requests wait.
+    * Transport errors, timeouts and 429/5xx responses are retried up to
+      `retries` times with jittered exponential backoff (honouring
+      `Retry-After`); the last response or error is returned to the caller.
+    """
+
+    def __init__(self, timeout: float = HTTP_TIMEOUT, max_connections: int = HTTP_MAX_CONNECTIONS,
+                 max_per_host: int = HTTP_MAX_PER_HOST, retries: int = HTTP_RETRIES,
+                 keepalive_seconds: float = HTTP_KEEPALIVE_SECONDS):
+        self.timeout = timeout
+        self.max_connections = max_connections
+        self.max_per_host = max_per_host
+        self.retries = retries
+        self.keepalive_seconds = keepalive_seconds
+        # Clients and their transports belong to the loop that created them.
+        self._clients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, _LoopClient]" = weakref.WeakKeyDictionary()
+
+    def _for_loop(self) -> _LoopClient:
+        loop = asyncio.get_running_loop()
+        state = self._clients.get(loop)
+        if state is None:
+            client = httpx.AsyncClient(
+                timeout=self.timeout,
+                limits=httpx.Limits(
+                    max_connections=self.max_connections,
+                    max_keepalive_connections=self.max_connections,
+                    keepalive_expiry=self.keepalive_seconds,
+                ),
+            )
+            state = self._clients[loop] = _LoopClient(client)
+        return state
+
+    def _host_limit(self, state: _LoopClient, url: str) -> asyncio.Semaphore:
+        host = urlsplit(url).netloc
+        if host not in state.host_limits:
+            state.host_limits[host] = asyncio.Semaphore(self.max_per_host)
+        return state.host_limits[host]
+
+    def _backoff(self, attempt: int, response: Optional[httpx.Response] = None) -> float:
+        retry_after = response.headers.get("Retry-After") if response is not None else None
+        if retry_after:
+            try:
+                return min(float(retry_after), MAX_RETRY_AFTER)
+            except ValueError:
+                pass
+        return 0.25 * (2 ** attempt) * (0.5 + random.random())
+
+    async def request(self, method: str, url: str, retries: Optional[int] = None, **kwargs: Any) -> httpx.Response:
+        """
+        Sends a request through the pooled client.
+
+        Args:
+            method: HTTP method.
+            url: Absolute URL.
+            retries: Overrides the client's retry count (0 disables retries).
+            **kwargs: Passed to `httpx.AsyncClient.request` (params, headers, timeout, ...).
+
+        Raises:
+            httpx.HTTPError: If the last attempt failed at the transport level.
+        """
+        state = self._for_loop()
+        retries = self.retries if retries is None else retries
+        for attempt in range(retries + 1):
+            try:
+                async with self._host_limit(state, url):
+                    response = await state.client.request(method, url, **kwargs)
+            except httpx.TransportError as e:
+                if attempt == retries:
+                    raise
+                delay = self._backoff(attempt)
+                logger.warning(f"🔁 [HTTP] {method} {url} failed ({e!r}); retrying in {delay:.2f}s")
+            else:
+                if response.status_code not in RETRY_STATUS_CODES or attempt == retries:
+                    return response
+                delay = self._backoff(attempt, response)
+                logger.warning(f"🔁 [HTTP] {method} {url} returned {response.status_code}; retrying in {delay:.2f}s")
+            await asyncio.sleep(delay)
+
+    async def get(self, url: str, **kwargs: Any) -> httpx.Response:
+        return await self.request("GET", url, **kwargs)
+
+    async def aclose(self):
+        """Closes the current loop's client and its pooled connections."""
+        state = self._clients.pop(asyncio.get_running_loop(), None)
+        if state is not None:
+            await state.client.aclose()
+
+
+http_client = PooledHTTPClient()
+
+_background_loop: Optional[asyncio.AbstractEventLoop] = None
+_background_lock = threading.Lock()
+
+
+def _get_background_loop() -> asyncio.AbstractEventLoop:
+    global _background_loop
+    with _background_lock:
+        if _background_loop is None:
+            _background_loop = asyncio.new_event_loop()
+            threading.Thread(target=_background_loop.run_forever, name="tools-http", daemon=True).start()
+    return _background_loop
+
+
+def run_sync(coro):
+    """
+    Runs a tool coroutine from synchronous code.
+
+    Sync callers share one background loop, so they reuse its pooled
+    connections instead of opening a fresh client per call.
+    """
+    return asyncio.run_coroutine_threadsafe(coro, _get_background_loop()).result()
@@ -0,0 +1,462 @@
+import os
+import math
+import time
+import errno
+import socket
+import struct
+import asyncio
+import logging
+import itertools
+import weakref
+from collections import Counter
+from typing import Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+PROBE_METHOD = os.getenv("PROBE_METHOD", "auto")  # auto | icmp | tcp | udp
+PROBE_FALLBACK = os.getenv("PROBE_FALLBACK", "tcp")  # used by "auto" when no ICMP socket can be opened
+PROBE_COUNT = int(os.getenv("PROBE_COUNT", "3"))
+PROBE_INTERVAL = float(os.getenv("PROBE_INTERVAL", "0.2"))
+PROBE_TIMEOUT = float(os.getenv("PROBE_TIMEOUT", "2"))
+PROBE_MAX_TARGETS = int(os.getenv("PROBE_MAX_TARGETS", "256"))
+PROBE_TCP_PORT = int(os.getenv("PROBE_TCP_PORT", "80"))
+PROBE_UDP_BASE_PORT = 33434
+
+ICMP_ECHO_REPLY = 0
+ICMP_DEST_UNREACH = 3
+ICMP_ECHO_REQUEST = 8
+ICMP_TIME_EXCEEDED = 11
+
+IP_RECVERR = getattr(socket, "IP_RECVERR", 11)
+MSG_ERRQUEUE = getattr(socket, "MSG_ERRQUEUE", 0x2000)
+SO_EE_ORIGIN_ICMP = 2
+
+# Same size as iputils ping: 8-byte send timestamp + 48 bytes of padding.
+_PAYLOAD_PAD = bytes(range(48))
+
+REACHED = ("reply", "refused")
+
+
+def icmp_checksum(data: bytes) -> int:
+    if len(data) % 2:
+        data += b"\x00"
+    total = sum(struct.unpack(f"!{len(data) // 2}H", data))
+    total = (total >> 16) + (total & 0xFFFF)
+    total += total >> 16
+    return ~total & 0xFFFF
+
+
+def build_echo_request(identifier: int, sequence: int, checksum: Optional[int] = None) -> bytes:
+    """
+    An echo request. With `checksum`, the last two payload bytes are chosen so
+    the ICMP checksum has that value whatever the sequence and timestamp, which
+    keeps the probes of a Paris-style traceroute on one ECMP path.
+    """
+    payload = struct.pack("!d", time.time()) + _PAYLOAD_PAD
+    header = struct.pack("!BBHHH", ICMP_ECHO_REQUEST, 0, 0, identifier, sequence)
+    if checksum is not None:
+        # One's-complement sum of the rest plus the filler must equal ~checksum.
+        filler = (~checksum & 0xFFFF) + icmp_checksum(header + payload[:-2])
+        filler = (filler & 0xFFFF) + (filler >> 16)
+        payload = payload[:-2] + struct.pack("!H", filler)
+    checksum = icmp_checksum(header + payload)
+    return struct.pack("!BBHHH", ICMP_ECHO_REQUEST, 0, checksum, identifier, sequence) + payload
+
+
+def rtt_stats_ms(rtts: List[float]) -> Optional[Tuple[float, float, float, float]]:
+    """(min, avg, max, mdev) in milliseconds of round-trip times in seconds, with mdev computed like iputils ping."""
+    if not rtts:
+        return None
+    values = [rtt * 1000 for rtt in rtts]
+    avg = sum(values) / len(values)
+    mdev = math.sqrt(max(sum(v * v for v in values) / len(values) - avg * avg, 0.0))
+    return min(values), avg, max(values), mdev
+
+
+def parse_extended_error(ancdata) -> Optional[Tuple[int, int, str]]:
+    """(ICMP type, code, offender address) from IP_RECVERR ancillary data, if it carries an ICMP error."""
+    for level, cmsg_type, cdata in ancdata:
+        if level != socket.IPPROTO_IP or cmsg_type != IP_RECVERR or len(cdata) < 24:
+            continue
+        # struct sock_extended_err, followed by the offender's sockaddr_in.
+        _, origin, icmp_type, code, _, _, _ = struct.unpack("=IBBBBII", cdata[:16])
+        if origin == SO_EE_ORIGIN_ICMP:
+            return icmp_type, code, socket.inet_ntoa(cdata[20:24])
+    return None
+
+
+class ProbeReply:
+    """
+    Outcome of one probe.
+
+    `kind` is "reply" (echo reply, TCP accept or UDP answer), "refused" (TCP
+    RST / UDP port unreachable: the host answered), "unreachable",
+    "time-exceeded", "timeout" or "error". `source` is the address that
+    answered, which differs from the target for ICMP errors from routers.
+    """
+
+    __slots__ = ("kind", "source", "rtt", "code")
+
+    def __init__(self, kind: str, source: Optional[str] = None, rtt: Optional[float] = None, code: int = 0):
+        self.kind = kind
+        self.source = source
+        self.rtt = rtt
+        self.code = code
+
+    @property
+    def reached(self) -> bool:
+        return self.kind in REACHED
+
+    def __repr__(self):
+        rtt = f"{self.rtt * 1000:.3f}ms" if self.rtt is not None else "-"
+        return f"ProbeReply({self.kind}, {self.source}, {rtt})"
+
+
+class ProbeStats:
+    """Per-target counters and round-trip statistics, in the shape `ping` reports them."""
+
+    def __init__(self, target: str, address: Optional[str] = None, method: Optional[str] = None):
+        self.target = target
+        self.address = address
+        self.method = method
+        self.sent = 0
+        self.received = 0
+        self.rtts: List[float] = []
+        self.failures: Counter = Counter()
+        self.last_failure: Optional[ProbeReply] = None
+        self.error: Optional[str] = None
+
+    def record(self, reply: ProbeReply):
+        self.sent += 1
+        if reply.reached:
+            self.received += 1
+            self.rtts.append(reply.rtt)
+        else:
+            self.failures[reply.kind] += 1
+            self.last_failure = reply
+
+    @property
+    def loss_percent(self) -> float:
+        return 100.0 * (self.sent - self.received) / self.sent if self.sent else 100.0
+
+    def rtt_stats_ms(self) -> Optional[Tuple[float, float, float, float]]:
+        return rtt_stats_ms(self.rtts)
+
+    def as_dict(self) -> Dict:
+        stats = self.rtt_stats_ms()
+        return {
+            "target": self.target,
+            "address": self.address,
+            "method": self.method,
+            "sent": self.sent,
+            "received": self.received,
+            "loss_percent": round(self.loss_percent, 1),
+            "rtt_ms": dict(zip(("min", "avg", "max", "mdev"), (round(v, 3) for v in stats))) if stats else None,
+            "failures": dict(self.failures),
+            "error": self.error,
+        }
+
+
+class _ICMPEndpoint:
+    """
+    One ICMP socket shared by every echo probe on an event loop.
+
+    Replies are matched to waiting probes by (target address, sequence). Raw
+    sockets see whole IP packets, including ICMP errors quoting our requests.
+    Unprivileged datagram sockets (Linux `ping_group_range`) see bare ICMP and
+    get router errors through the IP_RECVERR error queue instead.
+    """
+
+    def __init__(self, loop: asyncio.AbstractEventLoop, sock: socket.socket, raw: bool, identifier: int):
+        self.loop = loop
+        self.sock = sock
+        self.raw = raw
+        self.identifier = identifier
+        self._pending: Dict[Tuple[str, int], Tuple[asyncio.Future, float]] = {}
+        loop.add_reader(sock.fileno(), self._on_readable)
+
+    @classmethod
+    def open(cls, loop: asyncio.AbstractEventLoop, identifier: int) -> Optional["_ICMPEndpoint"]:
+        for sock_type, raw in ((socket.SOCK_RAW, True), (socket.SOCK_DGRAM, False)):
+            try:
+                sock = socket.socket(socket.AF_INET, sock_type, socket.IPPROTO_ICMP)
+            except OSError:
+                continue
+            sock.setblocking(False)
+            try:
+                sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 1 << 20)
+                if not raw:
+                    sock.setsockopt(socket.IPPROTO_IP, IP_RECVERR, 1)
+            except OSError:
+                pass
+            logger.info(f"📡 [PROBER] Using {'raw' if raw else 'unprivileged datagram'} ICMP socket")
+            return cls(loop, sock, raw, identifier)
+        return None
+
+    @property
+    def method(self) -> str:
+        return "icmp" if self.raw else "icmp-dgram"
+
+    def send(self, address: str, sequence: int, ttl: Optional[int] = None,
+             checksum: Optional[int] = None) -> asyncio.Future:
+        future = self.loop.create_future()
+        key = (address, sequence)
+        try:
+            self.sock.setsockopt(socket.IPPROTO_IP, socket.IP_TTL, ttl or 64)
+            self._pending[key] = (future, time.perf_counter())
+            self.sock.sendto(build_echo_request(self.identifier, sequence, checksum), (address, 0))
+        except OSError as e:
+            self._pending.pop(key, None)
+            kind = "unreachable" if e.errno in (errno.ENETUNREACH, errno.EHOSTUNREACH) else "error"
+            future.set_result(ProbeReply(kind))
+        return future
+
+    def forget(self, address: str, sequence: int):
+        self._pending.pop((address, sequence), None)
+
+    def _resolve(self, key: Tuple[str, int], kind: str, source: str, code: int = 0):
+        entry = self._pending.pop(key, None)
+        if entry is None:
+            return
+        future, sent_at = entry
+        if not future.done():
+            future.set_result(ProbeReply(kind, source, time.perf_counter() - sent_at, code))
+
+    def _on_readable(self):
+        if not self.raw:
+            self._drain_error_queue()
+        while True:
+            try:
+                packet, (source, _) = self.sock.recvfrom(4096)
+            except (BlockingIOError, InterruptedError):
+                return
+            except OSError:
+                # A queued ICMP error surfaced on the normal path; read it from the error queue.
+                # The selector is level-triggered, so remaining replies are read on the next wake-up.
+                if not self.raw:
+                    self._drain_error_queue()
+                return
+            self._on_packet(packet, source)
+
+    def _on_packet(self, packet: bytes, source: str):
+        icmp = packet[(packet[0] & 0x0F) * 4:] if self.raw else packet
+        if len(icmp) < 8:
+            return
+        icmp_type, code = icmp[0], icmp[1]
+        if icmp_type == ICMP_ECHO_REPLY:
+            identifier, sequence = struct.unpack("!HH", icmp[4:8])
+            # Datagram sockets get the kernel-assigned identifier and only their own replies.
+            if not self.raw or identifier == self.identifier:
+                self._resolve((source, sequence), "reply", source)
+        elif icmp_type in (ICMP_DEST_UNREACH, ICMP_TIME_EXCEEDED) and self.raw:
+            # The error quotes our original IP header and the first 8 bytes of the echo request.
+            quoted = icmp[8:]
+            if len(quoted) < 20:
+                return
+            quoted_icmp = quoted[(quoted[0] & 0x0F) * 4:]
+            if len(quoted_icmp) < 8 or quoted_icmp[0] != ICMP_ECHO_REQUEST:
+                return
+            identifier, sequence = struct.unpack("!HH", quoted_icmp[4:8])
+            if identifier != self.identifier:
+                return
+            destination = socket.inet_ntoa(quoted[16:20])
+            kind = "time-exceeded" if icmp_type == ICMP_TIME_EXCEEDED else "unreachable"
+            self._resolve((destination, sequence), kind, source, code)
+
+    def _drain_error_queue(self):
+        while True:
+            try:
+                data, ancdata, _, (destination, _) = self.sock.recvmsg(512, 512, MSG_ERRQUEUE)
+            except (BlockingIOError, InterruptedError):
+                return
+            except OSError:
+                return
+            if len(data) < 8:
+                continue
+            error = parse_extended_error(ancdata)
+            if error is None:
+                continue
+            icmp_type, code, offender = error
+            kind = "time-exceeded" if icmp_type == ICMP_TIME_EXCEEDED else "unreachable"
+            self._resolve((destination, struct.unpack("!H", data[6:8])[0]), kind, offender, code)
+
+    def close(self):
+        try:
+            self.loop.remove_reader(self.sock.fileno())
+        except (ValueError, RuntimeError):
+            pass
+        self.sock.close()
+        for future, _ in self._pending.values():
+            if not future.done():
+                future.cancel()
+        self._pending.clear()
+
+
+class ICMPProber:
+    """
+    Asyncio reachability prober for many targets at once.
+
+    * ICMP echo over one shared socket per event loop: raw when the process
+      has CAP_NET_RAW, else an unprivileged ICMP datagram socket.
+    * When neither can be opened (or for IPv6 targets), `auto` falls back to
+      `PROBE_FALLBACK`: TCP connect to `tcp_port` (an accept or a RST both
+      prove the host is up), or UDP to a high port (port unreachable does).
+    * `probe_many` runs up to `max_targets` targets concurrently; each
+      target's probes are sent every `interval` seconds without waiting for
+      earlier replies, like `ping -i`.
+    """
+
+    def __init__(self, method: str = PROBE_METHOD, fallback: str = PROBE_FALLBACK, count: int = PROBE_COUNT,
+                 interval: float = PROBE_INTERVAL, timeout: float = PROBE_TIMEOUT,
+                 max_targets: int = PROBE_MAX_TARGETS, tcp_port: int = PROBE_TCP_PORT):
+        self.method = method
+        self.fallback = fallback
+        self.count = count
+        self.interval = interval
+        self.timeout = timeout
+        self.max_targets = max_targets
+        self.tcp_port = tcp_port
+        self.identifier = os.getpid() & 0xFFFF
+        self._sequence = itertools.count(1)
+        # Sockets registered with a loop's selector belong to that loop; None means ICMP is unavailable there.
+        self._endpoints: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, Optional[_ICMPEndpoint]]" = \
+            weakref.WeakKeyDictionary()
+
+    def next_sequence(self) -> int:
+        return next(self._sequence) & 0xFFFF
+
+    def icmp_endpoint(self) -> Optional[_ICMPEndpoint]:
+        loop = asyncio.get_running_loop()
+        if loop not in self._endpoints:
+            endpoint = _ICMPEndpoint.open(loop, self.identifier)
+            if endpoint is None:
+                logger.warning(f"⚠️ [PROBER] No ICMP socket available; falling back to {self.fallback} probes")
+            self._endpoints[loop] = endpoint
+        return self._endpoints[loop]
+
+    def method_for(self, address: str, method: Optional[str] = None) -> str:
+        method = method or self.method
+        if method in ("tcp", "udp"):
+            return method
+        if ":" not in address:
+            endpoint = self.icmp_endpoint()
+            if endpoint is not None:
+                return endpoint.method
+        if method == "icmp":
+            raise RuntimeError(f"ICMP probing is not available for {address}")
+        return self.fallback
+
+    async def resolve(self, target: str) -> str:
+        infos = await asyncio.get_running_loop().getaddrinfo(target, None, type=socket.SOCK_STREAM)
+        infos.sort(key=lambda info: info[0] != socket.AF_INET)
+        return infos[0][4][0]
+
+    async def echo(self, address: str, ttl: Optional[int] = None, timeout: Optional[float] = None,
+                   checksum: Optional[int] = None) -> ProbeReply:
+        """
+        Sends one ICMP echo request and waits for whatever answers it.
+
+        `ttl` limits its hops; `checksum` pins its ICMP checksum (see `build_echo_request`).
+        """
+        endpoint = self.icmp_endpoint()
+        if endpoint is None:
+            return ProbeReply("error")
+        sequence = self.next_sequence()
+        try:
+            return await asyncio.wait_for(endpoint.send(address, sequence, ttl, checksum), timeout or self.timeout)
+        except asyncio.TimeoutError:
+            endpoint.forget(address, sequence)
+            return ProbeReply("timeout")
+
+    async def tcp_connect(self, address: str, port: Optional[int] = None, timeout: Optional[float] = None) -> ProbeReply:
+        family = socket.AF_INET6 if ":" in address else socket.AF_INET
+        sock = socket.socket(family, socket.SOCK_STREAM)
+        sock.setblocking(False)
+        started = time.perf_counter()
+        try:
+            await asyncio.wait_for(asyncio.get_running_loop().sock_connect(sock, (address, port or self.tcp_port)),
+                                   timeout or self.timeout)
+            return ProbeReply("reply", address, time.perf_counter() - started)
+        except ConnectionRefusedError:
+            return ProbeReply("refused", address, time.perf_counter() - started)
+        except asyncio.TimeoutError:
+            return ProbeReply("timeout")
+        except OSError as e:
+            kind = "unreachable" if e.errno in (errno.ENETUNREACH, errno.EHOSTUNREACH) else "error"
+            return ProbeReply(kind)
+        finally:
+            sock.close()
+
+    async def udp_probe(self, address: str, port: Optional[int] = None, timeout: Optional[float] = None) -> ProbeReply:
+        family = socket.AF_INET6 if ":" in address else socket.AF_INET
+        loop = asyncio.get_running_loop()
+        sock = socket.socket(family, socket.SOCK_DGRAM)
+        sock.setblocking(False)
+        started = time.perf_counter()
+        try:
+            # Connected UDP sockets report ICMP port unreachable as ECONNREFUSED.
+            sock.connect((address, port or PROBE_UDP_BASE_PORT + self.next_sequence() % 64))
+            sock.send(b"")
+            await asyncio.wait_for(loop.sock_recv(sock, 512), timeout or self.timeout)
+            return ProbeReply("reply", address, time.perf_counter() - started)
+        except ConnectionRefusedError:
+            return ProbeReply("refused", address, time.perf_counter() - started)
+        except asyncio.TimeoutError:
+            return ProbeReply("timeout")
+        except OSError as e:
+            kind = "unreachable" if e.errno in (errno.ENETUNREACH, errno.EHOSTUNREACH) else "error"
+            return ProbeReply(kind)
+        finally:
+            sock.close()
+
+    async def probe_once(self, address: str, method: str, timeout: Optional[float] = None) -> ProbeReply:
+        if method == "tcp":
+            return await self.tcp_connect(address, timeout=timeout)
+        if method == "udp":
+            return await self.udp_probe(address, timeout=timeout)
+        return await self.echo(address, timeout=timeout)
+
+    async def probe(self, target: str, count: Optional[int] = None, interval: Optional[float] = None,
+                    timeout: Optional[float] = None, method: Optional[str] = None) -> ProbeStats:
+        """
+        Probes one target `count` times.
+
+        Returns:
+            ProbeStats for the target; resolution and socket errors are recorded
+            on `error` rather than raised.
+        """
+        count = count or self.count
+        interval = self.interval if interval is None else interval
+        stats = ProbeStats(target)
+        try:
+            stats.address = await self.resolve(target)
+            stats.method = self.method_for(stats.address, method)
+        except (OSError, RuntimeError) as e:
+            stats.error = str(e)
+            return stats
+
+        async def send(index: int):
+            await asyncio.sleep(index * interval)
+            stats.record(await self.probe_once(stats.address, stats.method, timeout))
+
+        await asyncio.gather(*(send(i) for i in range(count)))
+        return stats
+
+    async def probe_many(self, targets: List[str], **kwargs) -> List[ProbeStats]:
+        """Probes every target, at most `max_targets` at a time; results follow the input order."""
+        limit = asyncio.Semaphore(self.max_targets)
+
+        async def bounded(target: str) -> ProbeStats:
+            async with limit:
+                return await self.probe(target, **kwargs)
+
+        return await asyncio.gather(*(bounded(target) for target in targets))
+
+    def close(self):
+        """Closes the current loop's ICMP socket."""
+        endpoint = self._endpoints.pop(asyncio.get_running_loop(), None)
+        if endpoint is not None:
+            endpoint.close()
+
+
+prober = ICMPProber()
@@ -0,0 +1,259 @@
+import os
+import json
+import time
+import sqlite3
+import asyncio
+import logging
+import ipaddress
+import threading
+from collections import Counter, OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Iterable, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Seconds a positive answer stays fresh, per lookup source.
+SOURCE_TTLS = {
+    "bgp": float(os.getenv("LOOKUP_TTL_BGP", str(6 * 3600))),
+    "abuseipdb": float(os.getenv("LOOKUP_TTL_ABUSEIPDB", "3600")),
+    "geo": float(os.getenv("LOOKUP_TTL_GEO", str(24 * 3600))),
+    "whois": float(os.getenv("LOOKUP_TTL_WHOIS", str(24 * 3600))),
+}
+DEFAULT_TTL = float(os.getenv("LOOKUP_TTL_DEFAULT", "3600"))
+# "No data for this IP" answers are remembered for less time than real ones.
+NEGATIVE_TTL = float(os.getenv("LOOKUP_NEGATIVE_TTL", "600"))
+MAX_ENTRIES_PER_SOURCE = int(os.getenv("LOOKUP_CACHE_MAX_ENTRIES", "50000"))
+# Path of an SQLite file that keeps the cache across restarts; unset keeps it in memory only.
+CACHE_DB_PATH = os.getenv("LOOKUP_CACHE_DB")
+
+MISS = object()
+
+
+def covering_prefixes(ip: str) -> List[str]:
+    """Every prefix containing `ip`, most specific first (e.g. 8.8.8.8/32 ... 0.0.0.0/0)."""
+    address = ipaddress.ip_address(ip)
+    bits = address.max_prefixlen
+    value = int(address)
+    full = (1 << bits) - 1
+    return [f"{type(address)(value & (full ^ ((1 << (bits - length)) - 1)))}/{length}"
+            for length in range(bits, -1, -1)]
+
+
+class SQLiteLookupStore:
+    """Write-through persistent copy of the lookup cache; rows carry their own expiry time."""
+
+    def __init__(self, path: str):
+        self.path = path
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS lookups ("
+            " source TEXT NOT NULL, key TEXT NOT NULL, value TEXT, expires_at REAL NOT NULL,"
+            " PRIMARY KEY (source, key))"
+        )
+        self.purge()
+
+    def get_many(self, source: str, keys: Iterable[str]) -> Dict[str, Tuple[Any, float]]:
+        keys = list(keys)
+        placeholders = ",".join("?" * len(keys))
+        with self._lock:
+            rows = self._db.execute(
+                f"SELECT key, value, expires_at FROM lookups WHERE source = ? AND key IN ({placeholders})"
+                " AND expires_at > ?",
+                [source, *keys, time.time()],
+            ).fetchall()
+        return {key: (json.loads(value) if value is not None else None, expires_at) for key, value, expires_at in rows}
+
+    def put(self, source: str, key: str, value: Any, expires_at: float):
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO lookups (source, key, value, expires_at) VALUES (?, ?, ?, ?)",
+                (source, key, json.dumps(value) if value is not None else None, expires_at),
+            )
+
+    def purge(self):
+        with self._lock:
+            removed = self._db.execute("DELETE FROM lookups WHERE expires_at <= ?", (time.time(),)).rowcount
+        if removed:
+            logger.info(f"🧹 [LOOKUP CACHE] Purged {removed} expired rows from {self.path}")
+
+    def clear(self):
+        with self._lock:
+            self._db.execute("DELETE FROM lookups")
+
+
+class LookupCache:
+    """
+    Shared cache for external IP-intelligence lookups (BGP, AbuseIPDB, geo, whois).
+
+    * Entries expire after their source's TTL (`SOURCE_TTLS`); "no data"
+      answers are cached too, for `negative_ttl`.
+    * Prefix entries answer for every address inside the prefix. They are
+      only stored for prefixes the source cannot have more-specific entries
+      under (e.g. a /24 BGP route); any other answer is cached per IP, since
+      a more specific prefix that is not cached yet could own the next IP.
+    * Concurrent lookups of the same key share one fetch.
+    * With `db_path`, entries are also written to SQLite and read back on a
+      memory miss, so the cache survives restarts.
+
+    Fetch errors are not cached; they propagate to the caller.
+    """
+
+    def __init__(self, ttls: Optional[Dict[str, float]] = None, negative_ttl: float = NEGATIVE_TTL,
+                 max_entries: int = MAX_ENTRIES_PER_SOURCE, db_path: Optional[str] = CACHE_DB_PATH):
+        self.ttls = dict(SOURCE_TTLS if ttls is None else ttls)
+        self.negative_ttl = negative_ttl
+        self.max_entries = max_entries
+        self.store = SQLiteLookupStore(db_path) if db_path else None
+        self._entries: Dict[str, "OrderedDict[str, Tuple[float, Any]]"] = {}
+        self._inflight: Dict[Tuple[int, str, str], asyncio.Future] = {}
+        self._lock = threading.Lock()
+        self.stats: Counter = Counter()
+
+    def ttl_for(self, source: str, value: Any) -> float:
+        return self.negative_ttl if value is None else self.ttls.get(source, DEFAULT_TTL)
+
+    def _memory(self, source: str) -> "OrderedDict[str, Tuple[float, Any]]":
+        if source not in self._entries:
+            self._entries[source] = OrderedDict()
+        return self._entries[source]
+
+    def _remember(self, source: str, key: str, value: Any, expires_at: float):
+        entries = self._memory(source)
+        entries[key] = (expires_at, value)
+        entries.move_to_end(key)
+        while len(entries) > self.max_entries:
+            entries.popitem(last=False)
+
+    def _get_many(self, source: str, keys: List[str]) -> Tuple[Optional[str], Any]:
+        """The first of `keys` (in priority order) with a fresh entry and its value, else (None, MISS)."""
+        now = time.time()
+        with self._lock:
+            entries = self._memory(source)
+            fresh = {}
+            for key in keys:
+                item = entries.get(key)
+                if item is None:
+                    continue
+                if item[0] <= now:
+                    del entries[key]
+                else:
+                    fresh[key] = item[1]
+            if self.store is not None:
+                # Only keys ranked above the best in-memory hit can change the answer.
+                best = next((i for i, key in enumerate(keys) if key in fresh), len(keys))
+                if best:
+                    for key, (value, expires_at) in self.store.get_many(source, keys[:best]).items():
+                        self._remember(source, key, value, expires_at)
+                        fresh[key] = value
+            for key in keys:
+                if key in fresh:
+                    entries.move_to_end(key)
+                    return key, fresh[key]
+        return None, MISS
+
+    def get(self, source: str, key: str) -> Any:
+        """The cached value (None for a cached "no data"), or MISS."""
+        return self._get_many(source, [key])[1]
+
+    def put(self, source: str, key: str, value: Any, ttl: Optional[float] = None):
+        """Caches `value` (None records "no data") for `ttl` seconds, defaulting to the source's TTL."""
+        expires_at = time.time() + (ttl if ttl is not None else self.ttl_for(source, value))
+        with self._lock:
+            self._remember(source, key, value, expires_at)
+        if self.store is not None:
+            self.store.put(source, key, value, expires_at)
+
+    def get_prefix(self, source: str, ip: str) -> Any:
+        """The value of the most specific cached prefix containing `ip`, or MISS."""
+        try:
+            candidates = covering_prefixes(ip)
+        except ValueError:
+            return MISS
+        return self._get_many(source, candidates)[1]
+
+    def put_prefix(self, source: str, prefix: str, value: Any, ttl: Optional[float] = None):
+        self.put(source, str(ipaddress.ip_network(prefix, strict=False)), value, ttl)
+
+    async def lookup(self, source: str, key: str, fetch: Callable[[], Awaitable[Any]]) -> Any:
+        """
+        Returns the cached value for `key`, fetching and caching it on a miss.
+
+        `fetch` returns the value, or None when the source has no data for the
+        key; exceptions propagate and nothing is cached.
+        """
+        value = self.get(source, key)
+        if value is not MISS:
+            self.stats[f"{source}_hits" if value is not None else f"{source}_negative_hits"] += 1
+            return value
+        return await self._single_flight(source, key, fetch, lambda value: self.put(source, key, value))
+
+    async def lookup_prefix(self, source: str, ip: str, fetch: Callable[[], Awaitable[Any]],
+                            prefixes_of: Callable[[Any], Iterable[str]]) -> Any:
+        """
+        Like `lookup`, but positive answers are cached under the prefixes
+        `prefixes_of(value)` returns and reused for every IP inside them.
+
+        `prefixes_of` must only return prefixes that contain no more-specific
+        entries in the source; when it returns none, and for "no data"
+        answers, the answer is cached for the IP alone.
+        """
+        value = self.get_prefix(source, ip)
+        if value is MISS:
+            value = self.get(source, ip)
+        if value is not MISS:
+            self.stats[f"{source}_hits" if value is not None else f"{source}_negative_hits"] += 1
+            return value
+
+        def store(value):
+            prefixes = list(prefixes_of(value)) if value is not None else []
+            for prefix in prefixes:
+                try:
+                    self.put_prefix(source, prefix, value)
+                except ValueError:
+                    logger.warning(f"⚠️ [LOOKUP CACHE] Ignoring invalid {source} prefix {prefix!r}")
+            if not prefixes:
+                self.put(source, ip, value)
+
+        return await self._single_flight(source, ip, fetch, store)
+
+    async def _single_flight(self, source: str, key: str, fetch, store) -> Any:
+        # Futures belong to one event loop; sync callers run on their own loop.
+        flight = (id(asyncio.get_running_loop()), source, key)
+        pending = self._inflight.get(flight)
+        if pending is not None:
+            self.stats[f"{source}_coalesced"] += 1
+            return await asyncio.shield(pending)
+
+        self.stats[f"{source}_misses"] += 1
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[flight] = future
+        try:
+            value = await fetch()
+            store(value)
+            future.set_result(value)
+            return value
+        except BaseException as e:
+            future.set_exception(e)
+            # Waiters re-raise it; mark it retrieved so an unshared failure is not logged as unhandled.
+            future.exception()
+            raise
+        finally:
+            del self._inflight[flight]
+
+    def summary(self) -> Dict[str, Any]:
+        return {
+            "entries": {source: len(entries) for source, entries in self._entries.items()},
+            "persistent": self.store.path if self.store is not None else None,
+            **self.stats,
+        }
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+        if self.store is not None:
+            self.store.clear()
+
+
+lookup_cache = LookupCache()
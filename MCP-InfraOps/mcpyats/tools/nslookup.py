@@ -1,14 +1,16 @@
-import subprocess
+import asyncio
 import logging
 from langsmith import traceable
 from langchain.tools import Tool
+from tools.http_client import run_sync
+from tools.process import run_command
 
 # ✅ Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 @traceable
-def nslookup_tool(input_data):
+async def nslookup_tool_async(input_data):
     """
     Performs a reverse DNS lookup (nslookup) on an IP address and returns a formatted response.
 
@@ -28,14 +30,14 @@ def nslookup_tool(input_data):
         logger.info(f"🔍 [NSLOOKUP] Performing reverse DNS lookup for IP: {ip}")
 
         # ✅ Run nslookup command
-        result = subprocess.run(f"nslookup {ip}", shell=True, capture_output=True, text=True, timeout=5)
+        returncode, output = await run_command(["nslookup", ip], timeout=5)
 
         # ✅ Log full output for debugging
-        nslookup_output = result.stdout.strip()
+        nslookup_output = output.strip()
         logger.info(f"📜 [NSLOOKUP OUTPUT]\n{nslookup_output}")
 
         # ✅ Check for errors
-        if result.returncode != 0 or "NXDOMAIN" in nslookup_output or "Non-existent" in nslookup_output:
+        if returncode != 0 or "NXDOMAIN" in nslookup_output or "Non-existent" in nslookup_output:
             logger.warning(f"⚠️ [NSLOOKUP] No valid response found for IP: {ip}")
             return {"agent_response": f"⚠️ No valid reverse DNS record found for {ip}."}
 
@@ -53,7 +55,7 @@ def nslookup_tool(input_data):
 
         return {"agent_response": response_text}
 
-    except subprocess.TimeoutExpired:
+    except asyncio.TimeoutError:
         logger.error(f"⏳ [NSLOOKUP] Command timed out for IP: {ip}")
         return {"agent_response": f"⚠️ nslookup request timed out for {ip}."}
 
@@ -61,11 +63,16 @@ def nslookup_tool(input_data):
         logger.error(f"❌ [NSLOOKUP] Unexpected error: {e}")
         return {"agent_response": f"⚠️ Unexpected error while performing nslookup for {ip}."}
 
+def nslookup_tool(input_data):
+    """Synchronous entry point for `nslookup_tool_async`."""
+    return run_sync(nslookup_tool_async(input_data))
+
 # ✅ Register LangChain Tool
 nslookup_tool_obj = Tool(
     name="nslookup_tool",
     description="Performs a reverse DNS lookup on an IP and returns a human-readable response.",
-    func=nslookup_tool
+    func=nslookup_tool,
+    coroutine=nslookup_tool_async
 )
 
 # ✅ Test the tool
@@ -1,20 +1,28 @@
-import subprocess
 import logging
-import re
 from langsmith import traceable
 from langchain.tools import Tool
+from tools.batch import numeric_option
+from tools.http_client import run_sync
+from tools.icmp_prober import prober
 
 # ✅ Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Bounds on the options the model may set, so one call cannot flood probes.
+PING_MAX_COUNT = 20
+PING_MIN_INTERVAL = 0.05
+PING_MAX_INTERVAL = 5.0
+PING_MIN_TIMEOUT = 0.1
+PING_MAX_TIMEOUT = 10.0
+
 @traceable
-def ping_tool(input_data):
+async def ping_tool_async(input_data):
     """
-    Performs a ping request to check if an IP is reachable and returns a formatted response.
+    Probes an IP to check if it is reachable and returns a formatted response.
 
     Parameters:
-    - input_data (dict): Must contain {"ip": "x.x.x.x"}
+    - input_data (dict): Must contain {"ip": "x.x.x.x"}; may set "count" (≤ 20), "interval" (≥ 0.05s) and "timeout" (≤ 10s)
 
     Returns:
     - dict: {
@@ -30,57 +38,58 @@ def ping_tool(input_data):
         ip = input_data["ip"]
         logger.info(f"🔍 [PING] Checking reachability for IP: {ip}")
 
-        # ✅ Run Ping Command
-        cmd = f"ping -c 3 {ip}"
-        result = subprocess.run(cmd, shell=True, capture_output=True, text=True, timeout=5)
-
-        # ✅ Log full output for debugging
-        ping_output = result.stdout.strip()
-        logger.info(f"📜 [PING OUTPUT]\n{ping_output}")
-
-        # ✅ Check if ping was successful
-        if result.returncode != 0:
-            logger.warning(f"⚠️ [PING] IP {ip} is unreachable.")
-            return {"agent_response": f"⚠️ The IP {ip} is unreachable. Ping request failed."}
+        # ✅ Coerce and bound the optional probe settings
+        try:
+            count = numeric_option(input_data, "count", int, 1, PING_MAX_COUNT)
+            interval = numeric_option(input_data, "interval", float, PING_MIN_INTERVAL, PING_MAX_INTERVAL)
+            timeout = numeric_option(input_data, "timeout", float, PING_MIN_TIMEOUT, PING_MAX_TIMEOUT)
+        except ValueError as e:
+            logger.warning(f"⚠️ [PING] Invalid options for {ip}: {e}")
+            return {"agent_response": f"⚠️ Invalid ping options: {e}."}
 
-        # ✅ Extract Statistics
-        packets_sent, packets_received, packet_loss = "Unknown", "Unknown", "Unknown"
-        rtt_min, rtt_avg, rtt_max, rtt_mdev = "Unknown", "Unknown", "Unknown", "Unknown"
+        # ✅ Probe in-process (ICMP echo, or TCP/UDP when ICMP sockets are unavailable)
+        stats = await prober.probe(ip, count=count, interval=interval, timeout=timeout)
+        logger.info(f"📜 [PING OUTPUT] {stats.as_dict()}")
 
-        # ✅ Extract packet loss stats
-        match = re.search(r"(\d+) packets transmitted, (\d+) received, (\d+)% packet loss", ping_output)
-        if match:
-            packets_sent, packets_received, packet_loss = match.groups()
-            packet_loss = f"{packet_loss}%"
+        if stats.error:
+            logger.warning(f"⚠️ [PING] Could not probe {ip}: {stats.error}")
+            return {"agent_response": f"⚠️ Could not ping {ip}: {stats.error}."}
 
-        # ✅ Extract RTT (Round Trip Time) stats
-        match = re.search(r"rtt min/avg/max/mdev = ([\d.]+)/([\d.]+)/([\d.]+)/([\d.]+) ms", ping_output)
-        if match:
-            rtt_min, rtt_avg, rtt_max, rtt_mdev = match.groups()
+        # ✅ Check if ping was successful
+        if not stats.received:
+            reason = ""
+            if stats.last_failure and stats.last_failure.source:
+                reason = f" ({stats.last_failure.kind} from {stats.last_failure.source})"
+            logger.warning(f"⚠️ [PING] IP {ip} is unreachable{reason}.")
+            return {"agent_response": f"⚠️ The IP {ip} is unreachable. Ping request failed{reason}."}
 
         # ✅ Construct formatted response
+        rtt_min, rtt_avg, rtt_max, rtt_mdev = stats.rtt_stats_ms()
         response_text = (
-            f"📡 The IP **{ip}** responded with an average latency of **{rtt_avg} ms**.\n"
-            f"All **{packets_sent} packets** were sent, and **{packets_received}** were received, with a packet loss of **{packet_loss}**."
+            f"📡 The IP **{ip}** responded with an average latency of **{rtt_avg:.1f} ms** "
+            f"(min {rtt_min:.1f} / max {rtt_max:.1f} / mdev {rtt_mdev:.1f} ms, {stats.method} probes).\n"
+            f"All **{stats.sent} packets** were sent, and **{stats.received}** were received, "
+            f"with a packet loss of **{stats.loss_percent:.0f}%**."
         )
 
         logger.info(f"✅ [PING] Response: {response_text}")
 
         return {"agent_response": response_text}
 
-    except subprocess.TimeoutExpired:
-        logger.error(f"⏳ [PING] Request timed out for IP: {ip}")
-        return {"agent_response": f"⚠️ Ping request timed out for {ip}."}
-
     except Exception as e:
         logger.error(f"❌ [PING] Unexpected error: {e}")
         return {"agent_response": f"⚠️ Unexpected error while performing ping request for {ip}."}
 
+def ping_tool(input_data):
+    """Synchronous entry point for `ping_tool_async`."""
+    return run_sync(ping_tool_async(input_data))
+
 # ✅ Register LangChain Tool
 ping_tool_obj = Tool(
     name="public_IP_ping_tool",
     description="Performs a ping request to check if a public IP is reachable from the host machine and measures latency.",
-    func=ping_tool
+    func=ping_tool,
+    coroutine=ping_tool_async
 )
 
 # ✅ Test the tool
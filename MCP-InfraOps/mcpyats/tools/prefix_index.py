@@ -0,0 +1,457 @@
+import os
+import re
+import bz2
+import gzip
+import time
+import struct
+import logging
+import ipaddress
+import threading
+from collections import Counter
+from typing import Any, BinaryIO, Dict, Iterable, Iterator, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Routing table to answer BGP lookups from: an MRT TABLE_DUMP_V2 RIB dump
+# (e.g. RouteViews / RIPE RIS bview) or a text prefix2as file, optionally
+# gzip/bzip2 compressed. Unset disables the local index.
+PREFIX_TABLE_PATH = os.getenv("BGP_PREFIX_TABLE")
+# Optional "ASN NAME, CC" file (e.g. RIPE asn.txt) for org names and countries.
+AS_NAMES_PATH = os.getenv("BGP_AS_NAMES")
+# How often lookups check whether the files changed on disk.
+REFRESH_CHECK_SECONDS = float(os.getenv("BGP_PREFIX_TABLE_REFRESH_SECONDS", "60"))
+
+MRT_TABLE_DUMP_V2 = 13
+MRT_TYPES = (11, 12, 13, 16, 17, 32, 33, 48, 49)
+# TABLE_DUMP_V2 subtypes: (address family bits, entries carry an ADD-PATH id)
+RIB_SUBTYPES = {2: (32, False), 4: (128, False), 8: (32, True), 10: (128, True)}
+ATTR_AS_PATH = 2
+AS_SET, AS_SEQUENCE = 1, 2
+
+_AS_NAME_LINE = re.compile(r"^(?:AS|as)?(\d+)\s+(.*?)(?:,\s*([A-Z]{2}))?\s*$")
+
+
+class _Node:
+    __slots__ = ("key", "length", "value", "zero", "one")
+
+    def __init__(self, key: int, length: int, value: Any = None):
+        self.key = key
+        self.length = length
+        self.value = value
+        self.zero: Optional["_Node"] = None
+        self.one: Optional["_Node"] = None
+
+
+class PrefixTrie:
+    """
+    Path-compressed binary (Patricia) trie over one address family.
+
+    Keys are integer network addresses; internal nodes exist only where two
+    prefixes diverge, so lookups take at most one step per stored prefix
+    length instead of one per bit.
+    """
+
+    def __init__(self, bits: int):
+        self.bits = bits
+        self.root = _Node(0, 0)
+        self.size = 0
+
+    def _bit(self, key: int, index: int) -> int:
+        return (key >> (self.bits - 1 - index)) & 1
+
+    def _common_length(self, a: int, b: int) -> int:
+        return self.bits - (a ^ b).bit_length()
+
+    def insert(self, key: int, length: int, value: Any):
+        """Stores `value` for key/length, replacing any value already stored there."""
+        key &= ~((1 << (self.bits - length)) - 1)
+        node = self.root
+        while True:
+            if node.length == length:
+                if node.value is None:
+                    self.size += 1
+                node.value = value
+                return
+            bit = self._bit(key, node.length)
+            child = node.one if bit else node.zero
+            if child is None:
+                new = _Node(key, length, value)
+                self.size += 1
+            else:
+                common = min(self._common_length(key, child.key), length, child.length)
+                if common == child.length:
+                    node = child
+                    continue
+                if common == length:
+                    new = _Node(key, length, value)
+                    self.size += 1
+                else:
+                    mask = ~((1 << (self.bits - common)) - 1)
+                    new = _Node(key & mask, common)
+                    leaf = _Node(key, length, value)
+                    self.size += 1
+                    if self._bit(key, common):
+                        new.one = leaf
+                    else:
+                        new.zero = leaf
+                if self._bit(child.key, new.length):
+                    new.one = child
+                else:
+                    new.zero = child
+            if bit:
+                node.one = new
+            else:
+                node.zero = new
+            return
+
+    def remove(self, key: int, length: int) -> bool:
+        """Drops the value stored for exactly key/length; returns whether there was one."""
+        key &= ~((1 << (self.bits - length)) - 1)
+        node = self.root
+        while node is not None and node.length < length:
+            node = node.one if self._bit(key, node.length) else node.zero
+        if node is None or node.length != length or node.key != key or node.value is None:
+            return False
+        node.value = None
+        self.size -= 1
+        return True
+
+    def longest_match(self, address: int) -> Optional[Tuple[int, int, Any]]:
+        """(key, length, value) of the most specific prefix containing `address`, or None."""
+        best = None
+        node = self.root
+        bits = self.bits
+        while node is not None:
+            shift = bits - node.length
+            if (address >> shift) != (node.key >> shift):
+                break
+            if node.value is not None:
+                best = node
+            if node.length == bits:
+                break
+            node = node.one if (address >> (shift - 1)) & 1 else node.zero
+        return (best.key, best.length, best.value) if best is not None else None
+
+
+def _open_binary(path: str) -> BinaryIO:
+    with open(path, "rb") as handle:
+        magic = handle.read(3)
+    if magic[:2] == b"\x1f\x8b":
+        return gzip.open(path, "rb")
+    if magic == b"BZh":
+        return bz2.open(path, "rb")
+    return open(path, "rb")
+
+
+def _is_mrt(path: str) -> bool:
+    with _open_binary(path) as handle:
+        header = handle.read(12)
+    return len(header) == 12 and struct.unpack("!H", header[4:6])[0] in MRT_TYPES
+
+
+def _origin_of(attributes: bytes) -> Optional[int]:
+    """Origin ASN from a path attribute block (last AS of the AS_PATH), or None if locally originated."""
+    offset = 0
+    while offset + 3 <= len(attributes):
+        flags, attr_type = attributes[offset], attributes[offset + 1]
+        if flags & 0x10:
+            length = struct.unpack_from("!H", attributes, offset + 2)[0]
+            offset += 4
+        else:
+            length = attributes[offset + 2]
+            offset += 3
+        if attr_type == ATTR_AS_PATH:
+            origin = None
+            end = offset + length
+            while offset + 2 <= end:
+                segment_type, count = attributes[offset], attributes[offset + 1]
+                offset += 2
+                if count and segment_type in (AS_SET, AS_SEQUENCE):
+                    # TABLE_DUMP_V2 always encodes 4-byte ASNs.
+                    index = count - 1 if segment_type == AS_SEQUENCE else 0
+                    origin = struct.unpack_from("!I", attributes, offset + 4 * index)[0]
+                offset += 4 * count
+            return origin
+        offset += length
+    return None
+
+
+def read_mrt_rib(path: str) -> Iterator[Tuple[int, int, int, int]]:
+    """
+    Yields (family bits, network, length, origin ASN) for each prefix of an MRT TABLE_DUMP_V2 RIB dump.
+
+    When peers disagree on the origin, the one most of them see wins.
+    """
+    with _open_binary(path) as handle:
+        while True:
+            header = handle.read(12)
+            if len(header) < 12:
+                return
+            _, mrt_type, subtype, length = struct.unpack("!IHHI", header)
+            body = handle.read(length)
+            if mrt_type != MRT_TABLE_DUMP_V2 or subtype not in RIB_SUBTYPES:
+                continue
+            bits, add_path = RIB_SUBTYPES[subtype]
+            prefix_length = body[4]
+            prefix_bytes = (prefix_length + 7) // 8
+            raw = body[5:5 + prefix_bytes].ljust(bits // 8, b"\x00")
+            offset = 5 + prefix_bytes
+            entry_count = struct.unpack_from("!H", body, offset)[0]
+            offset += 2
+            origins = Counter()
+            for _ in range(entry_count):
+                offset += 2 + 4 + (4 if add_path else 0)  # peer index, originated time, path id
+                attr_length = struct.unpack_from("!H", body, offset)[0]
+                offset += 2
+                origin = _origin_of(body[offset:offset + attr_length])
+                offset += attr_length
+                if origin is not None:
+                    origins[origin] += 1
+            if origins:
+                yield bits, int.from_bytes(raw, "big"), prefix_length, origins.most_common(1)[0][0]
+
+
+def read_prefix2as(path: str) -> Iterator[Tuple[int, int, int, int]]:
+    """
+    Yields (family bits, network, length, origin ASN) from a text prefix-to-AS table.
+
+    Accepts CAIDA prefix2as lines ("1.0.0.0  24  13335") and "prefix/len ASN"
+    lines (pyasn, bgp.tools). Multi-origin ("13335_4826") and AS-set
+    ("13335,4826") entries keep their first ASN.
+    """
+    with _open_binary(path) as handle:
+        for number, raw_line in enumerate(handle, 1):
+            line = raw_line.decode("utf-8", "replace").strip()
+            if not line or line[0] in "#;":
+                continue
+            fields = line.split()
+            try:
+                if "/" in fields[0]:
+                    prefix, asn = fields[0], fields[1]
+                else:
+                    prefix, asn = f"{fields[0]}/{fields[1]}", fields[2]
+                network = ipaddress.ip_network(prefix, strict=False)
+                origin = int(re.split(r"[_,]", asn.upper().removeprefix("AS"))[0])
+            except (IndexError, ValueError):
+                logger.debug(f"⚠️ [PREFIX INDEX] Skipping line {number} of {path}: {line!r}")
+                continue
+            yield network.max_prefixlen, int(network.network_address), network.prefixlen, origin
+
+
+def read_as_names(path: str) -> Dict[int, Tuple[str, str]]:
+    """ASN -> (org name, country) from "ASN NAME, CC" lines."""
+    names = {}
+    with _open_binary(path) as handle:
+        for raw_line in handle:
+            match = _AS_NAME_LINE.match(raw_line.decode("utf-8", "replace").strip())
+            if match:
+                names[int(match.group(1))] = (match.group(2) or "Unknown", match.group(3) or "Unknown")
+    return names
+
+
+class _Snapshot:
+    """One loaded table; replaced as a whole on refresh, so lookups never see a half-built trie."""
+
+    def __init__(self):
+        self.tries = {32: PrefixTrie(32), 128: PrefixTrie(128)}
+        self.names: Dict[int, Tuple[str, str]] = {}
+        self.mtimes: Dict[str, float] = {}
+        self.loaded_at = 0.0
+
+
+class PrefixIndex:
+    """
+    Local longest-prefix-match index from prefix to origin ASN.
+
+    * Loads an MRT RIB dump or prefix2as file (`BGP_PREFIX_TABLE`) and an
+      optional AS names file (`BGP_AS_NAMES`) into per-family Patricia tries.
+    * `lookup` / `lookup_many` answer with the same record shape as the
+      BGPView fetch ({asn, prefix, name, country}), or None on a miss.
+    * Loading and refreshing run on a background thread; until the first
+      load finishes every lookup is a miss. Lookups re-check the files'
+      modification times every `refresh_check_seconds` and reload changed
+      tables without blocking.
+    * `announce` / `withdraw` apply incremental route changes to the live
+      table. They are replayed onto every reloaded table until a table
+      file newer than the change replaces them.
+    """
+
+    def __init__(self, table_path: Optional[str] = PREFIX_TABLE_PATH, names_path: Optional[str] = AS_NAMES_PATH,
+                 refresh_check_seconds: float = REFRESH_CHECK_SECONDS):
+        self.table_path = table_path
+        self.names_path = names_path
+        self.refresh_check_seconds = refresh_check_seconds
+        self._snapshot: Optional[_Snapshot] = None
+        self._loading: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+        # Runtime route changes by (bits, network, length): (time, origin ASN or None for a withdrawal).
+        self._updates: Dict[Tuple[int, int, int], Tuple[float, Optional[int]]] = {}
+        self._updates_lock = threading.Lock()
+        self._next_check = 0.0
+        self.ready = threading.Event()
+        self.stats: Counter = Counter()
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.table_path)
+
+    def _paths(self) -> List[str]:
+        return [path for path in (self.table_path, self.names_path) if path]
+
+    def _mtimes(self) -> Dict[str, float]:
+        mtimes = {}
+        for path in self._paths():
+            try:
+                mtimes[path] = os.stat(path).st_mtime
+            except OSError:
+                mtimes[path] = 0.0
+        return mtimes
+
+    def load(self) -> _Snapshot:
+        """Builds a fresh table from the files and swaps it in."""
+        started = time.perf_counter()
+        snapshot = _Snapshot()
+        snapshot.mtimes = self._mtimes()
+        reader = read_mrt_rib if _is_mrt(self.table_path) else read_prefix2as
+        for bits, network, length, origin in reader(self.table_path):
+            snapshot.tries[bits].insert(network, length, origin)
+        if self.names_path:
+            snapshot.names = read_as_names(self.names_path)
+        snapshot.loaded_at = time.time()
+        with self._updates_lock:
+            self._replay_updates(snapshot)
+            self._snapshot = snapshot
+        self.ready.set()
+        self.stats["loads"] += 1
+        logger.info(
+            f"🗺️ [PREFIX INDEX] Loaded {snapshot.tries[32].size} IPv4 / {snapshot.tries[128].size} IPv6 prefixes "
+            f"and {len(snapshot.names)} AS names from {self.table_path} in {time.perf_counter() - started:.1f}s"
+        )
+        return snapshot
+
+    def _replay_updates(self, snapshot: _Snapshot):
+        """Applies runtime changes newer than the table file to a fresh table and forgets the rest."""
+        table_mtime = snapshot.mtimes.get(self.table_path, 0.0)
+        stale = [key for key, (changed_at, _) in self._updates.items() if changed_at <= table_mtime]
+        for key in stale:
+            del self._updates[key]
+        for (bits, network, length), (_, asn) in self._updates.items():
+            if asn is None:
+                snapshot.tries[bits].remove(network, length)
+            else:
+                snapshot.tries[bits].insert(network, length, asn)
+        if self._updates or stale:
+            logger.info(f"🗺️ [PREFIX INDEX] Replayed {len(self._updates)} route changes, "
+                        f"dropped {len(stale)} the table already covers")
+
+    def _load_in_background(self):
+        try:
+            self.load()
+        except Exception as e:
+            self.stats["load_errors"] += 1
+            logger.error(f"❌ [PREFIX INDEX] Failed to load {self.table_path}: {e}")
+        finally:
+            with self._lock:
+                self._loading = None
+
+    def refresh(self, force: bool = False) -> bool:
+        """Starts a background reload if the files changed (or `force`); returns whether one started."""
+        if not self.enabled:
+            return False
+        with self._lock:
+            if self._loading is not None:
+                return False
+            snapshot = self._snapshot
+            if not force and snapshot is not None and snapshot.mtimes == self._mtimes():
+                return False
+            self._loading = threading.Thread(target=self._load_in_background, name="prefix-index", daemon=True)
+            self._loading.start()
+            return True
+
+    def _current(self) -> Optional[_Snapshot]:
+        if not self.enabled:
+            return None
+        now = time.monotonic()
+        if now >= self._next_check:
+            self._next_check = now + self.refresh_check_seconds
+            self.refresh()
+        return self._snapshot
+
+    def _record(self, snapshot: _Snapshot, bits: int, match: Tuple[int, int, Any]) -> Dict[str, Any]:
+        key, length, asn = match
+        address_type = ipaddress.IPv4Address if bits == 32 else ipaddress.IPv6Address
+        name, country = snapshot.names.get(asn, ("Unknown", "Unknown"))
+        return {"asn": asn, "prefix": f"{address_type(key)}/{length}", "name": name, "country": country}
+
+    def lookup(self, ip: str) -> Optional[Dict[str, Any]]:
+        """The most specific prefix announcing `ip` as {asn, prefix, name, country}, or None."""
+        snapshot = self._current()
+        if snapshot is None:
+            self.stats["not_loaded"] += 1
+            return None
+        try:
+            address = ipaddress.ip_address(ip)
+        except ValueError:
+            return None
+        match = snapshot.tries[address.max_prefixlen].longest_match(int(address))
+        if match is None:
+            self.stats["misses"] += 1
+            return None
+        self.stats["hits"] += 1
+        return self._record(snapshot, address.max_prefixlen, match)
+
+    def lookup_many(self, ips: Iterable[str]) -> List[Optional[Dict[str, Any]]]:
+        """`lookup` for every IP against one consistent snapshot; results follow the input order."""
+        snapshot = self._current()
+        if snapshot is None:
+            ips = list(ips)
+            self.stats["not_loaded"] += len(ips)
+            return [None] * len(ips)
+        results = []
+        for ip in ips:
+            try:
+                address = ipaddress.ip_address(ip)
+            except ValueError:
+                results.append(None)
+                continue
+            match = snapshot.tries[address.max_prefixlen].longest_match(int(address))
+            self.stats["hits" if match else "misses"] += 1
+            results.append(self._record(snapshot, address.max_prefixlen, match) if match else None)
+        return results
+
+    def announce(self, prefix: str, asn: int):
+        """
+        Adds or re-originates one prefix (e.g. from a BGP update feed). Before
+        the first load it is only recorded, and applied once the table loads.
+        """
+        network = ipaddress.ip_network(prefix, strict=False)
+        key = (network.max_prefixlen, int(network.network_address), network.prefixlen)
+        with self._updates_lock:
+            self._updates[key] = (time.time(), asn)
+            snapshot = self._snapshot
+            if snapshot is not None:
+                snapshot.tries[key[0]].insert(key[1], key[2], asn)
+
+    def withdraw(self, prefix: str) -> bool:
+        """Removes one prefix; returns whether the live table had it."""
+        network = ipaddress.ip_network(prefix, strict=False)
+        key = (network.max_prefixlen, int(network.network_address), network.prefixlen)
+        with self._updates_lock:
+            self._updates[key] = (time.time(), None)
+            snapshot = self._snapshot
+            return snapshot is not None and snapshot.tries[key[0]].remove(key[1], key[2])
+
+    def summary(self) -> Dict[str, Any]:
+        snapshot = self._snapshot
+        return {
+            "table": self.table_path,
+            "loaded": snapshot is not None,
+            "ipv4_prefixes": snapshot.tries[32].size if snapshot else 0,
+            "ipv6_prefixes": snapshot.tries[128].size if snapshot else 0,
+            "as_names": len(snapshot.names) if snapshot else 0,
+            "route_changes": len(self._updates),
+            **self.stats,
+        }
+
+
+prefix_index = PrefixIndex()
@@ -0,0 +1,21 @@
+import asyncio
+from typing import List, Tuple
+
+
+async def run_command(args: List[str], timeout: float) -> Tuple[int, str]:
+    """
+    Runs a command without a shell and returns (returncode, stdout).
+
+    Raises:
+        asyncio.TimeoutError: If it runs longer than `timeout`; the process is killed.
+    """
+    process = await asyncio.create_subprocess_exec(
+        *args, stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.DEVNULL
+    )
+    try:
+        stdout, _ = await asyncio.wait_for(process.communicate(), timeout)
+    except asyncio.TimeoutError:
+        process.kill()
+        await process.wait()
+        raise
+    return process.returncode, stdout.decode(errors="replace")
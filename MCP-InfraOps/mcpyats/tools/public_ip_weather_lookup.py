@@ -1,9 +1,11 @@
 import os
 import logging
-import requests
+import httpx
 from dotenv import load_dotenv
 from langsmith import traceable
 from langchain.tools import Tool
+from tools.http_client import http_client, run_sync
+from tools.lookup_cache import lookup_cache
 
 # ✅ Load Environment Variables
 load_dotenv()
@@ -16,8 +18,27 @@ logger = logging.getLogger(__name__)
 BASE_API_URL = "https://api.weatherapi.com/v1"
 WEATHER_API_KEY = os.getenv("WEATHER_API_KEY")
 
+async def fetch_ip_location(ip):
+    """
+    Queries WeatherAPI's IP lookup.
+
+    Returns:
+    - dict: the lookup result, or None when WeatherAPI cannot locate the IP
+    """
+    url = f"{BASE_API_URL}/ip.json"
+    params = {"key": WEATHER_API_KEY, "q": ip}
+
+    response = await http_client.get(url, params=params, timeout=5)
+    logger.info(f"📜 [WeatherAPI Response] HTTP {response.status_code}: {response.text}")
+
+    # WeatherAPI answers 400 ("No matching location found") for addresses it cannot place.
+    if response.status_code == 400:
+        return None
+    response.raise_for_status()
+    return response.json()
+
 @traceable
-def get_location_tool(input_data):
+async def get_location_tool_async(input_data):
     """
     Fetches geographic information for a public IP address and returns a formatted response.
 
@@ -36,15 +57,11 @@ def get_location_tool(input_data):
         ip = input_data["ip"]
         logger.info(f"🌍 [WeatherAPI] Fetching geolocation for IP: {ip}")
 
-        # ✅ Make API request
-        url = f"{BASE_API_URL}/ip.json"
-        params = {"key": WEATHER_API_KEY, "q": ip}
-
-        response = requests.get(url, params=params, timeout=5)
-        logger.info(f"📜 [WeatherAPI Response] HTTP {response.status_code}: {response.text}")
-
-        response.raise_for_status()
-        data = response.json()
+        # ✅ Make API request (cached per IP)
+        data = await lookup_cache.lookup("geo", ip, lambda: fetch_ip_location(ip))
+        if data is None:
+            logger.warning(f"⚠️ [WeatherAPI] No location found for IP: {ip}")
+            return {"agent_response": f"⚠️ No location found for {ip}."}
 
         # ✅ Extract geolocation info
         city = data.get("city", "Unknown")
@@ -63,23 +80,28 @@ def get_location_tool(input_data):
 
         return {"agent_response": response_text}
 
-    except requests.exceptions.Timeout:
+    except httpx.TimeoutException:
         logger.error(f"❌ [WeatherAPI] Request timed out for IP: {ip}")
         return {"agent_response": f"⚠️ Geolocation request timed out for {ip}."}
 
-    except requests.exceptions.HTTPError as e:
+    except httpx.HTTPStatusError as e:
         logger.error(f"❌ [WeatherAPI] HTTP error for IP {ip}: {e}")
         return {"agent_response": f"⚠️ Geolocation service returned an error for {ip}."}
 
-    except requests.exceptions.RequestException as e:
+    except httpx.HTTPError as e:
         logger.error(f"❌ [WeatherAPI] API request failed: {e}")
         return {"agent_response": f"⚠️ Unable to retrieve location for {ip} at this time."}
 
+def get_location_tool(input_data):
+    """Synchronous entry point for `get_location_tool_async`."""
+    return run_sync(get_location_tool_async(input_data))
+
 # ✅ Register LangChain Tool
 get_location_tool_obj = Tool(
     name="get_location_tool",
     description="Fetches geographic location details for a public IP and returns a formatted response.",
-    func=get_location_tool
+    func=get_location_tool,
+    coroutine=get_location_tool_async
 )
 
 # ✅ Test the tool
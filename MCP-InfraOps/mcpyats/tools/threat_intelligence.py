@@ -1,8 +1,10 @@
-import requests
+import httpx
 import logging
 import os
 from langsmith import traceable
 from langchain.tools import Tool
+from tools.http_client import http_client, run_sync
+from tools.lookup_cache import lookup_cache
 
 # ✅ Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -11,8 +13,29 @@ logger = logging.getLogger(__name__)
 # ✅ Load API Key
 ABUSEIPDB_API_KEY = os.getenv("ABUSEIPDB_API_KEY")
 
+async def fetch_abuse_report(ip):
+    """
+    Queries AbuseIPDB for an IP's report.
+
+    Returns:
+    - dict: the report's `data` object, or None when AbuseIPDB has no data for the IP
+    """
+    url = "https://api.abuseipdb.com/api/v2/check"
+    headers = {
+        "Key": ABUSEIPDB_API_KEY,
+        "Accept": "application/json"
+    }
+
+    response = await http_client.get(url, params={"ipAddress": ip}, headers=headers, timeout=5)
+
+    # ✅ Log the full raw API response
+    logger.info(f"📜 [Threat Intelligence API Response] HTTP {response.status_code}: {response.text}")
+
+    response.raise_for_status()
+    return response.json().get("data") or None
+
 @traceable
-def threat_check_tool(input_data):
+async def threat_check_tool_async(input_data):
     """
     Checks if an IP address is blacklisted or has a poor reputation score using AbuseIPDB.
 
@@ -31,23 +54,10 @@ def threat_check_tool(input_data):
         ip = input_data["ip"]
         logger.info(f"🔍 [THREAT CHECK] Checking threat intelligence for IP: {ip}")
 
-        # ✅ Query AbuseIPDB API
-        url = f"https://api.abuseipdb.com/api/v2/check?ipAddress={ip}"
-        headers = {
-            "Key": ABUSEIPDB_API_KEY,
-            "Accept": "application/json"
-        }
-
-        response = requests.get(url, headers=headers, timeout=5)
-
-        # ✅ Log the full raw API response
-        logger.info(f"📜 [Threat Intelligence API Response] HTTP {response.status_code}: {response.text}")
-
-        response.raise_for_status()
-        data = response.json()
+        # ✅ Query AbuseIPDB API (rate limited, so answers are cached per IP)
+        abuse_data = await lookup_cache.lookup("abuseipdb", ip, lambda: fetch_abuse_report(ip))
 
         # ✅ Extract Threat Intelligence Details
-        abuse_data = data.get("data", {})
         if not abuse_data:
             logger.warning(f"⚠️ No threat intelligence data found for IP: {ip}")
             return {"agent_response": f"⚠️ No threat intelligence data found for {ip}."}
@@ -72,19 +82,24 @@ def threat_check_tool(input_data):
 
         return {"agent_response": response_text}
 
-    except requests.exceptions.Timeout:
+    except httpx.TimeoutException:
         logger.error(f"⏳ [THREAT CHECK] Request timed out for IP: {ip}")
         return {"agent_response": f"⚠️ Threat intelligence request timed out for {ip}."}
 
-    except requests.exceptions.RequestException as e:
+    except httpx.HTTPError as e:
         logger.error(f"❌ [THREAT CHECK] API request failed: {e}")
         return {"agent_response": f"⚠️ Error retrieving threat intelligence for {ip}."}
 
+def threat_check_tool(input_data):
+    """Synchronous entry point for `threat_check_tool_async`."""
+    return run_sync(threat_check_tool_async(input_data))
+
 # ✅ Register LangChain Tool
 threat_check_tool_obj = Tool(
     name="threat_check_tool",
     description="Checks if an IP is blacklisted or has a poor reputation score using AbuseIPDB and returns a formatted response.",
-    func=threat_check_tool
+    func=threat_check_tool,
+    coroutine=threat_check_tool_async
 )
 
 # ✅ Test the tool
@@ -1,24 +1,47 @@
-import subprocess
 import logging
 from langsmith import traceable
 from langchain.tools import Tool
-import re
+from tools.batch import numeric_option
+from tools.http_client import run_sync
+from tools.traceroute_engine import tracer
 
 # ✅ Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Bounds on the options the model may set; every round probes all TTLs at once.
+TRACE_MAX_HOPS_LIMIT = 64
+TRACE_MAX_ROUNDS = 10
+TRACE_MIN_TIMEOUT = 0.1
+TRACE_MAX_TIMEOUT = 10.0
+
+def _hop_progress_writer(ip):
+    """Streams resolved hops to the graph's custom stream when called inside a graph run."""
+    try:
+        from langgraph.config import get_stream_writer
+        writer = get_stream_writer()
+    except Exception:
+        return None
+
+    def on_hop(update):
+        writer({"tool_progress": {
+            "service": "local", "tool": "traceroute_tool", "type": "hop", "target": ip,
+            "round": update.round, "ttl": update.ttl, "kind": update.reply.kind, "source": update.reply.source,
+            "rtt_ms": round(update.reply.rtt * 1000, 3) if update.reply.rtt is not None else None,
+        }})
+    return on_hop
+
 @traceable
-def traceroute_tool(input_data):
+async def traceroute_tool_async(input_data):
     """
-    Performs a traceroute using ICMP (-I) to analyze the network path to an IP.
+    Traces the network path to an IP, probing all TTLs in parallel over several rounds.
 
     Parameters:
-    - input_data (dict): Must contain {"ip": "x.x.x.x"}
+    - input_data (dict): Must contain {"ip": "x.x.x.x"}; may set "rounds" (≤ 10), "max_hops" (≤ 64) and "timeout" (≤ 10s)
 
     Returns:
     - dict: {
-        "agent_response": "📡 Traceroute results for 8.8.8.8:\n- Hop 1: 192.168.1.1\n- Hop 2: 10.0.0.1\n- Hop 3: 8.8.8.8 (google.com)"
+        "agent_response": "📡 Traceroute to 8.8.8.8 (8.8.8.8), 3 rounds of icmp probes:\n| hop | host | loss | ... |"
     }
     """
     try:
@@ -30,53 +53,50 @@ def traceroute_tool(input_data):
         ip = input_data["ip"]
         logger.info(f"🌍 [TRACEROUTE] Tracing route to IP: {ip}")
 
-        # ✅ Run traceroute (forcing ICMP -I)
-        cmd = f"traceroute -I {ip}"
-        result = subprocess.run(cmd, shell=True, capture_output=True, text=True, timeout=10)
-
-        # ✅ Log full output for debugging
-        traceroute_output = result.stdout.strip()
-        logger.info(f"📜 [TRACEROUTE OUTPUT]\n{traceroute_output}")
-
-        # ✅ Check if traceroute was successful
-        if result.returncode != 0 or "no reply" in traceroute_output.lower():
+        # ✅ Coerce and bound the optional trace settings
+        try:
+            rounds = numeric_option(input_data, "rounds", int, 1, TRACE_MAX_ROUNDS)
+            max_hops = numeric_option(input_data, "max_hops", int, 1, TRACE_MAX_HOPS_LIMIT)
+            timeout = numeric_option(input_data, "timeout", float, TRACE_MIN_TIMEOUT, TRACE_MAX_TIMEOUT)
+        except ValueError as e:
+            logger.warning(f"⚠️ [TRACEROUTE] Invalid options for {ip}: {e}")
+            return {"agent_response": f"⚠️ Invalid traceroute options: {e}."}
+
+        # ✅ Trace in-process; hops stream to the graph as they resolve
+        result = await tracer.trace(
+            ip, on_hop=_hop_progress_writer(ip), rounds=rounds, max_hops=max_hops, timeout=timeout
+        )
+        logger.info(f"📜 [TRACEROUTE OUTPUT] {result.as_dict()}")
+
+        if result.error:
+            logger.warning(f"⚠️ [TRACEROUTE] Could not trace {ip}: {result.error}")
+            return {"agent_response": f"⚠️ Could not trace route to {ip}: {result.error}."}
+
+        # ✅ Check if any hop answered
+        if not result.path():
             logger.warning(f"⚠️ [TRACEROUTE] No response from {ip}.")
             return {"agent_response": f"⚠️ No response from {ip} during traceroute."}
 
-        # ✅ Extract hops using regex
-        hops = []
-        hop_regex = re.compile(r"^\s*(\d+)\s+([\w\.\-]+)\s+\(([\d\.]+)\)\s+.*$")
-        for line in traceroute_output.split("\n")[1:]:  # Skip first line (header)
-            match = hop_regex.match(line)
-            if match:
-                hop_num = match.group(1)
-                hop_host = match.group(2)
-                hop_ip = match.group(3)
-                hops.append(f"- **Hop {hop_num}:** {hop_ip} ({hop_host})")
-
-        if not hops:
-            logger.warning(f"⚠️ [TRACEROUTE] No valid hops extracted for IP {ip}.")
-            return {"agent_response": f"⚠️ No valid hops extracted for {ip}."}
-
-        response_text = f"📡 **Traceroute results for {ip}:**\n" + "\n".join(hops)
+        response_text = result.format()
 
         logger.info(f"✅ [TRACEROUTE] Response: {response_text}")
 
         return {"agent_response": response_text}
 
-    except subprocess.TimeoutExpired:
-        logger.error(f"⏳ [TRACEROUTE] Request timed out for IP: {ip}")
-        return {"agent_response": f"⚠️ Traceroute request timed out for {ip}."}
-
     except Exception as e:
         logger.error(f"❌ [TRACEROUTE] Unexpected error: {e}")
         return {"agent_response": f"⚠️ Unexpected error while performing traceroute for {ip}."}
 
+def traceroute_tool(input_data):
+    """Synchronous entry point for `traceroute_tool_async`."""
+    return run_sync(traceroute_tool_async(input_data))
+
 # ✅ Register LangChain Tool
 traceroute_tool_obj = Tool(
     name="traceroute_tool",
-    description="Performs an ICMP traceroute to analyze the network path to an IP and returns a structured response.",
-    func=traceroute_tool
+    description="Performs an ICMP traceroute to analyze the network path to an IP and returns per-hop loss and latency statistics.",
+    func=traceroute_tool,
+    coroutine=traceroute_tool_async
 )
 
 # ✅ Test the tool
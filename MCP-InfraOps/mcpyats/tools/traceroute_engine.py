@@ -0,0 +1,357 @@
+import os
+import time
+import errno
+import random
+import socket
+import struct
+import asyncio
+import logging
+import itertools
+from collections import Counter
+from typing import AsyncIterator, Callable, Dict, List, Optional, Tuple, Union
+
+from tools.icmp_prober import (
+    ICMP_DEST_UNREACH, ICMP_TIME_EXCEEDED, IP_RECVERR, MSG_ERRQUEUE, PROBE_UDP_BASE_PORT,
+    ICMPProber, ProbeReply, parse_extended_error, prober, rtt_stats_ms,
+)
+
+logger = logging.getLogger(__name__)
+
+TRACE_MAX_HOPS = int(os.getenv("TRACE_MAX_HOPS", "30"))
+TRACE_ROUNDS = int(os.getenv("TRACE_ROUNDS", "3"))
+TRACE_TIMEOUT = float(os.getenv("TRACE_TIMEOUT", "2"))
+TRACE_ROUND_INTERVAL = float(os.getenv("TRACE_ROUND_INTERVAL", "0.5"))
+# Small gap between the TTLs of a round, so routers' ICMP rate limits do not eat replies.
+TRACE_SEND_SPACING = float(os.getenv("TRACE_SEND_SPACING", "0.005"))
+TRACE_MAX_TARGETS = int(os.getenv("TRACE_MAX_TARGETS", "32"))
+TRACE_NAME_TIMEOUT = float(os.getenv("TRACE_NAME_TIMEOUT", "1"))
+
+# Kinds of reply that identify the router (or destination) at a TTL.
+ANSWERED = ("time-exceeded", "reply", "refused", "unreachable")
+
+
+class HopStats:
+    """MTR-style statistics of one TTL across rounds; ECMP paths may show several responders."""
+
+    def __init__(self, ttl: int):
+        self.ttl = ttl
+        self.sent = 0
+        self.received = 0
+        self.rtts: List[float] = []
+        self.last_rtt: Optional[float] = None
+        self.responders: Counter = Counter()
+        self.names: Dict[str, str] = {}
+
+    def record(self, reply: ProbeReply):
+        self.sent += 1
+        if reply.kind in ANSWERED and reply.source:
+            self.received += 1
+            self.rtts.append(reply.rtt)
+            self.last_rtt = reply.rtt
+            self.responders[reply.source] += 1
+
+    @property
+    def address(self) -> Optional[str]:
+        return self.responders.most_common(1)[0][0] if self.responders else None
+
+    @property
+    def loss_percent(self) -> float:
+        return 100.0 * (self.sent - self.received) / self.sent if self.sent else 100.0
+
+    def as_dict(self) -> Dict:
+        stats = rtt_stats_ms(self.rtts)
+        return {
+            "ttl": self.ttl,
+            "address": self.address,
+            "name": self.names.get(self.address) if self.address else None,
+            "responders": dict(self.responders),
+            "sent": self.sent,
+            "received": self.received,
+            "loss_percent": round(self.loss_percent, 1),
+            "last_ms": round(self.last_rtt * 1000, 3) if self.last_rtt is not None else None,
+            "rtt_ms": dict(zip(("best", "avg", "worst", "stdev"), (round(v, 3) for v in stats))) if stats else None,
+        }
+
+
+class TraceResult:
+    """Hops towards one target, filled in as probes resolve."""
+
+    def __init__(self, target: str):
+        self.target = target
+        self.address: Optional[str] = None
+        self.method: Optional[str] = None
+        self.hops: Dict[int, HopStats] = {}
+        self.reached_ttl: Optional[int] = None
+        self.rounds = 0
+        self.error: Optional[str] = None
+
+    def hop(self, ttl: int) -> HopStats:
+        if ttl not in self.hops:
+            self.hops[ttl] = HopStats(ttl)
+        return self.hops[ttl]
+
+    def path(self) -> List[HopStats]:
+        """Hops up to the destination, or up to the last hop that answered if it was not reached."""
+        last = self.reached_ttl or max((ttl for ttl, hop in self.hops.items() if hop.received), default=0)
+        return [self.hops[ttl] for ttl in sorted(self.hops) if ttl <= last]
+
+    def as_dict(self) -> Dict:
+        return {
+            "target": self.target,
+            "address": self.address,
+            "method": self.method,
+            "reached": self.reached_ttl is not None,
+            "rounds": self.rounds,
+            "hops": [hop.as_dict() for hop in self.path()],
+            "error": self.error,
+        }
+
+    def format(self) -> str:
+        """Report table in the layout of `mtr --report`."""
+        lines = [
+            f"📡 **Traceroute to {self.target}** ({self.address}), {self.rounds} rounds of {self.method} probes"
+            + ("" if self.reached_ttl else " — destination not reached") + ":",
+            "",
+            "| hop | host | loss | sent | last | avg | best | worst | stdev |",
+            "|---|---|---|---|---|---|---|---|---|",
+        ]
+        for hop in self.path():
+            stats = rtt_stats_ms(hop.rtts)
+            if hop.address is None or stats is None:
+                lines.append(f"| {hop.ttl} | * | 100% | {hop.sent} | - | - | - | - | - |")
+                continue
+            best, avg, worst, stdev = stats
+            host = hop.address
+            if hop.names.get(host) and hop.names[host] != host:
+                host = f"{hop.names[host]} ({host})"
+            if len(hop.responders) > 1:
+                host += f" +{len(hop.responders) - 1} ECMP"
+            lines.append(
+                f"| {hop.ttl} | {host} | {hop.loss_percent:.0f}% | {hop.sent} | {hop.last_rtt * 1000:.1f} | "
+                f"{avg:.1f} | {best:.1f} | {worst:.1f} | {stdev:.1f} |"
+            )
+        return "\n".join(lines)
+
+
+class HopUpdate:
+    """A probe that resolved while tracing; `hop` and `result` reflect it already."""
+
+    def __init__(self, round_index: int, ttl: int, reply: ProbeReply, hop: HopStats, result: TraceResult):
+        self.round = round_index
+        self.ttl = ttl
+        self.reply = reply
+        self.hop = hop
+        self.result = result
+
+
+class UDPFlow:
+    """
+    Unprivileged UDP probes towards one address, Paris-traceroute style.
+
+    Every probe leaves through one connected socket, so all TTLs share a
+    5-tuple and ECMP routers hash them onto one path. Routers' time-exceeded
+    and the destination's port-unreachable come back through the socket's
+    IP_RECVERR error queue together with the probe's payload, which carries
+    the probe number the reply is matched by.
+    """
+
+    def __init__(self, address: str, port: int = PROBE_UDP_BASE_PORT):
+        self.address = address
+        self.loop = asyncio.get_running_loop()
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.sock.setblocking(False)
+        self._numbers = itertools.count(1)
+        self._pending: Dict[int, Tuple[asyncio.Future, float]] = {}
+        try:
+            self.sock.setsockopt(socket.IPPROTO_IP, IP_RECVERR, 1)
+            self.sock.connect((address, port))
+        except OSError:
+            self.sock.close()
+            raise
+        self.loop.add_reader(self.sock.fileno(), self._on_readable)
+
+    async def probe(self, ttl: int, timeout: float) -> ProbeReply:
+        number = next(self._numbers) & 0xFFFFFFFF
+        future = self.loop.create_future()
+        self._pending[number] = (future, time.perf_counter())
+        try:
+            self.sock.setsockopt(socket.IPPROTO_IP, socket.IP_TTL, ttl)
+            packet = struct.pack("!I", number) + b"\x00" * 28
+            try:
+                self.sock.send(packet)
+            except OSError:
+                # A send reports (and clears) an error queued for an earlier probe; send again.
+                self.sock.send(packet)
+            return await asyncio.wait_for(future, timeout)
+        except asyncio.TimeoutError:
+            return ProbeReply("timeout")
+        except OSError as e:
+            kind = "unreachable" if e.errno in (errno.ENETUNREACH, errno.EHOSTUNREACH) else "error"
+            return ProbeReply(kind)
+        finally:
+            self._pending.pop(number, None)
+
+    def _on_readable(self):
+        while True:
+            try:
+                data, ancdata, _, _ = self.sock.recvmsg(512, 512, MSG_ERRQUEUE)
+            except OSError:
+                break
+            error = parse_extended_error(ancdata)
+            entry = self._pending.pop(struct.unpack("!I", data[:4])[0], None) if len(data) >= 4 else None
+            if error is None or entry is None or entry[0].done():
+                continue
+            future, sent_at = entry
+            icmp_type, code, offender = error
+            if icmp_type == ICMP_TIME_EXCEEDED:
+                kind = "time-exceeded"
+            elif icmp_type == ICMP_DEST_UNREACH and offender == self.address:
+                kind = "refused"
+            else:
+                kind = "unreachable"
+            future.set_result(ProbeReply(kind, offender, time.perf_counter() - sent_at, code))
+        # A UDP answer from the destination does not say which probe it answers; the
+        # probes are not matched to it and time out, so only discard it.
+        while True:
+            try:
+                self.sock.recv(512)
+            except OSError:
+                break
+
+    def close(self):
+        try:
+            self.loop.remove_reader(self.sock.fileno())
+        except (ValueError, RuntimeError):
+            pass
+        self.sock.close()
+
+
+class Tracer:
+    """
+    In-process traceroute that probes every TTL of a round in parallel.
+
+    * Each round sends one probe per TTL without waiting for earlier hops;
+      after the first round, only TTLs up to the destination are probed.
+    * Hops are reported through `on_hop` (or `stream`) as soon as they
+      resolve, and keep MTR-style statistics across `rounds`.
+    * ICMP echo probes over the shared prober socket (raw or unprivileged
+      datagram); without either, UDP probes with IP_RECVERR.
+    * Paris-traceroute flows: ICMP probes of a trace share one checksum and
+      UDP probes one 5-tuple, so ECMP routers keep them on a single path
+      and several responders at a TTL reflect real path changes.
+    * `trace_many` traces up to `max_targets` targets concurrently.
+    """
+
+    def __init__(self, prober: ICMPProber = prober, max_hops: int = TRACE_MAX_HOPS, rounds: int = TRACE_ROUNDS,
+                 timeout: float = TRACE_TIMEOUT, round_interval: float = TRACE_ROUND_INTERVAL,
+                 max_targets: int = TRACE_MAX_TARGETS, resolve_names: bool = True):
+        self.prober = prober
+        self.max_hops = max_hops
+        self.rounds = rounds
+        self.timeout = timeout
+        self.round_interval = round_interval
+        self.max_targets = max_targets
+        self.resolve_names = resolve_names
+
+    async def probe_hop(self, address: str, ttl: int, flow: Union[UDPFlow, int], timeout: float) -> ProbeReply:
+        """One probe with `ttl`: over the UDP flow, or an ICMP echo with `flow` as its checksum."""
+        if isinstance(flow, UDPFlow):
+            return await flow.probe(ttl, timeout)
+        return await self.prober.echo(address, ttl=ttl, timeout=timeout, checksum=flow)
+
+    async def _name_hop(self, hop: HopStats, address: str):
+        try:
+            host, _ = await asyncio.wait_for(
+                asyncio.get_running_loop().getnameinfo((address, 0), socket.NI_NAMEREQD), TRACE_NAME_TIMEOUT
+            )
+            hop.names[address] = host
+        except (OSError, asyncio.TimeoutError):
+            hop.names[address] = address
+
+    async def trace(self, target: str, on_hop: Optional[Callable[[HopUpdate], None]] = None,
+                    rounds: Optional[int] = None, max_hops: Optional[int] = None,
+                    timeout: Optional[float] = None) -> TraceResult:
+        """
+        Traces the path to one target.
+
+        Returns:
+            The TraceResult; resolution errors are recorded on `error` rather than raised.
+        """
+        rounds = rounds or self.rounds
+        max_hops = max_hops or self.max_hops
+        timeout = timeout or self.timeout
+        result = TraceResult(target)
+        try:
+            result.address = await self.prober.resolve(target)
+        except OSError as e:
+            result.error = str(e)
+            return result
+        if ":" in result.address:
+            result.error = "IPv6 traceroute is not supported"
+            return result
+        endpoint = self.prober.icmp_endpoint()
+        result.method = endpoint.method if endpoint is not None else "udp"
+        try:
+            flow = random.getrandbits(16) if endpoint is not None else UDPFlow(result.address)
+        except OSError as e:
+            result.error = str(e)
+            return result
+        naming = []
+
+        async def probe(round_index: int, ttl: int):
+            await asyncio.sleep((ttl - 1) * TRACE_SEND_SPACING)
+            reply = await self.probe_hop(result.address, ttl, flow, timeout)
+            if result.reached_ttl is not None and ttl > result.reached_ttl:
+                return
+            if reply.source == result.address and reply.kind in ANSWERED:
+                result.reached_ttl = min(ttl, result.reached_ttl or ttl)
+            hop = result.hop(ttl)
+            hop.record(reply)
+            if self.resolve_names and reply.source and reply.source not in hop.names:
+                hop.names[reply.source] = reply.source
+                naming.append(asyncio.ensure_future(self._name_hop(hop, reply.source)))
+            if on_hop is not None:
+                on_hop(HopUpdate(round_index, ttl, reply, hop, result))
+
+        try:
+            for round_index in range(rounds):
+                if round_index:
+                    await asyncio.sleep(self.round_interval)
+                last_ttl = result.reached_ttl or max_hops
+                await asyncio.gather(*(probe(round_index, ttl) for ttl in range(1, last_ttl + 1)))
+                result.rounds += 1
+        finally:
+            if isinstance(flow, UDPFlow):
+                flow.close()
+        if naming:
+            await asyncio.gather(*naming)
+        return result
+
+    async def stream(self, target: str, **kwargs) -> AsyncIterator[HopUpdate]:
+        """Yields hop updates as probes resolve; once iteration ends, their shared `result` is complete."""
+        queue: asyncio.Queue = asyncio.Queue()
+        task = asyncio.ensure_future(self.trace(target, on_hop=queue.put_nowait, **kwargs))
+        task.add_done_callback(lambda _: queue.put_nowait(None))
+        try:
+            while True:
+                update = await queue.get()
+                if update is None:
+                    break
+                yield update
+            await task
+        finally:
+            if not task.done():
+                task.cancel()
+
+    async def trace_many(self, targets: List[str], **kwargs) -> List[TraceResult]:
+        """Traces every target, at most `max_targets` at a time; results follow the input order."""
+        limit = asyncio.Semaphore(self.max_targets)
+
+        async def bounded(target: str) -> TraceResult:
+            async with limit:
+                return await self.trace(target, **kwargs)
+
+        return await asyncio.gather(*(bounded(target) for target in targets))
+
+
+tracer = Tracer()
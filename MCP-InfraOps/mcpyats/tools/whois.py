@@ -1,15 +1,52 @@
-import subprocess
+import asyncio
 import logging
 import re
 from langsmith import traceable
 from langchain.tools import Tool
+from tools.http_client import run_sync
+from tools.lookup_cache import lookup_cache
+from tools.process import run_command
 
 # ✅ Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+def _last_match(pattern, text):
+    # Nested allocations print the most specific block last.
+    matches = re.findall(pattern, text)
+    return matches[-1].strip() if matches else None
+
+async def fetch_whois_record(ip):
+    """
+    Runs `whois` for an IP and extracts its most specific registration.
+
+    Returns:
+    - dict with org, range, country and asn, or None when the registry has no match
+
+    Raises:
+    - LookupError: if whois itself failed (not cached)
+    """
+    returncode, output = await run_command(["whois", ip], timeout=5)
+
+    # ✅ Log full command output for debugging
+    whois_output = output.strip()
+    logger.info(f"📜 [WHOIS OUTPUT]\n{whois_output}")
+
+    if "No match" in whois_output or "Not found" in whois_output:
+        return None
+    if returncode != 0:
+        raise LookupError(f"whois exited with status {returncode}")
+
+    net_range = _last_match(r"NetRange:\s*(.*)", whois_output)
+    return {
+        "org": _last_match(r"OrgName:\s*(.*)", whois_output) or "Unknown",
+        "range": net_range or "Unknown",
+        "country": _last_match(r"Country:\s*(.*)", whois_output) or "Unknown",
+        "asn": _last_match(r"OriginAS:\s*(.*)", whois_output) or "Unknown",  # Autonomous System Number
+    }
+
 @traceable
-def whois_tool(input_data):
+async def whois_tool_async(input_data):
     """
     Performs a WHOIS lookup on an IP address.
 
@@ -30,36 +67,30 @@ def whois_tool(input_data):
         ip = input_data["ip"]
         logger.info(f"🔍 [WHOIS] Performing WHOIS lookup for IP: {ip}")
 
-        # ✅ Run whois command
-        result = subprocess.run(f"whois {ip}", shell=True, capture_output=True, text=True, timeout=5)
-
-        # ✅ Log full command output for debugging
-        whois_output = result.stdout.strip()
-        logger.info(f"📜 [WHOIS OUTPUT]\n{whois_output}")
+        # ✅ Run whois command; cached per IP, since a range may hold more specific sub-allocations
+        try:
+            record = await lookup_cache.lookup("whois", ip, lambda: fetch_whois_record(ip))
+        except LookupError as e:
+            logger.warning(f"⚠️ [WHOIS] Lookup failed for IP {ip}: {e}")
+            record = None
 
         # ✅ Check for errors
-        if result.returncode != 0 or "No match" in whois_output or "Not found" in whois_output:
+        if not record:
             logger.warning(f"⚠️ [WHOIS] No WHOIS data found for IP: {ip}")
             return {"agent_response": f"⚠️ No WHOIS data found for {ip}."}
 
-        # ✅ Extract relevant WHOIS fields
-        org_name = re.search(r"OrgName:\s*(.*)", whois_output)
-        net_range = re.search(r"NetRange:\s*(.*)", whois_output)
-        country = re.search(r"Country:\s*(.*)", whois_output)
-        asn = re.search(r"OriginAS:\s*(.*)", whois_output)  # Autonomous System Number
-
         response_text = f"""🌍 **WHOIS Lookup for {ip}:**\n
-        - **Organization:** {org_name.group(1) if org_name else 'Unknown'}
-        - **Network Range:** {net_range.group(1) if net_range else 'Unknown'}
-        - **Country:** {country.group(1) if country else 'Unknown'}
-        - **ASN:** {asn.group(1) if asn else 'Unknown'}
+        - **Organization:** {record['org']}
+        - **Network Range:** {record['range']}
+        - **Country:** {record['country']}
+        - **ASN:** {record['asn']}
         """
 
         logger.info(f"✅ [WHOIS] Processed response: {response_text.strip()}")
 
         return {"agent_response": response_text.strip()}
 
-    except subprocess.TimeoutExpired:
+    except asyncio.TimeoutError:
         logger.error(f"⏳ [WHOIS] Command timed out for IP: {ip}")
         return {"agent_response": f"⚠️ WHOIS request timed out for {ip}."}
 
@@ -67,11 +98,16 @@ def whois_tool(input_data):
         logger.error(f"❌ [WHOIS] Unexpected error: {e}")
         return {"agent_response": f"⚠️ Unexpected error while performing WHOIS lookup for {ip}."}
 
+def whois_tool(input_data):
+    """Synchronous entry point for `whois_tool_async`."""
+    return run_sync(whois_tool_async(input_data))
+
 # ✅ Register LangChain Tool
 whois_tool_obj = Tool(
     name="whois_tool",
     description="Performs a WHOIS lookup on an IP and extracts organization, network range, country, and ASN details in a readable format.",
-    func=whois_tool
+    func=whois_tool,
+    coroutine=whois_tool_async
 )
 
 # ✅ Test the tool
@@ -120,8 +120,13 @@ class ServiceNowController:
 # Initialize ServiceNow API Controller
 servicenow_client = ServiceNowController(SERVICENOW_URL, SERVICENOW_USER, SERVICENOW_PASSWORD)
 
+# Id of the request being handled; echoed on its response so pooled clients can match replies.
+_current_request_id = None
+
 def send_response(response_data):
     """Send the response back to stdout."""
+    if _current_request_id is not None and "id" not in response_data:
+        response_data = {"jsonrpc": "2.0", "id": _current_request_id, **response_data}
     response = json.dumps(response_data) + "\n"
     sys.stdout.write(response)
     sys.stdout.flush()
@@ -911,22 +916,41 @@ def generate_actions_from_comments(analysis, problem_data):
 
 def monitor_stdin():
     """Monitor stdin for input and process `tools/discover` or `tools/call`."""
+    global _current_request_id
     while True:
         try:
-            line = sys.stdin.readline().strip()
+            raw_line = sys.stdin.readline()
+            if not raw_line:
+                # EOF: the client closed the session, so stop instead of spinning.
+                logger.info("stdin closed, shutting down")
+                break
+            line = raw_line.strip()
             if not line:
-                time.sleep(0.1)
                 continue
 
             try:
                 data = json.loads(line)
-                if isinstance(data, dict) and data.get("method") == "tools/call":
-                    handle_tools_call(data)
-                elif isinstance(data, dict) and data.get("method") == "tools/discover":
-                    handle_tools_discover()
-
             except json.JSONDecodeError as e:
                 logger.error(f"JSON decode error: {e}")
+                send_response({"error": f"Invalid JSON request: {e}"})
+                continue
+            if not isinstance(data, dict):
+                continue
+
+            # Every request gets exactly one reply, so a client waiting on it never hangs.
+            _current_request_id = data.get("id")
+            try:
+                if data.get("method") == "tools/call":
+                    handle_tools_call(data)
+                elif data.get("method") == "tools/discover":
+                    handle_tools_discover()
+                elif "id" in data:
+                    send_response({"error": f"Method '{data.get('method')}' not supported"})
+            except Exception as e:
+                logger.error(f"Error handling {data.get('method')}: {e}")
+                send_response({"error": f"{data.get('method')} failed: {e}"})
+            finally:
+                _current_request_id = None
 
         except Exception as e:
             logger.error(f"Exception in monitor_stdin: {str(e)}")